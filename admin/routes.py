@@ -1,9 +1,13 @@
 # admin/routes.py
-import sqlite3
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+import logging
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import hmac
 import os
+from ai.counters import read_counters
+from ai.db import get_db_connection
+from ai.metrics import registry
 
 admin_bp = Blueprint(
     'admin_bp', 
@@ -13,15 +17,10 @@ admin_bp = Blueprint(
     static_url_path='/admin_static'
 )
 
-# Database path
-DB = os.path.join(os.path.dirname(__file__), '../dermasoul.db')
-print(f"Admin DB path: {os.path.abspath(DB)}")
+logger = logging.getLogger(__name__)
 
-# Get database connection
-def get_db_connection():
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Lets monitoring scrape /admin/metrics.json with "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('SKIN_AI_METRICS_TOKEN', '')
 
 # Decorators
 def login_required(f):
@@ -73,6 +72,7 @@ def login():
             session['user_id'] = user['user_id']
             return redirect(url_for('admin_bp.dashboard'))
         else:
+            logger.info("Failed admin login for %r", username)
             flash("Invalid credentials")
 
     return render_template('admin_login.html')
@@ -99,17 +99,15 @@ def logout():
 @staff_or_admin_required  # Changed to allow staff
 def dashboard():
     conn = get_db_connection()
-    users_count = conn.execute('SELECT COUNT(*) FROM User WHERE role="staff"').fetchone()[0]
-    preds_count = conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
-    customers_count = conn.execute('SELECT COUNT(*) FROM Customer').fetchone()[0]
-    analyses_count = conn.execute('SELECT COUNT(*) FROM Skin_Analysis').fetchone()[0]
+    # Kept up to date by triggers (ai/counters.py), no table is counted here
+    counts = read_counters(conn)
     conn.close()
     
     return render_template('dashboard.html', 
-                         users=users_count, 
-                         preds=preds_count,
-                         customers=customers_count,
-                         analyses=analyses_count)
+                         users=counts['staff_users'], 
+                         preds=counts['predictions'],
+                         customers=counts['customers'],
+                         analyses=counts['analyses'])
 
 
 @admin_bp.route('/users')
@@ -141,6 +139,8 @@ def delete_user(user_id):
         customers = conn.execute('SELECT customer_id FROM Customer WHERE user_id = ?', (user_id,)).fetchall()
         for customer in customers:
             customer_id = customer['customer_id']
+            # Delete quiz responses for this customer (they may reference its analyses)
+            conn.execute('DELETE FROM Quiz_Response WHERE customer_id = ?', (customer_id,))
             # Delete suggestions for analyses of this customer
             conn.execute('''
                 DELETE FROM Suggestion 
@@ -150,8 +150,6 @@ def delete_user(user_id):
             ''', (customer_id,))
             # Delete skin analyses
             conn.execute('DELETE FROM Skin_Analysis WHERE customer_id = ?', (customer_id,))
-            # Delete quiz responses for this customer
-            conn.execute('DELETE FROM Quiz_Response WHERE customer_id = ?', (customer_id,))
         
         # Delete customers
         conn.execute('DELETE FROM Customer WHERE user_id = ?', (user_id,))
@@ -159,6 +157,7 @@ def delete_user(user_id):
         # Finally delete the user
         conn.execute('DELETE FROM User WHERE user_id = ?', (user_id,))
         conn.commit()
+        logger.info("User %s deleted by %s", user['username'], session.get('username'))
         flash(f"User {user['username']} and all related data deleted successfully.")
     elif user and user['role'] == 'admin':
         flash("Cannot delete admin user.")
@@ -192,6 +191,7 @@ def reset_user_password(user_id):
         conn.execute('UPDATE User SET password_hash = ? WHERE user_id = ?', (password_hash, user_id))
         conn.commit()
         conn.close()
+        logger.info("Password for %s reset by %s", user['username'], session.get('username'))
         flash(f"Password for {user['username']} has been reset successfully.")
         return redirect(url_for('admin_bp.users'))
 
@@ -328,4 +328,24 @@ def analyses():
     ''').fetchall()
     conn.close()
     
-    return render_template('analyses.html', analyses=analyses_data)
\ No newline at end of file
+    return render_template('analyses.html', analyses=analyses_data)
+
+
+@admin_bp.route('/metrics')
+@admin_required
+def metrics():
+    """Per-stage latency percentiles of the analysis pipeline"""
+    return render_template('metrics.html', metrics=registry.snapshot())
+
+
+@admin_bp.route('/metrics.json')
+def metrics_json():
+    """Machine-readable metrics: admin session or the metrics bearer token"""
+    auth = request.headers.get('Authorization', '')
+    # Bytes: compare_digest refuses str with non-ASCII characters (TypeError)
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(auth.encode(), f'Bearer {METRICS_TOKEN}'.encode())
+    if session.get('role') == 'admin' or token_ok:
+        return jsonify(registry.snapshot())
+    if auth:
+        return jsonify(error='Invalid metrics token.'), 401, {'WWW-Authenticate': 'Bearer'}
+    return jsonify(error='Admin access required.'), 403
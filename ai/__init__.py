@@ -0,0 +1,8 @@
+import os
+
+# OpenCV reads its own decoder pixel limit once, when cv2 is first imported,
+# so it is set before any module of this package imports cv2: a second line
+# of defence behind the header check in predict.decode_image.
+_max_pixels = os.environ.get('SKIN_AI_MAX_IMAGE_PIXELS', '50000000')
+if int(_max_pixels) > 0:
+    os.environ.setdefault('OPENCV_IO_MAX_IMAGE_PIXELS', _max_pixels)
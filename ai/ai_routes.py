@@ -1,10 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, get_flashed_messages
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, get_flashed_messages, jsonify
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import hashlib
+import logging
 import os
 import sqlite3
-from .predict import ai_predict
+import tempfile
+import threading
+from . import predict
+from .predict import ai_predict, ai_predict_faces, model_status
+from .db import DB_PATH, get_db_connection
+from .quiz import quiz_catalog, save_responses
+from .analysis_store import load_suggestions, save_analysis
+from .executor import ExecutorBusy, inference_executor
+from .video import analyze_video, is_video_upload
+from .jobs import JobQueue, QUEUED, RUNNING, DONE, REJECTED
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
 
 ai_bp = Blueprint(
     'ai',
@@ -14,21 +28,30 @@ ai_bp = Blueprint(
     static_url_path='/ai_static'
 )
 
-# Path to main DB
-ADMIN_DB = os.path.join(os.path.dirname(__file__), '../dermasoul.db')
-print(f"AI ADMIN_DB path: {os.path.abspath(ADMIN_DB)}")
-
-# Uploads folder
+# Uploads folder (only written to when upload retention is enabled)
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# ---------- DATABASE HELPER ----------
-def get_db_connection():
-    """Get database connection with row factory"""
-    conn = sqlite3.connect(ADMIN_DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Uploads are analysed in memory; set SKIN_AI_RETAIN_UPLOADS=1 to keep a copy
+# of each successfully analysed image in UPLOAD_FOLDER.
+RETAIN_UPLOADS = os.environ.get('SKIN_AI_RETAIN_UPLOADS', '0') == '1'
+
+# Async analysis: SKIN_AI_ASYNC_ANALYSIS=1 queues every upload as a background
+# job, otherwise only uploads posted with async=1 are. Synchronous is the default.
+ASYNC_ANALYSIS = os.environ.get('SKIN_AI_ASYNC_ANALYSIS', '0') == '1'
+JOB_WORKERS = int(os.environ.get('SKIN_AI_JOB_WORKERS', '2'))
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Create the analysis job queue (and its worker threads) on first use"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue(DB_PATH, workers=JOB_WORKERS)
+    return _job_queue
 
 # ---------- ROUTES ----------
 
@@ -122,255 +145,324 @@ def logout():
 
 @ai_bp.route('/analyzer', methods=['GET', 'POST'])
 def analyzer():
-    print("\n" + " "*30)
-    print("ANALYZER ROUTE CALLED!")
-    print(f"Method: {request.method}")
-    print(f"URL: {request.url}")
-    print(f"User in session: {'user_id' in session}")
-    print(" "*30 + "\n")
+    logger.debug("Analyzer %s, user in session: %s", request.method, 'user_id' in session)
     
     if 'user_id' not in session:
-        print(" No user in session - redirecting to login")
         flash("Please login to access the analyzer.", "error")
         return redirect(url_for('ai.login'))
 
     # Clear error flags on GET request
     if request.method == 'GET':
-        print("GET request - clearing error flags and rendering template")
         session.pop('show_face_error', None)
         session.pop('show_animal_error', None)
         session.pop('no_face_warning', None)
         return render_template('analyzer.html')
 
     # POST request - handle image upload
-    print("\n" + "="*60)
-    print("POST REQUEST - IMAGE UPLOAD")
-    print("="*60)
-    
+    with timed('analyzer.post'):
+        return _handle_upload()
+
+
+def _handle_upload():
     try:
         # Check if file part exists
-        print(f"request.files keys: {list(request.files.keys())}")
-        print(f"request.form keys: {list(request.form.keys())}")
-        
         if 'image' not in request.files:
-            print("No 'image' in request.files")
+            logger.info("Analyzer POST without an image")
             flash("No image uploaded.", "error")
             return render_template('analyzer.html')
 
         file = request.files['image']
-        print(f"File object: {file}")
-        print(f"Filename: {file.filename}")
         
         if file.filename == '':
-            print("Empty filename")
             flash("No image selected.", "error")
             return render_template('analyzer.html')
 
         # Get customer name
         customer_name = request.form.get('customerName', '').strip()
-        print(f"Customer name: '{customer_name}'")
         
         if not customer_name:
-            print("No customer name")
             flash("Please enter the customer's name.", "error")
             return render_template('analyzer.html')
 
-        print(f"Customer: {customer_name}")
-        print(f"File: {file.filename}")
-
-        # Save the file
+        # Read the upload straight from the request stream, no temp file
         filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        
-        print(f"Saving to: {filepath}")
-        file.save(filepath)
-        
-        print(f"   File saved successfully")
-        print(f"   Exists: {os.path.exists(filepath)}")
-        print(f"   Size: {os.path.getsize(filepath)} bytes")
+        with timed('analyzer.read_upload'):
+            image_bytes = file.read()
+        logger.debug("Upload %s (%d bytes) for customer %r", filename, len(image_bytes), customer_name)
 
-        # Run prediction
-        print("\n Calling ai_predict()...")
-        prediction_result = ai_predict(filepath)
-        
-        print(f"\n Prediction completed!")
-        print(f"   Result type: {type(prediction_result)}")
-        print(f"   Result keys: {list(prediction_result.keys())}")
-        
-        for key, value in prediction_result.items():
-            print(f"   {key}: {value}")
-
-        #  Check for errors BEFORE saving to database
-        if prediction_result.get("error"):
-            error_msg = prediction_result.get("error")
-            print(f"\n PREDICTION ERROR: {error_msg}")
-            
-            # Clean up file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                print("   Cleaned up file")
-            
-            # Set error flags and redirect - NO DATABASE SAVE
-            error_lower = error_msg.lower()
-            if "animal" in error_lower or "fur" in error_lower or "non-human" in error_lower:
-                print("   Setting show_animal_error = True")
-                session['show_animal_error'] = True
-                session.modified = True
-                return redirect(url_for('ai.analyzer'))
-            elif "face" in error_lower:
-                print("   Setting show_face_error = True")
-                session['show_face_error'] = True
-                session.modified = True
-                return redirect(url_for('ai.analyzer'))
-            else:
-                print("   Showing generic error")
-                flash(f"Error: {error_msg}", "error")
-                return render_template('analyzer.html')
-        
-        # check for "message" field (no face warning from predict.py)
-        if prediction_result.get("message"):
-            warning_msg = prediction_result.get("message")
-            print(f"\n PREDICTION WARNING: {warning_msg}")
-            
-            # Clean up file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                print("   Cleaned up file")
-            
-            # Show face detection error
-            session['show_face_error'] = True
-            session.modified = True
-            return redirect(url_for('ai.analyzer'))
-        
-        # Validate required keys
-        required_keys = ['skin_type', 'acne_type', 'skin_confidence', 'acne_confidence', 'face_detected']
-        missing = [k for k in required_keys if k not in prediction_result]
-        
-        if missing:
-            print(f" Missing keys: {missing}")
-            flash(f"Invalid prediction: missing {', '.join(missing)}", "error")
-            if os.path.exists(filepath):
-                os.remove(filepath)
+        if not image_bytes:
+            flash("Uploaded image is empty.", "error")
             return render_template('analyzer.html')
 
-        # Check if results are "unknown" (from predict.py when no face detected)
-        if prediction_result['skin_type'] == 'unknown' or prediction_result['acne_type'] == 'unknown':
-            print(f" Unknown skin/acne type detected")
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            session['show_face_error'] = True
-            session.modified = True
-            return redirect(url_for('ai.analyzer'))
+        # Short face videos are sampled and aggregated into one analysis (synchronous)
+        is_video = is_video_upload(filename, file.mimetype)
+        analyse = analyze_video if is_video else ai_predict
+
+        # Every face in the photo becomes its own analysis (always synchronous)
+        if not is_video and request.form.get('multiFace') == '1':
+            return _handle_multi_face(customer_name, request.form.get('faceNames', ''), filename, image_bytes)
+
+        if not is_video and (ASYNC_ANALYSIS or request.form.get('async') == '1'):
+            response = _submit_analysis_job(customer_name, filename, image_bytes)
+            if response is not None:
+                return response
+            logger.warning("Job queue unavailable, falling back to synchronous analysis")
+
+        # Run prediction (refused straight away when the analyzer is saturated)
+        try:
+            with timed('analyzer.predict'):
+                prediction_result = inference_executor.run(analyse, image_bytes)
+        except ExecutorBusy as e:
+            return _busy_response(e)
+        logger.debug("Prediction result", extra={"prediction": prediction_result})
+
+        #  Check for errors BEFORE saving to database
+        rejection = _rejection_response(prediction_result)
+        if rejection is not None:
+            return rejection
 
-        print(" All required keys present and valid")
+        if RETAIN_UPLOADS:
+            filename = retain_upload(image_bytes, filename)
+            logger.debug("Retained upload as %s", filename)
 
         #  ONLY SAVE TO DATABASE IF ALL CHECKS PASS
-        print("\n Saving to database...")
-        conn = get_db_connection()
-        
-        # Create/Get Customer
-        customer = conn.execute(
-            "SELECT * FROM Customer WHERE customer_name = ? AND user_id = ?",
-            (customer_name, session['user_id'])
-        ).fetchone()
-        
-        if not customer:
-            cursor = conn.execute(
-                "INSERT INTO Customer (customer_name, user_id, image_path) VALUES (?, ?, ?)",
-                (customer_name, session['user_id'], filename)
-            )
-            customer_id = cursor.lastrowid
-            print(f"   Created customer ID: {customer_id}")
-        else:
-            customer_id = customer['customer_id']
-            conn.execute(
-                "UPDATE Customer SET image_path = ? WHERE customer_id = ?",
-                (filename, customer_id)
-            )
-            print(f"   Updated customer ID: {customer_id}")
-        
-        # Create Analysis
-        cursor = conn.execute(
-            '''INSERT INTO Skin_Analysis 
-            (customer_id, skin_type, acne_level, skin_confidence, acne_confidence, face_detected)
-            VALUES (?, ?, ?, ?, ?, ?)''',
-            (customer_id, prediction_result['skin_type'], prediction_result['acne_type'],
-             prediction_result['skin_confidence'], prediction_result['acne_confidence'],
-             prediction_result['face_detected'])
-        )
-        analysis_id = cursor.lastrowid
-        print(f"   Created analysis ID: {analysis_id}")
-        
-        # Save suggestions
-        suggestions = generate_suggestions(
-            prediction_result['skin_type'],
-            prediction_result['acne_type']
-        )
-        
-        for suggestion_text in suggestions:
-            conn.execute(
-                "INSERT INTO Suggestion (analysis_id, suggestion_text) VALUES (?, ?)",
-                (analysis_id, suggestion_text)
+        with timed('analyzer.db_write'):
+            conn = get_db_connection()
+            customer_id, analysis_id = save_analysis(
+                conn, session['user_id'], session['salon_name'],
+                customer_name, filename, prediction_result
             )
-        print(f"   Saved {len(suggestions)} suggestions")
-        
-        # Save to predictions table
-        db_result = f"Skin: {prediction_result['skin_type']}, Acne: {prediction_result['acne_type']}"
-        confidence = max(prediction_result['skin_confidence'], prediction_result['acne_confidence'])
-        
-        conn.execute(
-            "INSERT INTO predictions (user_id, image_name, result, confidence, salon_name) VALUES (?, ?, ?, ?, ?)",
-            (session['user_id'], filename, db_result, confidence, session['salon_name'])
-        )
-        
-        conn.commit()
-        conn.close()
-        print("    Database save complete")
+            conn.commit()
+            conn.close()
 
         # Store in session
-        print("\n Storing in session...")
-        session['customer_id'] = customer_id
-        session['customer_name'] = customer_name
-        session['analysis_id'] = analysis_id
-        session['skin_type'] = prediction_result['skin_type']
-        session['acne'] = prediction_result['acne_type']
-        session['skin_confidence'] = prediction_result['skin_confidence']
-        session['acne_confidence'] = prediction_result['acne_confidence']
-        session['face_detected'] = prediction_result['face_detected']
-        session.modified = True
-        
-        print(f"   Session stored: {list(session.keys())}")
-
-        # Clean up
-        if os.path.exists(filepath):
-            os.remove(filepath)
-            print("   Cleaned up file")
-        
-        print("\n SUCCESS! Redirecting to result page...")
-        print(f"   Redirect URL: {url_for('ai.result')}")
-        print("="*60 + "\n")
+        _store_analysis_in_session(customer_id, customer_name, analysis_id, prediction_result)
         
+        logger.info("Analysis saved", extra={
+            "analysis_id": analysis_id,
+            "skin_type": prediction_result['skin_type'],
+            "acne_type": prediction_result['acne_type'],
+            "face_detected": prediction_result['face_detected'],
+        })
         return redirect(url_for('ai.result'))
 
     except Exception as e:
-        print(f"\n EXCEPTION in analyzer:")
-        print(f"   Type: {type(e).__name__}")
-        print(f"   Message: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Exception in analyzer")
         
         flash(f"An error occurred: {str(e)}", "error")
         
-        if 'filepath' in locals() and os.path.exists(locals()['filepath']):
-            try:
-                os.remove(locals()['filepath'])
-                print("   Cleaned up file")
-            except:
-                pass
+        return render_template('analyzer.html')
+
+
+def _face_customer_names(customer_name, face_names, count):
+    """
+    Customer for each face, left to right: one line of `face_names` per face
+    (a name cannot contain a line break, unlike a comma); left empty, the photo
+    is one customer (before/after shots) and `customer_name` is used for every
+    face. None when the number of names does not match the number of faces.
+    """
+    names = [n.strip() for n in face_names.splitlines() if n.strip()]
+    if not names:
+        return [customer_name] * count
+    if len(names) != count:
+        return None
+    return names
+
+
+def _handle_multi_face(customer_name, face_names, filename, image_bytes):
+    try:
+        with timed('analyzer.predict'):
+            prediction = inference_executor.run(ai_predict_faces, image_bytes)
+    except ExecutorBusy as e:
+        return _busy_response(e)
+
+    if "faces" not in prediction:
+        return _rejection_response(prediction)
+    faces = prediction["faces"]
+    for face in faces:
+        rejection = _rejection_response(face)
+        if rejection is not None:
+            return rejection
+
+    names = _face_customer_names(customer_name, face_names, len(faces))
+    if names is None:
+        logger.info("Multi-face names do not match the faces", extra={"face_count": len(faces)})
+        flash(f"The photo has {len(faces)} faces. Enter one name per face, one per line "
+              "(left to right), or leave the names empty if every face is the same customer.", "error")
+        return render_template('analyzer.html')
+
+    if RETAIN_UPLOADS:
+        filename = retain_upload(image_bytes, filename)
+
+    saved = []
+    with timed('analyzer.db_write'):
+        conn = get_db_connection()
+        for name, face in zip(names, faces):
+            customer_id, analysis_id = save_analysis(
+                conn, session['user_id'], session['salon_name'], name, filename, face
+            )
+            saved.append((customer_id, name, analysis_id, face))
+        conn.commit()
+        conn.close()
+
+    # The first face drives result/suggestions/quiz; the others are listed on the result page
+    customer_id, name, analysis_id, face = saved[0]
+    _store_analysis_in_session(customer_id, name, analysis_id, face)
+    session['multi_face'] = [
+        {"analysis_id": a_id, "customer_name": n, "skin_type": f['skin_type'], "acne": f['acne_type']}
+        for _, n, a_id, f in saved
+    ]
+    logger.info("Multi-face analysis saved", extra={
+        "analysis_ids": [a_id for _, _, a_id, _ in saved],
+        "face_count": prediction["face_count"],
+    })
+    return redirect(url_for('ai.result'))
+
+
+def _busy_response(busy):
+    """503 with Retry-After when the inference executor refuses the upload"""
+    logger.warning("Analyzer busy, upload refused (retry after %ss)", busy.retry_after)
+    headers = {'Retry-After': str(busy.retry_after)}
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(error='busy', retry_after=busy.retry_after), 503, headers
+    flash(f"The analyzer is busy right now. Please try again in {busy.retry_after} seconds.", "error")
+    return render_template('analyzer.html'), 503, headers
+
+
+def _rejection_response(prediction_result):
+    """
+    Response for a prediction that must not be saved (error, no face, unknown),
+    setting the session flags analyzer.html shows. None if the result is usable.
+    """
+    reason = prediction_result.get("rejection_reason")
+    if prediction_result.get("error"):
+        error_msg = prediction_result.get("error")
+        logger.info("Prediction rejected: %s", error_msg, extra={"rejection_reason": reason})
+        
+        # Set error flags and redirect - NO DATABASE SAVE
+        # (decided on rejection_reason: quality messages mention the face too)
+        if reason == "not_human":
+            session['show_animal_error'] = True
+            session.modified = True
+            return redirect(url_for('ai.analyzer'))
+        elif reason == "no_face":
+            session['show_face_error'] = True
+            session.modified = True
+            return redirect(url_for('ai.analyzer'))
+        else:
+            flash(f"Error: {error_msg}", "error")
+            return render_template('analyzer.html')
+    
+    # check for "message" field (no face warning from predict.py)
+    if prediction_result.get("message"):
+        warning_msg = prediction_result.get("message")
+        logger.info("Prediction warning: %s", warning_msg)
         
+        # Show face detection error
+        session['show_face_error'] = True
+        session.modified = True
+        return redirect(url_for('ai.analyzer'))
+    
+    # Validate required keys
+    required_keys = ['skin_type', 'acne_type', 'skin_confidence', 'acne_confidence', 'face_detected']
+    missing = [k for k in required_keys if k not in prediction_result]
+    
+    if missing:
+        logger.error("Invalid prediction, missing keys: %s", missing)
+        flash(f"Invalid prediction: missing {', '.join(missing)}", "error")
         return render_template('analyzer.html')
 
-       
+    # Check if results are "unknown" (from predict.py when no face detected)
+    if prediction_result['skin_type'] == 'unknown' or prediction_result['acne_type'] == 'unknown':
+        logger.info("Unknown skin/acne type detected")
+        session['show_face_error'] = True
+        session.modified = True
+        return redirect(url_for('ai.analyzer'))
+
+    return None
+
+
+def _store_analysis_in_session(customer_id, customer_name, analysis_id, prediction_result):
+    session.pop('multi_face', None)
+    session['customer_id'] = customer_id
+    session['customer_name'] = customer_name
+    session['analysis_id'] = analysis_id
+    session['skin_type'] = prediction_result['skin_type']
+    session['acne'] = prediction_result['acne_type']
+    session['skin_confidence'] = prediction_result['skin_confidence']
+    session['acne_confidence'] = prediction_result['acne_confidence']
+    session['face_detected'] = prediction_result['face_detected']
+    session.modified = True
+
+
+def _submit_analysis_job(customer_name, filename, image_bytes):
+    """Queue the upload as a background job; None if the queue is unavailable"""
+    if RETAIN_UPLOADS:
+        # Kept at submit time, the job drops its copy of the image when finished
+        filename = retain_upload(image_bytes, filename)
+
+    try:
+        job_id = get_job_queue().submit(
+            session['user_id'], session['salon_name'], customer_name, filename, image_bytes
+        )
+    except sqlite3.Error as e:
+        logger.error("Could not queue analysis job: %s", e)
+        return None
+
+    logger.info("Queued analysis job %s", job_id)
+    session['job_id'] = job_id
+    session.modified = True
+
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job_id=job_id, status='queued',
+                       status_url=url_for('ai.job_status', job_id=job_id)), 202
+    return redirect(url_for('ai.result'))
+
+
+def _collect_job(job_id):
+    """
+    Check on the session's async job. Once it is done its analysis is moved into
+    the session like the synchronous flow and None is returned; while it is
+    still pending (or if it was rejected) the response to send is returned.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None or job['user_id'] != session['user_id']:
+        session.pop('job_id', None)
+        return None
+
+    if job['status'] in (QUEUED, RUNNING):
+        return render_template('job_pending.html',
+                               customer_name=job['customer_name'],
+                               status_url=url_for('ai.job_status', job_id=job_id))
+
+    session.pop('job_id', None)
+    if job['status'] == DONE:
+        _store_analysis_in_session(job['customer_id'], job['customer_name'], job['analysis_id'], job['result'])
+        return None
+    if job['status'] == REJECTED:
+        return _rejection_response(job['result'])
+
+    flash(f"An error occurred: {job['error']}", "error")
+    return redirect(url_for('ai.analyzer'))
+
+
+@ai_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """JSON status of an async analysis job, for polling"""
+    if 'user_id' not in session:
+        return jsonify(error='Please login first.'), 401
+
+    job = get_job_queue().get(job_id)
+    if job is None or job['user_id'] != session['user_id']:
+        return jsonify(error='Job not found.'), 404
+
+    return jsonify(job_id=job['job_id'],
+                   status=job['status'],
+                   result=job['result'],
+                   error=job['error'],
+                   analysis_id=job['analysis_id'],
+                   result_url=url_for('ai.result'))
+
 
 @ai_bp.route('/result')
 def result():
@@ -378,6 +470,11 @@ def result():
         flash('Please login first.', 'error')
         return redirect(url_for('ai.login'))
 
+    if 'job_id' in session:
+        response = _collect_job(session['job_id'])
+        if response is not None:
+            return response
+
     if 'analysis_id' not in session:
         flash('Please analyze skin first.', 'error')
         return redirect(url_for('ai.analyzer'))
@@ -388,7 +485,8 @@ def result():
                            acne=session['acne'],
                            face_detected='yes' if session.get('face_detected', False) else 'no',
                            skin_confidence=session.get('skin_confidence', 0),
-                           acne_confidence=session.get('acne_confidence', 0))
+                           acne_confidence=session.get('acne_confidence', 0),
+                           faces=session.get('multi_face'))
 
 
 @ai_bp.route('/suggestions')
@@ -403,14 +501,9 @@ def suggestions():
 
     # Get suggestions from database (as per ER diagram)
     conn = get_db_connection()
-    suggestions_list = conn.execute(
-        "SELECT suggestion_text FROM Suggestion WHERE analysis_id = ?",
-        (session['analysis_id'],)
-    ).fetchall()
+    suggestions = load_suggestions(conn, session['analysis_id'])
     conn.close()
 
-    suggestions = [s['suggestion_text'] for s in suggestions_list]
-
     return render_template('suggestions.html',
                            customer_name=session.get('customer_name', 'Customer'),
                            skin_type=session['skin_type'],
@@ -434,33 +527,16 @@ def quiz():
     conn = get_db_connection()
 
     if request.method == 'POST':
-        # Save quiz responses to database (as per ER diagram)
+        # Save quiz responses to database (as per ER diagram), all in one transaction
         try:
-            responses_saved = []
-            for key, value in request.form.items():
-                if key.startswith('question_'):
-                    question_id = int(key.split('_')[1])
-                    option_id = int(value)
-                    
-                    # Insert Quiz_Response as per ER diagram
-                    conn.execute(
-                        '''
-                        INSERT INTO Quiz_Response 
-                        (customer_id, question_id, option_id, analysis_id, user_id)
-                        VALUES (?, ?, ?, ?, ?)
-                        ''',
-                        (
-                            session['customer_id'],
-                            question_id,
-                            option_id,
-                            session['analysis_id'],
-                            session['user_id']
-                        )
-                    )
-                    responses_saved.append(question_id)
-            
-            conn.commit()
-            print(f"Saved quiz responses for customer {session['customer_id']}")
+            answers = [
+                (int(key.split('_')[1]), int(value))
+                for key, value in request.form.items()
+                if key.startswith('question_')
+            ]
+            responses_saved = save_responses(conn, session['customer_id'], session['analysis_id'],
+                                             session['user_id'], answers)
+            logger.debug("Saved quiz responses for customer %s", session['customer_id'])
             
             # IMPORTANT: Mark quiz as completed in session
             session['quiz_completed'] = True
@@ -469,30 +545,16 @@ def quiz():
             # Don't flash - redirect silently
             # flash('Quiz completed successfully!', 'success')
             
-        except Exception as e:
-            print(f"Error saving quiz responses: {e}")
+        except Exception:
+            logger.exception("Error saving quiz responses")
             flash('Error saving quiz responses', 'error')
         finally:
             conn.close()
             
         return redirect(url_for('ai.suggestions'))
 
-    # GET request - load quiz questions (as per ER diagram)
-    questions = conn.execute(
-        "SELECT * FROM Quiz_Question ORDER BY question_id"
-    ).fetchall()
-    
-    quiz_data = []
-    for question in questions:
-        options = conn.execute(
-            "SELECT * FROM Quiz_Options WHERE question_id = ?",
-            (question['question_id'],)
-        ).fetchall()
-        quiz_data.append({
-            'question': question,
-            'options': options
-        })
-    
+    # GET request - quiz questions and options from the process-level catalog cache
+    quiz_data = quiz_catalog.get(conn)
     conn.close()
 
     return render_template('quiz.html',
@@ -529,12 +591,12 @@ def user_feedback():
             conn.commit()
             conn.close()
             
-            print(f"Saved anonymous feedback")
+            logger.debug("Saved anonymous feedback")
             flash('Thank you for your feedback!', 'success')
             return redirect(url_for('ai.user_feedback'))
             
-        except Exception as e:
-            print(f"Feedback error: {e}")
+        except Exception:
+            logger.exception("Feedback error")
             flash('Error saving feedback. Please try again.', 'error')
             return render_template('user_feedback.html')
     
@@ -566,79 +628,40 @@ def history():
     return render_template('history.html', analyses=analyses, username=session['username'])
 
 
+# ---------- HEALTH CHECKS ----------
+
+@ai_bp.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving, models may still be loading"""
+    cache = predict.prediction_cache
+    return jsonify(status='ok', models=model_status(),
+                   cache=cache.stats() if cache is not None else None)
+
+
+@ai_bp.route('/readyz')
+def readyz():
+    """Readiness: only 200 once the models are loaded and warmed up"""
+    status = model_status()
+    ready = status['loaded'] and status['warmed_up']
+    return jsonify(ready=ready, models=status), 200 if ready else 503
+
+
 # ---------- HELPER FUNCTIONS ----------
 
-def generate_suggestions(skin_type, acne_level):
-    """Generate personalized suggestions based on analysis"""
-    suggestions = []
-    
-    # Skin type suggestions (handle both lowercase and capitalized)
-    skin_type_lower = skin_type.lower()
-    
-    if 'oil' in skin_type_lower:
-        suggestions.extend([
-            "Use oil-free, non-comedogenic moisturizers to avoid clogging pores",
-            "Wash face twice daily with a gentle foaming cleanser",
-            "Use products with salicylic acid to control excess oil",
-            "Avoid heavy creams and opt for gel-based products"
-        ])
-    elif 'dry' in skin_type_lower:
-        suggestions.extend([
-            "Use rich, hydrating moisturizers with hyaluronic acid or ceramides",
-            "Avoid harsh soaps and hot water that strip natural oils",
-            "Apply moisturizer immediately after cleansing while skin is damp",
-            "Use a gentle, cream-based cleanser"
-        ])
-    elif 'combination' in skin_type_lower:
-        suggestions.extend([
-            "Use different products for different zones (T-zone vs cheeks)",
-            "Apply lightweight moisturizer on oily areas, richer cream on dry areas",
-            "Consider using blotting papers for T-zone during the day",
-            "Balance your routine with products suitable for mixed skin"
-        ])
-    else:  # Normal
-        suggestions.extend([
-            "Maintain your current routine with gentle, balanced products",
-            "Use a mild cleanser and lightweight moisturizer",
-            "Focus on protection with SPF 30+ sunscreen daily"
-        ])
-    
-    # Acne suggestions
-    acne_lower = acne_level.lower()
-    if 'severe' in acne_lower or 'very_severe' in acne_lower:
-        suggestions.extend([
-            "Consult a dermatologist for professional treatment options",
-            "Consider prescription treatments like retinoids or antibiotics",
-            "Use benzoyl peroxide or salicylic acid spot treatments",
-            "Avoid touching, picking, or squeezing acne lesions"
-        ])
-    elif 'moderate' in acne_lower:
-        suggestions.extend([
-            "Use over-the-counter acne treatments with benzoyl peroxide",
-            "Keep skin clean with twice-daily gentle cleansing",
-            "Consider consulting a dermatologist if condition worsens",
-            "Use non-comedogenic makeup and skincare products"
-        ])
-    elif 'mild' in acne_lower:
-        suggestions.extend([
-            "Keep skin clean with twice-daily gentle cleansing",
-            "Use over-the-counter acne spot treatments",
-            "Exfoliate gently 1-2 times per week",
-            "Use non-comedogenic makeup and skincare products"
-        ])
-    else:  # No acne or clear
-        suggestions.extend([
-            "Maintain clear skin with consistent gentle cleansing",
-            "Continue using non-comedogenic products",
-            "Keep up with sun protection to prevent damage"
-        ])
-    
-    # General suggestions
-    suggestions.extend([
-        "Drink plenty of water (8+ glasses daily) for skin hydration",
-        "Get 7-9 hours of quality sleep each night",
-        "Eat a balanced diet rich in fruits, vegetables, and omega-3s",
-        "Change pillowcases regularly to reduce bacteria exposure"
-    ])
-    
-    return suggestions
\ No newline at end of file
+def retain_upload(image_bytes, original_filename):
+    """
+    Persist an upload under a content-addressed name (sha256 + extension), so
+    two salons uploading IMG_0001.jpg at once can never overwrite each other.
+    """
+    ext = os.path.splitext(secure_filename(original_filename))[1].lower()
+    filename = hashlib.sha256(image_bytes).hexdigest() + ext
+    filepath = os.path.join(UPLOAD_FOLDER, filename)
+
+    if not os.path.exists(filepath):
+        # Write to a unique temp file and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, filepath)
+
+    return filename
@@ -0,0 +1,230 @@
+"""Writing a finished analysis to the database, shared by the web app and batch tools"""
+import logging
+import sqlite3
+from urllib.request import pathname2url
+
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestionCatalog:
+    """
+    In-memory copy of Suggestion_Catalog (id <-> text). Texts are only ever
+    added, so committed entries never go stale; a text or id that is not
+    cached reloads the (small) table, and a new text is inserted.
+
+    Only committed rows are cached. save_analysis runs inside the caller's
+    transaction, so a miss there reads the catalog on a separate read-only
+    connection (WAL readers do not wait for the writer); rows the transaction
+    inserts itself are used for that call only and are cached by the first
+    lookup after they are committed.
+    """
+
+    def __init__(self):
+        self._by_text = {}
+        self._by_id = {}
+
+    @staticmethod
+    def _read(conn):
+        rows = conn.execute("SELECT suggestion_id, suggestion_text FROM Suggestion_Catalog").fetchall()
+        return ({text: suggestion_id for suggestion_id, text in rows},
+                {suggestion_id: text for suggestion_id, text in rows})
+
+    def _reload(self, conn):
+        """Reload the committed catalog into the cache; falls back to an uncached read of conn"""
+        if not conn.in_transaction:
+            self._by_text, self._by_id = self._read(conn)
+            return self._by_text, self._by_id
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        if not path:        # in-memory database, no other connection can see it
+            return self._read(conn)
+        reader = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True)
+        try:
+            self._by_text, self._by_id = self._read(reader)
+        finally:
+            reader.close()
+        return self._by_text, self._by_id
+
+    def ids(self, conn, texts):
+        """Catalog ids for these texts, adding the ones not seen before"""
+        by_text = self._by_text
+        if any(t not in by_text for t in texts):
+            by_text, _ = self._reload(conn)
+            missing = [t for t in dict.fromkeys(texts) if t not in by_text]
+            if missing:
+                conn.executemany("INSERT OR IGNORE INTO Suggestion_Catalog (suggestion_text) VALUES (?)",
+                                 [(t,) for t in missing])
+                by_text, _ = self._read(conn)
+        return [by_text[t] for t in texts]
+
+    def texts(self, conn, ids):
+        by_id = self._by_id
+        if any(i not in by_id for i in ids):
+            _, by_id = self._reload(conn)
+            if any(i not in by_id for i in ids):
+                _, by_id = self._read(conn)     # inserted by conn's own open transaction
+        return [by_id[i] for i in ids]
+
+
+suggestion_catalog = SuggestionCatalog()
+
+
+def load_suggestions(conn, analysis_id):
+    """Suggestion texts of an analysis, in the order they were generated"""
+    rows = conn.execute(
+        "SELECT suggestion_id FROM Suggestion WHERE analysis_id = ? ORDER BY position", (analysis_id,)
+    ).fetchall()
+    return suggestion_catalog.texts(conn, [row[0] for row in rows])
+
+
+def save_analysis(conn, user_id, salon_name, customer_name, image_name, prediction_result):
+    """
+    Store one successful prediction: create or update the Customer, then insert
+    the Skin_Analysis, its Suggestion rows and the admin predictions row.
+    Does not commit, so callers can group it with their own writes.
+    Returns (customer_id, analysis_id).
+    """
+    # Create/Get Customer
+    customer = conn.execute(
+        "SELECT customer_id FROM Customer WHERE customer_name = ? AND user_id = ?",
+        (customer_name, user_id)
+    ).fetchone()
+
+    if not customer:
+        cursor = conn.execute(
+            "INSERT INTO Customer (customer_name, user_id, image_path) VALUES (?, ?, ?)",
+            (customer_name, user_id, image_name)
+        )
+        customer_id = cursor.lastrowid
+        logger.debug("Created customer ID: %s", customer_id)
+    else:
+        customer_id = customer[0]
+        conn.execute(
+            "UPDATE Customer SET image_path = ? WHERE customer_id = ?",
+            (image_name, customer_id)
+        )
+        logger.debug("Updated customer ID: %s", customer_id)
+
+    # Create Analysis
+    cursor = conn.execute(
+        '''INSERT INTO Skin_Analysis 
+        (customer_id, skin_type, acne_level, skin_confidence, acne_confidence, face_detected)
+        VALUES (?, ?, ?, ?, ?, ?)''',
+        (customer_id, prediction_result['skin_type'], prediction_result['acne_type'],
+         prediction_result['skin_confidence'], prediction_result['acne_confidence'],
+         prediction_result['face_detected'])
+    )
+    analysis_id = cursor.lastrowid
+    logger.debug("Created analysis ID: %s", analysis_id)
+
+    # Save suggestions
+    with timed('analysis.suggestions'):
+        suggestions = generate_suggestions(
+            prediction_result['skin_type'],
+            prediction_result['acne_type']
+        )
+
+    # Only catalog ids are stored per analysis, all rows in one statement
+    suggestion_ids = suggestion_catalog.ids(conn, suggestions)
+    conn.executemany(
+        "INSERT INTO Suggestion (analysis_id, suggestion_id, position) VALUES (?, ?, ?)",
+        [(analysis_id, suggestion_id, position) for position, suggestion_id in enumerate(suggestion_ids)]
+    )
+    logger.debug("Saved %d suggestions", len(suggestions))
+
+    # Save to predictions table
+    db_result = f"Skin: {prediction_result['skin_type']}, Acne: {prediction_result['acne_type']}"
+    confidence = max(prediction_result['skin_confidence'], prediction_result['acne_confidence'])
+
+    conn.execute(
+        "INSERT INTO predictions (user_id, image_name, result, confidence, salon_name) VALUES (?, ?, ?, ?, ?)",
+        (user_id, image_name, db_result, confidence, salon_name)
+    )
+
+    return customer_id, analysis_id
+
+
+def generate_suggestions(skin_type, acne_level):
+    """Generate personalized suggestions based on analysis"""
+    suggestions = []
+    
+    # Skin type suggestions (handle both lowercase and capitalized)
+    skin_type_lower = skin_type.lower()
+    
+    if 'oil' in skin_type_lower:
+        suggestions.extend([
+            "Use oil-free, non-comedogenic moisturizers to avoid clogging pores",
+            "Wash face twice daily with a gentle foaming cleanser",
+            "Use products with salicylic acid to control excess oil",
+            "Avoid heavy creams and opt for gel-based products"
+        ])
+    elif 'dry' in skin_type_lower:
+        suggestions.extend([
+            "Use rich, hydrating moisturizers with hyaluronic acid or ceramides",
+            "Avoid harsh soaps and hot water that strip natural oils",
+            "Apply moisturizer immediately after cleansing while skin is damp",
+            "Use a gentle, cream-based cleanser"
+        ])
+    elif 'combination' in skin_type_lower:
+        suggestions.extend([
+            "Use different products for different zones (T-zone vs cheeks)",
+            "Apply lightweight moisturizer on oily areas, richer cream on dry areas",
+            "Consider using blotting papers for T-zone during the day",
+            "Balance your routine with products suitable for mixed skin"
+        ])
+    else:  # Normal
+        suggestions.extend([
+            "Maintain your current routine with gentle, balanced products",
+            "Use a mild cleanser and lightweight moisturizer",
+            "Focus on protection with SPF 30+ sunscreen daily"
+        ])
+    
+    # Acne suggestions
+    acne_lower = acne_level.lower()
+    if 'severe' in acne_lower or 'very_severe' in acne_lower:
+        suggestions.extend([
+            "Consult a dermatologist for professional treatment options",
+            "Consider prescription treatments like retinoids or antibiotics",
+            "Use benzoyl peroxide or salicylic acid spot treatments",
+            "Avoid touching, picking, or squeezing acne lesions"
+        ])
+    elif 'moderate' in acne_lower:
+        suggestions.extend([
+            "Use over-the-counter acne treatments with benzoyl peroxide",
+            "Keep skin clean with twice-daily gentle cleansing",
+            "Consider consulting a dermatologist if condition worsens",
+            "Use non-comedogenic makeup and skincare products"
+        ])
+    elif 'mild' in acne_lower:
+        suggestions.extend([
+            "Keep skin clean with twice-daily gentle cleansing",
+            "Use over-the-counter acne spot treatments",
+            "Exfoliate gently 1-2 times per week",
+            "Use non-comedogenic makeup and skincare products"
+        ])
+    else:  # No acne or clear
+        suggestions.extend([
+            "Maintain clear skin with consistent gentle cleansing",
+            "Continue using non-comedogenic products",
+            "Keep up with sun protection to prevent damage"
+        ])
+    
+    # General suggestions
+    suggestions.extend([
+        "Drink plenty of water (8+ glasses daily) for skin hydration",
+        "Get 7-9 hours of quality sleep each night",
+        "Eat a balanced diet rich in fruits, vegetables, and omega-3s",
+        "Change pillowcases regularly to reduce bacteria exposure"
+    ])
+    
+    return suggestions
+
+
+def known_suggestions():
+    """Every text generate_suggestions() can return, in first-seen order"""
+    texts = {}
+    for skin_type in ('oily', 'dry', 'combination', 'normal'):
+        for acne_level in ('severe', 'moderate', 'mild', 'no_acne'):
+            texts.update(dict.fromkeys(generate_suggestions(skin_type, acne_level)))
+    return list(texts)
@@ -0,0 +1,211 @@
+"""
+Bulk analysis of historical customer photos.
+
+Reads images from a folder or a .zip, maps each file to a customer through a
+CSV (columns: filename, customer_name), analyses them in a process pool where
+each worker loads the models once, and writes Customer / Skin_Analysis /
+Suggestion / predictions rows as results come in. Progress is recorded in the
+batch_import_progress table in the same transaction as each analysis, so an
+interrupted run can simply be started again and picks up where it stopped.
+
+Usage (from the repo root):
+    python -m ai.batch_analyze photos.zip customers.csv --username staff1 --workers 4
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .analysis_store import save_analysis
+from .db import DB_PATH, connect
+
+DEFAULT_DB = DB_PATH
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# Per-worker state, set up once by _init_worker
+_source = None
+_zip = None
+
+
+def _init_worker(source, threads_per_worker):
+    """Runs once in each worker process: limit inference threads, load and warm the models"""
+    global _source, _zip
+    from . import predict
+    if predict.MODEL_BACKEND == 'keras':
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    elif predict.TFLITE_THREADS is None:
+        predict.TFLITE_THREADS = threads_per_worker
+    # One image at a time per worker, waiting for a micro-batch would only add latency
+    predict.MAX_BATCH_SIZE = 1
+    predict.warm_up()
+
+    _source = source
+    if zipfile.is_zipfile(source):
+        _zip = zipfile.ZipFile(source)
+
+
+def _analyze(name):
+    from .predict import ai_predict
+
+    if _zip is not None:
+        data = _zip.read(name)
+    else:
+        with open(os.path.join(_source, name), 'rb') as f:
+            data = f.read()
+    return name, ai_predict(data)
+
+
+def list_images(source):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            names = [n for n in zf.namelist() if not n.endswith('/')]
+    else:
+        names = [
+            os.path.relpath(os.path.join(root, f), source)
+            for root, _, files in os.walk(source) for f in files
+        ]
+    return sorted(n for n in names if n.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def load_mapping(csv_path):
+    """filename -> customer_name; matches on the full path or just the base name"""
+    mapping = {}
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            filename = (row.get('filename') or '').strip()
+            customer = (row.get('customer_name') or '').strip()
+            if filename and customer:
+                mapping[filename] = customer
+    return mapping
+
+
+def _ensure_progress_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS batch_import_progress (
+            source TEXT NOT NULL,
+            image_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            analysis_id INTEGER,
+            message TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, image_name)
+        )
+    ''')
+    conn.commit()
+
+
+def _record(conn, source, name, status, analysis_id=None, message=None):
+    conn.execute(
+        "INSERT OR REPLACE INTO batch_import_progress (source, image_name, status, analysis_id, message) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (source, name, status, analysis_id, message)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a folder or zip of customer photos in bulk.")
+    parser.add_argument('images', help='folder or .zip of images')
+    parser.add_argument('mapping', help='CSV with filename,customer_name columns')
+    parser.add_argument('--username', required=True, help='staff account the analyses are recorded under')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--db', default=DEFAULT_DB)
+    args = parser.parse_args(argv)
+
+    source = os.path.abspath(args.images)
+    mapping = load_mapping(args.mapping)
+
+    conn = connect(args.db)
+    _ensure_progress_table(conn)
+
+    user = conn.execute(
+        "SELECT user_id, parlour_name FROM User WHERE username = ?", (args.username,)
+    ).fetchone()
+    if not user:
+        print(f"Unknown user: {args.username}")
+        return 1
+    user_id, salon_name = user
+
+    done = {row[0] for row in conn.execute(
+        "SELECT image_name FROM batch_import_progress WHERE source = ?", (source,)
+    )}
+
+    todo, unmapped = [], []
+    for name in list_images(source):
+        if name in done:
+            continue
+        customer = mapping.get(name) or mapping.get(os.path.basename(name))
+        if customer:
+            todo.append((name, customer))
+        else:
+            unmapped.append(name)
+
+    print(f"{len(done)} already processed, {len(todo)} to analyse, {len(unmapped)} without a customer in the CSV")
+    for name in unmapped:
+        print(f"   skipped (no customer): {name}")
+    if not todo:
+        return 0
+
+    customers = dict(todo)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+    counts = {"ok": 0, "rejected": 0, "failed": 0}
+    start = time.perf_counter()
+
+    # spawn, not fork: each worker must initialise TensorFlow on its own
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(source, threads_per_worker)) as pool:
+        futures = {pool.submit(_analyze, name): name for name, _ in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            try:
+                _, result = future.result()
+            except Exception as e:
+                # Not recorded as processed, so the next run retries it
+                counts["failed"] += 1
+                print(f"[{i}/{len(todo)}] {name} -> worker error: {e}")
+                continue
+
+            if result.get("error") and not result.get("rejection_reason"):
+                # Models not loaded, unexpected error: not recorded, so the next run retries it
+                counts["failed"] += 1
+                print(f"[{i}/{len(todo)}] {name} -> error: {result['error']}")
+                continue
+
+            # Only the image itself (quality gate, no face, non-human, unreadable) makes a rejection final
+            if result.get("rejection_reason") or result.get("skin_type") == 'unknown':
+                status = "rejected"
+                _record(conn, source, name, status, message=result.get("error") or result.get("message"))
+                summary = result.get("error") or result.get("message")
+            else:
+                status = "ok"
+                _, analysis_id = save_analysis(conn, user_id, salon_name, customers[name],
+                                               os.path.basename(name), result)
+                _record(conn, source, name, status, analysis_id=analysis_id)
+                summary = f"{result['skin_type']} / {result['acne_type']}"
+            # Analysis rows and the progress marker commit together
+            conn.commit()
+            counts[status] += 1
+
+            elapsed = time.perf_counter() - start
+            rate = i / elapsed
+            eta = (len(todo) - i) / rate if rate else 0
+            print(f"[{i}/{len(todo)}] {name} -> {summary}  ({rate:.1f} img/s, ETA {eta:.0f}s)")
+
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    print("=" * 60)
+    print(f"Analysed {len(todo)} images in {elapsed:.1f}s ({len(todo) / elapsed:.2f} img/s, {args.workers} workers)")
+    print(f"   saved: {counts['ok']}  rejected: {counts['rejected']}  failed: {counts['failed']}")
+    print("=" * 60)
+    return 0 if counts["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
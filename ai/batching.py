@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Collects single model inputs submitted from concurrent request threads and
+    runs them through the model as one batch.
+
+    A batch takes whatever is already queued behind its first item and is
+    flushed as soon as the queue is empty, when it reaches max_batch_size
+    items, or after max_wait_ms of a steady stream of arrivals. A lone request
+    never waits for company: under load the items arriving while one batch
+    runs form the next one. predict_fn takes
+    an (N, ...) array and returns a tuple of (N, ...) output arrays; each caller
+    gets back its own row of every output.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches_run = 0
+        self.items_run = 0
+        # Reused (max_batch_size, ...) input array, only touched by the batch thread
+        self._inputs = None
+
+    def submit(self, item):
+        """Queue one input and block until its outputs are ready."""
+        return self.submit_async(item).result()
+
+    def submit_async(self, item):
+        """Queue one input and return a Future for its outputs."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def stats(self):
+        with self._stats_lock:
+            batches, items = self.batches_run, self.items_run
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size and time.monotonic() < deadline:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self._run(batch)
+
+    def _input_batch(self, item, size):
+        """View of the first `size` rows of the reusable input array"""
+        item = np.asarray(item)
+        if (self._inputs is None or self._inputs.shape[1:] != item.shape
+                or self._inputs.dtype != item.dtype):
+            self._inputs = np.empty((self.max_batch_size,) + item.shape, dtype=item.dtype)
+        return self._inputs[:size]
+
+    def _run(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            inputs = self._input_batch(batch[0][0], len(batch))
+            for i, (item, _) in enumerate(batch):
+                inputs[i] = item
+            outputs = self.predict_fn(inputs)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self.batches_run += 1
+            self.items_run += len(batch)
+
+        for i, future in enumerate(futures):
+            future.set_result(tuple(output[i] for output in outputs))
@@ -0,0 +1,75 @@
+"""
+Row counts for the admin dashboard, kept in the dashboard_counter table.
+
+Triggers added by migration 4 adjust the counters on every insert and delete
+(and on role changes for staff users), so the dashboard reads four primary-key
+rows instead of counting whole tables. reconcile() recounts everything from
+scratch, for databases edited with the triggers off or restored from backups.
+
+Usage (from the repo root):
+    python -m ai.counters --reconcile
+"""
+import argparse
+import sys
+
+from .db import DB_PATH, connect
+
+# counter name -> query that counts it from scratch
+COUNTERS = {
+    'staff_users': "SELECT COUNT(*) FROM User WHERE role = 'staff'",
+    'predictions': "SELECT COUNT(*) FROM predictions",
+    'customers': "SELECT COUNT(*) FROM Customer",
+    'analyses': "SELECT COUNT(*) FROM Skin_Analysis",
+}
+
+
+def read_counters(conn):
+    """{name: value} for every counter, 0 for a counter with no row yet"""
+    marks = ','.join('?' * len(COUNTERS))
+    values = dict.fromkeys(COUNTERS, 0)
+    values.update(conn.execute(
+        f"SELECT name, value FROM dashboard_counter WHERE name IN ({marks})", tuple(COUNTERS)
+    ).fetchall())
+    return values
+
+
+def reconcile(conn):
+    """Recount every counter in one transaction; returns {name: (stored, actual)}"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stored = read_counters(conn)
+        actual = {name: conn.execute(query).fetchone()[0] for name, query in COUNTERS.items()}
+        conn.executemany("INSERT OR REPLACE INTO dashboard_counter (name, value) VALUES (?, ?)",
+                         actual.items())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {name: (stored[name], actual[name]) for name in COUNTERS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or rebuild the dashboard counters.")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--reconcile', action='store_true', help='recount the tables and fix the counters')
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        if not args.reconcile:
+            for name, value in read_counters(conn).items():
+                print(f"{name:<12}{value:>10}")
+            return 0
+        drifted = 0
+        for name, (stored, actual) in reconcile(conn).items():
+            note = "" if stored == actual else f"   (was {stored})"
+            drifted += stored != actual
+            print(f"{name:<12}{actual:>10}{note}")
+        print("counters were correct" if not drifted else f"fixed {drifted} counter(s)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,11 @@
-import sqlite3
-import os
 from werkzeug.security import generate_password_hash, check_password_hash
 
-# Database file
-DB_FILE = 'dermasoul.db'
+from .db import DB_PATH, connect
+from .migrations import migrate
 
-def init_db():
+def init_db(path=None):
     """Initialize all database tables according to ER diagram + feedback/predictions"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = connect(path)
     c = conn.cursor()
     
     # User Table (with role field for admin/staff distinction)
@@ -131,13 +129,16 @@ def init_db():
     ''')
     
     conn.commit()
+
+    # Indexes and later schema changes
+    version = migrate(conn)
     conn.close()
-    print("✓ Database initialized successfully!")
+    print(f"✓ Database initialized successfully! (schema version {version})")
 
 
 def insert_sample_quiz_questions():
     """Insert sample quiz questions and options"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = connect()
     c = conn.cursor()
     
     # Check if questions already exist
@@ -194,7 +195,7 @@ def insert_sample_quiz_questions():
 
 def create_admin_user():
     """Create default admin user in User table with role='admin'"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = connect()
     c = conn.cursor()
     
     # Check if admin exists
@@ -220,7 +221,7 @@ def create_admin_user():
 
 def create_sample_staff():
     """Create sample staff user for testing"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = connect()
     c = conn.cursor()
     
     # Check if staff exists
@@ -243,13 +244,6 @@ def create_sample_staff():
     print("  Password: staff123")
 
 
-def get_db_connection():
-    """Get database connection with row factory"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 if __name__ == '__main__':
     print("=" * 50)
     print("Initializing DermaSoul Database...")
@@ -263,13 +257,13 @@ if __name__ == '__main__':
     print("\n" + "=" * 50)
     print("Database setup complete!")
     print("=" * 50)
-    print(f"Database file: {os.path.abspath(DB_FILE)}")
+    print(f"Database file: {DB_PATH}")
     print("\nTables created (as per ER diagram):")
     print("  1. User")
     print("  2. Admin")
     print("  3. Customer")
     print("  4. Skin_Analysis")
-    print("  5. Suggestion")
+    print("  5. Suggestion (references into Suggestion_Catalog)")
     print("  6. Quiz_Question")
     print("  7. Quiz_Options")
     print("  8. Quiz_Response")
@@ -0,0 +1,161 @@
+"""
+Shared SQLite access for the web app, the job queue and the CLI tools.
+
+Every part of the app opens the same file, DB_PATH (dermasoul.db in the
+repo root unless SKIN_AI_DB says otherwise), whatever the working directory.
+Connections are opened once with WAL journaling, synchronous=NORMAL, a busy
+timeout, a larger page cache and foreign keys on, and then reused:
+get_db_connection() hands out an idle pooled connection and its close()
+rolls back anything uncommitted and puts it back in the pool instead of
+closing the file. With WAL, readers (admin pages) no longer wait for the
+analyzer's writes, and writers wait up to the busy timeout for each other
+instead of failing with "database is locked".
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+from flask import g, has_app_context
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.abspath(
+    os.environ.get('SKIN_AI_DB') or os.path.join(os.path.dirname(__file__), '..', 'dermasoul.db')
+)
+BUSY_TIMEOUT_MS = int(os.environ.get('SKIN_AI_DB_BUSY_TIMEOUT_MS', '5000'))
+# Page cache per connection in KiB (SQLite's default is 2000)
+CACHE_SIZE_KB = int(os.environ.get('SKIN_AI_DB_CACHE_KB', '16384'))
+# Idle connections kept open; more can be checked out at once, extras are closed on release
+POOL_SIZE = int(os.environ.get('SKIN_AI_DB_POOL_SIZE', '8'))
+
+
+def configure(conn):
+    """Apply the journal mode and per-connection pragmas"""
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def connect(path=None, busy_timeout_ms=None):
+    """A new, unpooled connection with the shared settings (for scripts and worker threads)"""
+    conn = sqlite3.connect(path or DB_PATH, timeout=(busy_timeout_ms or BUSY_TIMEOUT_MS) / 1000)
+    conn.row_factory = sqlite3.Row
+    configure(conn)
+    if busy_timeout_ms:
+        conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    return conn
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() returns it to its pool"""
+
+    pool = None
+    lease = None    # set while checked out, so a stale close() cannot release the next borrower's checkout
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self):
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle = []
+        self.in_use = 0
+        self.opened = 0
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self.in_use += 1
+        if conn is None:
+            try:
+                conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                       factory=PooledConnection, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                configure(conn)
+            except sqlite3.Error:
+                with self._lock:
+                    self.in_use -= 1
+                raise
+            conn.pool = self
+            with self._lock:
+                self.opened += 1
+        conn.lease = object()
+        return conn
+
+    def release(self, conn, lease=None):
+        with self._lock:
+            if conn.lease is None or (lease is not None and conn.lease is not lease):
+                return      # already released
+            conn.lease = None
+            self.in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            logger.exception("Discarding broken database connection")
+            conn.discard()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "in_use": self.in_use, "opened": self.opened}
+
+    def _after_fork_in_child(self):
+        # The parent's connections must not be used from the child; forget, don't close, them
+        self._lock = threading.Lock()
+        self._idle = []
+        self.in_use = 0
+
+
+logger.info("Database path: %s", DB_PATH)
+pool = ConnectionPool(DB_PATH)
+registry.register_gauge('db_pool', pool.stats)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=pool._after_fork_in_child)
+
+
+def get_db_connection():
+    """
+    Pooled connection with row factory. Call close() when done (uncommitted
+    changes are rolled back); inside a request, connections left open are
+    released when the request ends.
+    """
+    conn = pool.acquire()
+    if has_app_context():
+        g.setdefault('_db_connections', []).append((conn, conn.lease))
+    return conn
+
+
+def init_app(app):
+    """Return connections a request forgot to close (error paths) to the pool"""
+    @app.teardown_appcontext
+    def _release_connections(exc):
+        for conn, lease in g.pop('_db_connections', []):
+            pool.release(conn, lease)
@@ -0,0 +1,152 @@
+"""
+Vectorised version of predict.decide() for whole batches.
+
+DecisionPolicy applies the same confidence rules as decide() to (N, classes)
+probability arrays: the skin "uncertain" threshold, the acne confidence and
+no_acne conflict rules, the low-no_acne override and the stricter no-face
+rule. Thresholds are constructor arguments (defaults are the production
+values) and can be overridden with SKIN_AI_DECISION_POLICY='{"skin_min_confidence": 0.5}'.
+
+decide() compares some values as Python floats and others as numpy scalars
+of the model's output dtype; the masks below reproduce those comparison
+types exactly, so results match decide() bit for bit
+(benchmarks/verify_decision_policy.py checks this on random batches).
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class DecisionPolicy:
+    # Bump whenever the rules in decide_batch() change, so cached results made under
+    # the old rules are not served (see fingerprint())
+    VERSION = 1
+    THRESHOLDS = ('skin_min_confidence', 'acne_min_confidence', 'acne_max_no_acne', 'no_acne_min_confidence',
+                  'acne_override_confidence', 'no_face_min_acne_confidence', 'fallback_acne_confidence')
+
+    def __init__(self, skin_classes, acne_classes, no_acne_label='no_acne',
+                 skin_min_confidence=0.45,
+                 acne_min_confidence=0.70,
+                 acne_max_no_acne=0.30,
+                 no_acne_min_confidence=0.40,
+                 acne_override_confidence=0.75,
+                 no_face_min_acne_confidence=0.80,
+                 fallback_acne_confidence=0.5):
+        self.skin_classes = np.array(skin_classes, dtype=object)
+        self.acne_classes = np.array(acne_classes, dtype=object)
+        self.no_acne_idx = list(acne_classes).index(no_acne_label)
+        self.no_acne_label = no_acne_label
+        self.skin_min_confidence = skin_min_confidence
+        self.acne_min_confidence = acne_min_confidence
+        self.acne_max_no_acne = acne_max_no_acne
+        self.no_acne_min_confidence = no_acne_min_confidence
+        self.acne_override_confidence = acne_override_confidence
+        self.no_face_min_acne_confidence = no_face_min_acne_confidence
+        self.fallback_acne_confidence = fallback_acne_confidence
+
+    @classmethod
+    def from_env(cls, skin_classes, acne_classes):
+        overrides = json.loads(os.environ.get('SKIN_AI_DECISION_POLICY', '') or '{}')
+        return cls(skin_classes, acne_classes, **overrides)
+
+    def fingerprint(self):
+        """Short hash of the rules version, class labels and thresholds"""
+        parts = [self.VERSION, list(self.skin_classes), list(self.acne_classes), self.no_acne_label,
+                 [getattr(self, name) for name in self.THRESHOLDS]]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+    def decide_batch(self, skin_probs, acne_probs, face_detected):
+        """
+        Final labels for N images. face_detected is a bool or an (N,) bool array.
+        Returns a dict of (N,) arrays: skin_type, skin_confidence, acne_type,
+        acne_confidence (float64) and face_detected.
+        """
+        skin_probs = np.asarray(skin_probs)
+        acne_probs = np.asarray(acne_probs)
+        n = len(skin_probs)
+        face_detected = np.broadcast_to(np.asarray(face_detected, dtype=bool), (n,))
+        rows = np.arange(n)
+        # dtype a numpy scalar of the model's output is compared in (decide() keeps
+        # acne_preds[i] as a numpy scalar): float32 under NumPy 2, float64 before
+        scalar_dtype = (acne_probs.dtype.type(0) + 0.0).dtype
+
+        # Skin: argmax, "uncertain" below the threshold (compared as Python floats)
+        skin_idx = skin_probs.argmax(axis=1)
+        skin_conf = skin_probs[rows, skin_idx].astype(np.float64)
+        skin_type = self.skin_classes[skin_idx]
+        skin_type[skin_conf < self.skin_min_confidence] = "uncertain"
+
+        acne_idx = acne_probs.argmax(axis=1)
+        acne_max = acne_probs[rows, acne_idx]
+        no_acne = acne_probs[:, self.no_acne_idx]
+        no_acne_s = no_acne.astype(scalar_dtype)
+        acne_type = self.acne_classes[acne_idx]
+        acne_conf = acne_max.astype(np.float64)
+        # Whether acne_conf holds a numpy scalar in decide() (matters for the no-face compare)
+        conf_is_scalar = np.zeros(n, dtype=bool)
+
+        predicted_acne = acne_idx != self.no_acne_idx
+
+        # Acne predicted but not confident enough -> no_acne, max(no_acne, fallback)
+        weak = predicted_acne & (acne_conf < self.acne_min_confidence)
+        fallback_wins = self.fallback_acne_confidence > no_acne_s
+        acne_type[weak] = self.no_acne_label
+        acne_conf[weak] = np.where(fallback_wins[weak], self.fallback_acne_confidence, no_acne[weak])
+        conf_is_scalar[weak] = ~fallback_wins[weak]
+
+        # Acne predicted, but no_acne also scores -> no_acne at its own confidence
+        conflicted = predicted_acne & ~weak & (no_acne_s > self.acne_max_no_acne)
+        acne_type[conflicted] = self.no_acne_label
+        acne_conf[conflicted] = no_acne[conflicted]
+        conf_is_scalar[conflicted] = True
+
+        # no_acne predicted
+        clear = ~predicted_acne
+        unsure = clear & (no_acne_s < self.no_acne_min_confidence)
+        others = np.delete(acne_probs, self.no_acne_idx, axis=1)
+        other_pos = others.argmax(axis=1)
+        other_max = others[rows, other_pos]
+        other_idx = np.where(other_pos >= self.no_acne_idx, other_pos + 1, other_pos)
+        override = unsure & (other_max.astype(scalar_dtype) > self.acne_override_confidence)
+        acne_type[override] = self.acne_classes[other_idx[override]]
+        acne_conf[override] = other_max[override]
+        conf_is_scalar[override] = True
+        keep = unsure & ~override
+        acne_conf[keep] = self.fallback_acne_confidence
+        confident = clear & ~unsure
+        acne_conf[confident] = no_acne[confident]
+        conf_is_scalar[confident] = True
+
+        # No face: only a very confident acne result survives
+        below = np.where(
+            conf_is_scalar,
+            acne_conf.astype(acne_probs.dtype).astype(scalar_dtype) < self.no_face_min_acne_confidence,
+            acne_conf < self.no_face_min_acne_confidence,
+        )
+        forced = ~face_detected & below
+        acne_type[forced] = self.no_acne_label
+        acne_conf[forced] = self.fallback_acne_confidence
+
+        return {
+            "skin_type": skin_type,
+            "skin_confidence": skin_conf,
+            "acne_type": acne_type,
+            "acne_confidence": acne_conf,
+            "face_detected": face_detected.copy(),
+        }
+
+    def results(self, skin_probs, acne_probs, face_detected):
+        """decide_batch() as a list of decide()-style dicts"""
+        batch = self.decide_batch(skin_probs, acne_probs, face_detected)
+        return [
+            {
+                "skin_type": str(batch["skin_type"][i]),
+                "skin_confidence": float(batch["skin_confidence"][i]),
+                "acne_type": str(batch["acne_type"][i]),
+                "acne_confidence": float(batch["acne_confidence"][i]),
+                "face_detected": bool(batch["face_detected"][i]),
+            }
+            for i in range(len(batch["skin_type"]))
+        ]
@@ -0,0 +1,114 @@
+"""
+Concurrency limit in front of ai_predict.
+
+At most max_workers analyses run at once; up to max_queue more wait for a
+slot. Anything beyond that (or waiting longer than max_wait_s) is refused
+straight away with ExecutorBusy, which the web layer turns into a 503 with
+Retry-After instead of letting requests pile up on the CPU. Work runs in the
+calling thread, the executor only admits it.
+"""
+import math
+import os
+import threading
+import time
+
+from .metrics import registry
+
+MAX_WORKERS = int(os.environ.get('SKIN_AI_INFERENCE_WORKERS', '0')) or (os.cpu_count() or 2)
+MAX_QUEUE = int(os.environ.get('SKIN_AI_INFERENCE_QUEUE', '16'))
+MAX_WAIT_SECONDS = float(os.environ.get('SKIN_AI_INFERENCE_QUEUE_TIMEOUT', '10'))
+
+
+class ExecutorBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Analyzer busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    def __init__(self, max_workers=MAX_WORKERS, max_queue=MAX_QUEUE, max_wait_s=MAX_WAIT_SECONDS):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_wait = max_wait_s
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.jobs_waiting = 0   # block=True callers waiting for a slot, outside the queue limit
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of how long one analysis holds a slot, for Retry-After
+        self._service_seconds = 1.0
+
+    def run(self, fn, *args, block=False, **kwargs):
+        """
+        Run fn(*args, **kwargs) once a slot is free. Raises ExecutorBusy when the
+        queue is full or no slot frees up in time, unless block=True (background
+        jobs), which waits as long as it takes and never counts against the queue.
+        """
+        with self._lock:
+            # A free slot is always taken, the queue limit only applies to waiting for one
+            if not block and self.queued >= self.max_queue and self.running >= self.max_workers:
+                self.rejected += 1
+                registry.increment('executor.rejected')
+                raise ExecutorBusy(self.retry_after())
+            if block:
+                self.jobs_waiting += 1
+            else:
+                self.queued += 1
+
+        start = time.perf_counter()
+        acquired = False
+        try:
+            acquired = self._slots.acquire(timeout=None if block else self.max_wait)
+        finally:
+            # Every way out of the wait undoes the increment above
+            with self._lock:
+                if block:
+                    self.jobs_waiting -= 1
+                else:
+                    self.queued -= 1
+                if acquired:
+                    self.running += 1
+                else:
+                    self.timed_out += 1
+        registry.observe('executor.queue_wait', time.perf_counter() - start)
+        if not acquired:
+            registry.increment('executor.timed_out')
+            raise ExecutorBusy(self.retry_after())
+
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self._service_seconds = 0.9 * self._service_seconds + 0.1 * elapsed
+            self._slots.release()
+
+    def retry_after(self):
+        """Whole seconds until the current backlog has probably drained"""
+        backlog = self.queued + self.jobs_waiting + self.running + 1
+        return max(1, math.ceil(backlog * self._service_seconds / self.max_workers))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.queued,
+                "jobs_waiting": self.jobs_waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "mean_service_ms": self._service_seconds * 1000,
+            }
+
+
+# Shared by the web requests and the async job workers of this process
+inference_executor = InferenceExecutor()
+registry.register_gauge('inference_executor', inference_executor.stats)
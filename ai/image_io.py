@@ -0,0 +1,109 @@
+"""
+Image size from the file header, without decoding.
+
+JPEG, PNG, WebP, BMP, GIF and TIFF are parsed (the formats the analyzer and
+the batch import accept); anything else, or a header cut short, returns None
+and decode_image checks the pixel count after decoding instead, behind
+OpenCV's own OPENCV_IO_MAX_IMAGE_PIXELS limit (set in ai/__init__.py).
+"""
+import struct
+
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) do not
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers without a length field
+_JPEG_STANDALONE = {0x01} | set(range(0xD0, 0xDA))
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Start code of a lossy WebP key frame
+_VP8_START = b'\x9d\x01\x2a'
+
+
+class ImageTooLarge(ValueError):
+    """Upload exceeds the configured byte or pixel limit"""
+
+
+def _jpeg_size(data):
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:          # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            i += 2
+            continue
+        if marker == 0xDA:          # start of scan without a frame header
+            return None
+        if marker in _JPEG_SOF:
+            if i + 9 > n:
+                return None
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        (length,) = struct.unpack('>H', data[i + 2:i + 4])
+        i += 2 + length
+    return None
+
+
+def _webp_size(data):
+    chunk = bytes(data[12:16])
+    if chunk == b'VP8 ' and len(data) >= 30 and data[23:26] == _VP8_START:
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25 and data[20] == 0x2F:
+        (bits,) = struct.unpack('<I', data[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def _bmp_size(data):
+    (header_size,) = struct.unpack('<I', data[14:18])
+    if header_size == 12:       # OS/2 BITMAPCOREHEADER
+        return struct.unpack('<HH', data[18:22])
+    width, height = struct.unpack('<ii', data[18:26])
+    return abs(width), abs(height)      # negative height: rows stored top-down
+
+
+def _tiff_size(data):
+    """ImageWidth and ImageLength of the first IFD (classic TIFF, not BigTIFF)"""
+    order = '<' if data[:2] == b'II' else '>'
+    (offset,) = struct.unpack(order + 'I', data[4:8])
+    if offset + 2 > len(data):
+        return None
+    (count,) = struct.unpack(order + 'H', data[offset:offset + 2])
+    size = {}
+    for entry in range(offset + 2, offset + 2 + 12 * count, 12):
+        if entry + 12 > len(data):
+            return None
+        tag, kind = struct.unpack(order + 'HH', data[entry:entry + 4])
+        if tag in (256, 257):       # ImageWidth, ImageLength: SHORT or LONG
+            fmt = order + ('H' if kind == 3 else 'I')
+            (size[tag],) = struct.unpack(fmt, data[entry + 8:entry + 8 + struct.calcsize(fmt)])
+    if 256 in size and 257 in size:
+        return size[256], size[257]
+    return None
+
+
+def image_size(data):
+    """(width, height) from a JPEG, PNG, WebP, BMP, GIF or TIFF header, None if unknown or truncated"""
+    data = memoryview(data).cast('B')
+    if len(data) >= 24 and data[:8] == PNG_SIGNATURE and data[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', data[16:24])
+        return width, height
+    if len(data) >= 4 and data[0] == 0xFF and data[1] == 0xD8:
+        return _jpeg_size(data)
+    if len(data) >= 20 and data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return _webp_size(data)
+    if len(data) >= 26 and data[:2] == b'BM':
+        return _bmp_size(data)
+    if len(data) >= 10 and data[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', data[6:10])      # logical screen size
+    if len(data) >= 8 and data[:4] in (b'II*\x00', b'MM\x00*'):
+        return _tiff_size(data)
+    return None
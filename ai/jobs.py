@@ -0,0 +1,276 @@
+"""
+Asynchronous analysis jobs backed by a SQLite table, no external broker.
+
+The web request stores the upload in analysis_jobs and returns immediately;
+a small pool of worker threads in the same process claims queued jobs, runs
+ai_predict, saves the analysis and records the outcome for polling.
+
+Several processes (serve.py workers) can share the table. A claimed job
+records its owner (queue instance and pid) and claim time, and a running job
+is only put back in the queue when its owner process has exited or its lease
+has expired, so one process starting up never re-runs another's jobs.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from .analysis_store import save_analysis
+from .db import connect
+from .executor import inference_executor
+from .predict import ai_predict
+from .log import set_request_id
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+REJECTED = 'rejected'   # image analysed but not usable (no face, animal, ...)
+FAILED = 'failed'       # unexpected error, models not loaded
+
+# A running job whose owner is still alive is requeued after this long
+JOB_LEASE_SECONDS = int(os.environ.get('SKIN_AI_JOB_LEASE_SECONDS', '600'))
+# How often idle workers look for jobs left behind by dead processes
+SWEEP_INTERVAL = 60
+
+
+def _process_alive(pid):
+    """False only when pid has certainly exited (Windows has no signal-0 probe: the lease decides there)"""
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True     # exists, owned by another user
+    return True
+
+
+class JobQueue:
+    def __init__(self, db_path, workers=2):
+        self.db_path = db_path
+        self.workers = workers
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self.owner = uuid.uuid4().hex
+        self._next_sweep = 0
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                salon_name TEXT,
+                customer_name TEXT NOT NULL,
+                image_name TEXT,
+                image BLOB,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                customer_id INTEGER,
+                analysis_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                owner TEXT,
+                owner_pid INTEGER,
+                claimed_at TIMESTAMP
+            )
+        ''')
+        # Tables created before claims recorded their owner
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(analysis_jobs)")}
+        for column, kind in (('owner', 'TEXT'), ('owner_pid', 'INTEGER'), ('claimed_at', 'TIMESTAMP')):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE analysis_jobs ADD COLUMN {column} {kind}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status ON analysis_jobs (status, created_at)")
+        conn.commit()
+        # Jobs that were running when their process died go back in the queue
+        self._requeue_orphans(conn)
+        conn.close()
+
+    def _connect(self):
+        return connect(self.db_path, busy_timeout_ms=30000)
+
+    def submit(self, user_id, salon_name, customer_name, image_name, image_bytes):
+        """Queue an upload for analysis and return its job id"""
+        self.start()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        conn.execute(
+            '''INSERT INTO analysis_jobs (job_id, user_id, salon_name, customer_name, image_name, image, status)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            (job_id, user_id, salon_name, customer_name, image_name, image_bytes, QUEUED)
+        )
+        conn.commit()
+        conn.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Job state as a dict (without the image), or None"""
+        conn = self._connect()
+        row = conn.execute(
+            '''SELECT job_id, user_id, customer_name, status, result, error,
+                      customer_id, analysis_id, created_at, updated_at
+               FROM analysis_jobs WHERE job_id = ?''',
+            (job_id,)
+        ).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def start(self):
+        """Start the worker threads (once)"""
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'analysis-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    # ---------- worker side ----------
+
+    def _owner_alive(self, pid):
+        # Another queue with our pid is an earlier run of a restarted process (containers reuse pids)
+        return pid is not None and pid != os.getpid() and _process_alive(pid)
+
+    def _requeue_orphans(self, conn):
+        """
+        Put running jobs back in the queue when their owner process has exited,
+        their lease has expired, or they were claimed before owners were recorded.
+        Returns the number requeued.
+        """
+        rows = conn.execute(
+            '''SELECT job_id, owner, owner_pid, claimed_at < datetime('now', ?) AS expired
+               FROM analysis_jobs WHERE status = ? AND owner IS NOT ?''',
+            (f'-{JOB_LEASE_SECONDS} seconds', RUNNING, self.owner)
+        ).fetchall()
+        orphans = [row for row in rows
+                   if row['owner'] is None or row['expired'] or not self._owner_alive(row['owner_pid'])]
+        if not orphans:
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        requeued = 0
+        for row in orphans:
+            # Only if nobody else requeued or finished it in the meantime
+            requeued += conn.execute(
+                '''UPDATE analysis_jobs
+                   SET status = ?, owner = NULL, owner_pid = NULL, claimed_at = NULL,
+                       updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ? AND status = ? AND owner IS ?''',
+                (QUEUED, row['job_id'], RUNNING, row['owner'])
+            ).rowcount
+        conn.commit()
+        if requeued:
+            logger.warning("Requeued %d analysis job(s) left running by an exited worker", requeued)
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return requeued
+
+    def _claim(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM analysis_jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                '''UPDATE analysis_jobs
+                   SET status = ?, owner = ?, owner_pid = ?, claimed_at = CURRENT_TIMESTAMP,
+                       updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ?''',
+                (RUNNING, self.owner, os.getpid(), row['job_id'])
+            )
+        conn.commit()
+        return row
+
+    def _finish(self, conn, job_id, status, result=None, error=None, customer_id=None, analysis_id=None):
+        # The image is dropped once the job is finished
+        conn.execute(
+            '''UPDATE analysis_jobs
+               SET status = ?, result = ?, error = ?, customer_id = ?, analysis_id = ?,
+                   image = NULL, updated_at = CURRENT_TIMESTAMP
+               WHERE job_id = ?''',
+            (status, json.dumps(result) if result is not None else None, error,
+             customer_id, analysis_id, job_id)
+        )
+
+    def _idle(self, conn):
+        with self._wakeup:
+            self._wakeup.wait(timeout=5)
+        if time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+            self._requeue_orphans(conn)
+
+    def _work(self):
+        conn = None
+        while True:
+            job = None
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    conn.isolation_level = None  # explicit BEGIN in _claim
+                job = self._claim(conn)
+                if job is None:
+                    self._idle(conn)
+                    continue
+                self._run(conn, job)
+            except Exception as e:
+                # A database error must not end the thread: give up on this job and keep going
+                logger.exception("Analysis worker error%s", f" on job {job['job_id']}" if job else "")
+                conn = self._recover(conn, job, e)
+                time.sleep(1)
+
+    def _recover(self, conn, job, error):
+        """Mark the job failed on a fresh connection; returns the connection to carry on with"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        conn = None
+        try:
+            conn = self._connect()
+            conn.isolation_level = None
+            if job is not None:
+                self._finish(conn, job['job_id'], FAILED, error=str(error))
+        except Exception:
+            # Still marked running under our lease, so it is requeued once the lease expires
+            logger.exception("Could not mark analysis job as failed")
+        return conn
+
+    def _run(self, conn, job):
+        # Log lines from this job carry the job id as their correlation id
+        set_request_id(job['job_id'][:12])
+        try:
+            # Shares the web requests' concurrency limit but waits instead of being refused
+            result = inference_executor.run(ai_predict, job['image'], block=True)
+            conn.execute("BEGIN")
+            if result.get("error") and not result.get("rejection_reason"):
+                self._finish(conn, job['job_id'], FAILED, result=result, error=result["error"])
+            elif result.get("rejection_reason") or result.get("skin_type") == 'unknown':
+                self._finish(conn, job['job_id'], REJECTED, result=result,
+                             error=result.get("error") or result.get("message"))
+            else:
+                customer_id, analysis_id = save_analysis(
+                    conn, job['user_id'], job['salon_name'], job['customer_name'], job['image_name'], result
+                )
+                self._finish(conn, job['job_id'], DONE, result=result,
+                             customer_id=customer_id, analysis_id=analysis_id)
+            conn.commit()
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job['job_id'])
+            if conn.in_transaction:
+                conn.rollback()
+            self._finish(conn, job['job_id'], FAILED, error=str(e))
@@ -0,0 +1,97 @@
+"""
+Structured, leveled logging with a per-request correlation id.
+
+Log calls use lazy %-formatting, so a disabled level costs one cached level
+check. Every record carries the request id of the Flask request (or job) it
+belongs to; SKIN_AI_LOG_FORMAT=json emits one JSON object per line.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import uuid
+
+LOG_LEVEL = os.environ.get('SKIN_AI_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('SKIN_AI_LOG_FORMAT', 'text')
+# Fraction of predictions whose raw model outputs are logged at DEBUG
+RAW_OUTPUT_SAMPLE_RATE = float(os.environ.get('SKIN_AI_RAW_OUTPUT_SAMPLE_RATE', '0.01'))
+
+_request_id = contextvars.ContextVar('request_id', default='-')
+
+# Attributes every LogRecord has; anything else was passed via extra= and is a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def set_request_id(request_id=None):
+    """Set the correlation id for the current thread/context and return it"""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _request_id.set(request_id)
+    return request_id
+
+
+def sample_raw_outputs(logger):
+    """True for the sampled fraction of predictions when DEBUG is enabled"""
+    return (logger.isEnabledFor(logging.DEBUG)
+            and RAW_OUTPUT_SAMPLE_RATE > 0
+            and random.random() < RAW_OUTPUT_SAMPLE_RATE)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', '-'),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    """Install one stream handler on the root logger (idempotent)"""
+    root = logging.getLogger()
+    if any(getattr(h, '_skin_ai', False) for h in root.handlers):
+        return
+
+    handler = logging.StreamHandler()
+    handler._skin_ai = True
+    handler.addFilter(RequestIdFilter())
+    if (fmt or LOG_FORMAT) == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+        ))
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
+
+
+def init_app(app):
+    """Give every request a correlation id (X-Request-ID is honoured and echoed back)"""
+    from flask import g, request
+
+    @app.before_request
+    def _assign_request_id():
+        g.request_id = set_request_id(request.headers.get('X-Request-ID', '')[:64])
+
+    @app.after_request
+    def _echo_request_id(response):
+        response.headers['X-Request-ID'] = get_request_id()
+        return response
@@ -0,0 +1,101 @@
+"""
+In-memory latency histograms and counters for the analysis pipeline.
+
+Each stage keeps a rolling window of its most recent durations, from which
+p50/p95/p99 are computed on demand. Recording a sample is an append to a
+bounded deque under a lock, cheap enough for every request.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Samples kept per stage
+WINDOW_SIZE = 2048
+
+
+class RollingHistogram:
+    def __init__(self, window=WINDOW_SIZE):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        n = len(ordered)
+
+        def pct(p):
+            return ordered[min(n - 1, int(p / 100.0 * n))] if n else 0.0
+
+        return {
+            "count": self.count,
+            "window": n,
+            "mean_ms": (sum(ordered) / n) if n else 0.0,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "max_ms": ordered[-1] if n else 0.0,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, window=WINDOW_SIZE):
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        """Record one duration (in seconds) for a stage"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram(self.window)
+            histogram.observe(seconds * 1000.0)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def register_gauge(self, name, fn):
+        """fn() is called at snapshot time, e.g. to report a queue depth"""
+        with self._lock:
+            self._gauges[name] = fn
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {name: h.summary() for name, h in sorted(self._histograms.items())}
+            counters = dict(sorted(self._counters.items()))
+            gauges = list(self._gauges.items())
+
+        gauge_values = {}
+        for name, fn in sorted(gauges):
+            try:
+                gauge_values[name] = fn()
+            except Exception as e:
+                gauge_values[name] = f"error: {e}"
+        return {"stages": histograms, "counters": counters, "gauges": gauge_values}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Process-wide registry used by the pipeline and the admin metrics page
+registry = MetricsRegistry()
+timed = registry.timer
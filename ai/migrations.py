@@ -0,0 +1,432 @@
+"""
+Versioned schema changes for dermasoul.db.
+
+init_db() still creates the base tables; everything after that is a numbered
+migration in MIGRATIONS. The schema_version table records which ones a
+database has had, so an existing dermasoul.db is brought up to date the next
+time the app starts (or with `python -m ai.migrations`). A migration is a
+list of steps, each an SQL statement or a function taking the connection, and
+is applied in one transaction together with its schema_version row.
+
+HOT_QUERIES are the per-request queries the indexes exist for;
+`python -m ai.migrations --check-plans` runs EXPLAIN QUERY PLAN on each of
+them against a freshly migrated scratch database and fails if any of them
+reads a whole table.
+
+Usage (from the repo root):
+    python -m ai.migrations                 # apply pending migrations to SKIN_AI_DB
+    python -m ai.migrations --check-plans   # exit status 1 if a hot query scans a table
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from .db import DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+
+def _table_bytes(conn, tables):
+    """Bytes of the pages holding these tables and their indexes, None without the dbstat table"""
+    marks = ','.join('?' * len(tables))
+    try:
+        return conn.execute(
+            f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN "
+            f"(SELECT name FROM sqlite_master WHERE tbl_name IN ({marks}))", tables
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def _text_size(conn, table):
+    """(rows, bytes of suggestion_text) in a table"""
+    return tuple(conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(suggestion_text AS BLOB))), 0) FROM {table}"
+    ).fetchone())
+
+
+def _normalise_suggestions(conn):
+    """
+    Move suggestion texts into Suggestion_Catalog and keep only
+    (analysis_id, suggestion_id, position) in Suggestion, then report the saving.
+    """
+    from .analysis_store import known_suggestions
+
+    rows, text_before = _text_size(conn, 'Suggestion')
+    size_before = _table_bytes(conn, ('Suggestion',))
+
+    conn.execute('''
+        CREATE TABLE Suggestion_Catalog (
+            suggestion_id INTEGER PRIMARY KEY,
+            suggestion_text TEXT NOT NULL UNIQUE
+        )
+    ''')
+    # Texts already stored keep their first-use order, then everything the app can generate
+    conn.execute('''
+        INSERT INTO Suggestion_Catalog (suggestion_text)
+        SELECT suggestion_text FROM Suggestion GROUP BY suggestion_text ORDER BY MIN(suggestion_id)
+    ''')
+    conn.executemany("INSERT OR IGNORE INTO Suggestion_Catalog (suggestion_text) VALUES (?)",
+                     [(t,) for t in known_suggestions()])
+
+    conn.execute('''
+        CREATE TABLE Suggestion_Ref (
+            analysis_id INTEGER NOT NULL,
+            suggestion_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (analysis_id, position),
+            FOREIGN KEY (analysis_id) REFERENCES Skin_Analysis(analysis_id),
+            FOREIGN KEY (suggestion_id) REFERENCES Suggestion_Catalog(suggestion_id)
+        ) WITHOUT ROWID
+    ''')
+    # Rows of analyses that no longer exist are dropped
+    conn.execute('''
+        INSERT INTO Suggestion_Ref (analysis_id, suggestion_id, position)
+        SELECT s.analysis_id, c.suggestion_id,
+               ROW_NUMBER() OVER (PARTITION BY s.analysis_id ORDER BY s.suggestion_id) - 1
+        FROM Suggestion s
+        JOIN Suggestion_Catalog c ON c.suggestion_text = s.suggestion_text
+        WHERE s.analysis_id IN (SELECT analysis_id FROM Skin_Analysis)
+    ''')
+    kept = conn.execute("SELECT COUNT(*) FROM Suggestion_Ref").fetchone()[0]
+    conn.execute("DROP TABLE Suggestion")
+    conn.execute("ALTER TABLE Suggestion_Ref RENAME TO Suggestion")
+
+    texts, text_after = _text_size(conn, 'Suggestion_Catalog')
+    size_after = _table_bytes(conn, ('Suggestion', 'Suggestion_Catalog'))
+    logger.info("Suggestions: %d rows with %.1f KB of text -> %d references to %d catalog texts (%.1f KB)",
+                rows, text_before / 1024, kept, texts, text_after / 1024)
+    if size_before is not None:
+        logger.info("Suggestion tables: %.1f KB -> %.1f KB (freed pages are reused; VACUUM returns them to the OS)",
+                    size_before / 1024, size_after / 1024)
+    if rows != kept:
+        logger.info("Dropped %d suggestion rows of deleted analyses", rows - kept)
+
+
+def _version_triggers(name, tables):
+    """Triggers bumping catalog_version[name] on any insert, update or delete in these tables"""
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS {table.lower()}_{event.lower()}_bumps_{name}
+           AFTER {event} ON {table}
+           BEGIN
+               UPDATE catalog_version SET version = version + 1 WHERE name = '{name}';
+           END'''
+        for table in tables
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+def _count_triggers(counter, table, condition='1'):
+    """Triggers keeping dashboard_counter[counter] equal to the rows of table matching condition"""
+    def bump(delta):
+        return f"UPDATE dashboard_counter SET value = value + ({delta}) WHERE name = '{counter}';"
+
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS {table.lower()}_insert_counts_{counter}
+           AFTER INSERT ON {table}
+           BEGIN {bump(condition.replace('{row}', 'NEW'))} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {table.lower()}_delete_counts_{counter}
+           AFTER DELETE ON {table}
+           BEGIN {bump('-(' + condition.replace('{row}', 'OLD') + ')')} END''',
+    ]
+
+
+def _seed_counters(conn):
+    from .counters import COUNTERS
+
+    conn.executemany("INSERT OR REPLACE INTO dashboard_counter (name, value) VALUES (?, ?)",
+                     [(name, conn.execute(query).fetchone()[0]) for name, query in COUNTERS.items()])
+
+
+# Tables whose user_id must reference User; dermasoul.db files from before the
+# User table still point them at the legacy users(id)
+_USER_TABLES = {
+    'predictions': ("""
+        CREATE TABLE predictions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_name TEXT,
+            result TEXT,
+            confidence REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            salon_name TEXT,
+            FOREIGN KEY(user_id) REFERENCES User(user_id)
+        )""", "id, user_id, image_name, result, confidence, timestamp, salon_name",
+        "id, {user_id}, image_name, result, confidence, timestamp, salon_name", [
+        "CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions (user_id)",
+        *_count_triggers('predictions', 'predictions'),
+    ]),
+    'feedback': ("""
+        CREATE TABLE feedback_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NULL,
+            message TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES User(user_id) ON DELETE SET NULL
+        )""", "id, user_id, message, timestamp",
+        "id, {user_id}, COALESCE(message, ''), timestamp", [
+        "CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedback (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp)",
+    ]),
+}
+
+
+def _repoint_user_keys(conn):
+    """
+    Rebuild predictions and feedback where their user_id foreign key does not
+    reference User. user_ids with no User row are kept as NULL, which both
+    tables allow; the indexes and triggers dropped with the old table are
+    recreated.
+    """
+    for table, (create, columns, select, steps) in _USER_TABLES.items():
+        parents = {row[2] for row in conn.execute(f"PRAGMA foreign_key_list({table})")}
+        if parents == {'User'}:
+            continue
+        orphans = conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE user_id NOT IN (SELECT user_id FROM User)"
+        ).fetchone()[0]
+        conn.execute(create)
+        user_id = "CASE WHEN user_id IN (SELECT user_id FROM User) THEN user_id END"
+        conn.execute(f"INSERT INTO {table}_new ({columns}) "
+                     f"SELECT {select.format(user_id=user_id)} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        for step in steps:
+            conn.execute(step)
+        logger.info("%s: foreign key now references User(user_id) instead of %s",
+                    table, ', '.join(sorted(parents)) or 'nothing')
+        if orphans:
+            logger.info("%s: cleared user_id on %d rows of users missing from User", table, orphans)
+
+
+MIGRATIONS = [
+    (1, "Indexes for per-request lookups and sorted listings", [
+        # Analyzer: find the customer by name for this salon (covering: the rowid is the customer_id)
+        "CREATE INDEX IF NOT EXISTS idx_customer_user_name ON Customer (user_id, customer_name)",
+        # /suggestions and deleting a customer's analyses
+        "CREATE INDEX IF NOT EXISTS idx_suggestion_analysis ON Suggestion (analysis_id)",
+        # /history: a salon's customers' analyses, newest first
+        "CREATE INDEX IF NOT EXISTS idx_skin_analysis_customer_date ON Skin_Analysis (customer_id, analysis_date)",
+        # Admin analyses list, newest first
+        "CREATE INDEX IF NOT EXISTS idx_skin_analysis_date ON Skin_Analysis (analysis_date)",
+        # Admin predictions list, newest first, and deleting a user's predictions
+        "CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions (user_id)",
+        # Quiz options per question
+        "CREATE INDEX IF NOT EXISTS idx_quiz_options_question ON Quiz_Options (question_id)",
+        # Deleting a user: their quiz responses and feedback
+        "CREATE INDEX IF NOT EXISTS idx_quiz_response_user ON Quiz_Response (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_quiz_response_customer ON Quiz_Response (customer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedback (user_id)",
+        # Admin feedback list, newest first
+        "CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp)",
+    ]),
+    (2, "Suggestion texts in a catalog, analyses keep only references", [
+        _normalise_suggestions,
+    ]),
+    (3, "Version counter for the cached quiz catalog", [
+        '''CREATE TABLE IF NOT EXISTS catalog_version (
+               name TEXT PRIMARY KEY,
+               version INTEGER NOT NULL
+           )''',
+        "INSERT OR IGNORE INTO catalog_version (name, version) VALUES ('quiz', 1)",
+        *_version_triggers('quiz', ('Quiz_Question', 'Quiz_Options')),
+    ]),
+    (4, "Dashboard counters maintained by triggers", [
+        '''CREATE TABLE IF NOT EXISTS dashboard_counter (
+               name TEXT PRIMARY KEY,
+               value INTEGER NOT NULL
+           )''',
+        *_count_triggers('staff_users', 'User', "{row}.role IS 'staff'"),
+        # A role change moves the user in or out of the staff count
+        '''CREATE TRIGGER IF NOT EXISTS user_role_counts_staff_users
+           AFTER UPDATE OF role ON User
+           BEGIN
+               UPDATE dashboard_counter SET value = value + (NEW.role IS 'staff') - (OLD.role IS 'staff')
+               WHERE name = 'staff_users';
+           END''',
+        *_count_triggers('predictions', 'predictions'),
+        *_count_triggers('customers', 'Customer'),
+        *_count_triggers('analyses', 'Skin_Analysis'),
+        _seed_counters,
+    ]),
+    (5, "predictions and feedback reference User instead of the legacy users table", [
+        _repoint_user_keys,
+    ]),
+]
+
+# name -> (query, parameters, tables that may be read in index order for an ORDER BY listing)
+HOT_QUERIES = {
+    "analyzer customer lookup": (
+        "SELECT customer_id FROM Customer WHERE customer_name = ? AND user_id = ?", ('Jane', 1), ()),
+    "login": (
+        "SELECT * FROM User WHERE username = ?", ('staff1',), ()),
+    "suggestions": (
+        "SELECT suggestion_id FROM Suggestion WHERE analysis_id = ? ORDER BY position", (1,), ()),
+    "dashboard counters": (
+        "SELECT name, value FROM dashboard_counter WHERE name IN (?, ?, ?, ?)",
+        ('staff_users', 'predictions', 'customers', 'analyses'), ()),
+    "quiz catalog version": (
+        "SELECT version FROM catalog_version WHERE name = ?", ('quiz',), ()),
+    "history": (
+        '''SELECT c.customer_name, c.image_path, sa.skin_type, sa.acne_level,
+                  sa.analysis_date, sa.analysis_id, sa.skin_confidence, sa.acne_confidence
+           FROM Skin_Analysis sa
+           JOIN Customer c ON sa.customer_id = c.customer_id
+           WHERE c.user_id = ?
+           ORDER BY sa.analysis_date DESC
+           LIMIT 50''', (1,), ()),
+    "admin predictions": (
+        '''SELECT predictions.id, User.username, predictions.image_name,
+                  predictions.result, predictions.confidence, predictions.timestamp,
+                  predictions.salon_name, User.parlour_name
+           FROM predictions
+           LEFT JOIN User ON predictions.user_id = User.user_id
+           WHERE 1=1
+           ORDER BY predictions.timestamp DESC''', (), ('predictions',)),
+    "admin analyses": (
+        '''SELECT sa.analysis_id, sa.skin_type, sa.acne_level, sa.skin_confidence,
+                  sa.acne_confidence, sa.face_detected, sa.analysis_date, c.customer_name,
+                  u.username as staff_username, u.parlour_name
+           FROM Skin_Analysis sa
+           JOIN Customer c ON sa.customer_id = c.customer_id
+           JOIN User u ON c.user_id = u.user_id
+           ORDER BY sa.analysis_date DESC
+           LIMIT 100''', (), ('sa',)),
+    "admin feedback": (
+        '''SELECT feedback.id, feedback.user_id, feedback.message, feedback.timestamp,
+                  COALESCE(User.username, 'Anonymous User') as username, User.parlour_name
+           FROM feedback
+           LEFT JOIN User ON feedback.user_id = User.user_id
+           ORDER BY feedback.timestamp DESC''', (), ('feedback',)),
+    "delete user predictions": (
+        "DELETE FROM predictions WHERE user_id = ?", (1,), ()),
+    "delete user quiz responses": (
+        "DELETE FROM Quiz_Response WHERE user_id = ?", (1,), ()),
+    "delete customer quiz responses": (
+        "DELETE FROM Quiz_Response WHERE customer_id = ?", (1,), ()),
+    "delete customer suggestions": (
+        '''DELETE FROM Suggestion
+           WHERE analysis_id IN (SELECT analysis_id FROM Skin_Analysis WHERE customer_id = ?)''', (1,), ()),
+    "user's customers": (
+        "SELECT customer_id FROM Customer WHERE user_id = ?", (1,), ()),
+}
+
+
+def _ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def current_version(conn):
+    _ensure_version_table(conn)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply the pending migrations in order; returns the resulting schema version"""
+    _ensure_version_table(conn)
+    applied = {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+    for version, description, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        # IMMEDIATE takes the write lock before re-checking, so two processes
+        # starting at once cannot both apply the same migration
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                         (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Applied migration %d: %s", version, description)
+    return current_version(conn)
+
+
+def _plan_scans(conn, query, params):
+    """Tables a query reads in full, from EXPLAIN QUERY PLAN, as (table, plan line) pairs"""
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + query, params):
+        detail = re.sub(r'\bTABLE ', '', row[3])     # SQLite < 3.36 says "SCAN TABLE x"
+        match = re.match(r'SCAN (\w+)', detail)
+        if match:
+            scans.append((match.group(1), detail))
+    return scans
+
+
+def check_plans(conn):
+    """
+    (name, plan line) for each hot query step that scans a table, ignoring
+    index-order scans of the table a listing is sorted by.
+    """
+    problems = []
+    for name, (query, params, ordered) in HOT_QUERIES.items():
+        for table, detail in _plan_scans(conn, query, params):
+            if table in ordered and 'USING INDEX' in detail.replace('COVERING ', ''):
+                continue
+            problems.append((name, detail))
+    return problems
+
+
+def _scratch_check():
+    from .database_setup import init_db
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, 'plans.db')
+        init_db(path)
+        conn = connect(path)
+        try:
+            problems = check_plans(conn)
+            version = current_version(conn)
+        finally:
+            conn.close()
+    print(f"schema version {version}, {len(HOT_QUERIES)} hot queries checked")
+    for name, detail in problems:
+        print(f"  {name}: {detail}")
+    print("no table scans" if not problems else f"{len(problems)} table scan(s)")
+    return 0 if not problems else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the database.")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--check-plans', action='store_true',
+                        help='check the hot queries on a scratch database instead of migrating')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.check_plans:
+        return _scratch_check()
+
+    conn = connect(args.db)
+    try:
+        before = current_version(conn)
+        after = migrate(conn)
+    finally:
+        conn.close()
+    print(f"{args.db}: schema version {before} -> {after}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
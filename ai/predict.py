@@ -1,25 +1,365 @@
 import cv2
+import logging
 import numpy as np
-from keras.models import load_model
-from keras.applications.mobilenet_v2 import preprocess_input
 import os
+import threading
+import time
+from .batching import MicroBatcher
+from .decision import DecisionPolicy
+from .quantize import TFLiteClassifier, quantized_model_path
+from . import quality
+from .image_io import ImageTooLarge, image_size
+from .prediction_cache import PredictionCache, content_key, perceptual_hash
+from .log import sample_raw_outputs
+from .metrics import registry, timed
+
+logger = logging.getLogger(__name__)
+
+# Keras/TensorFlow are imported lazily in load_models() so importing this
+# module (and the blueprints that use it) does not pay for TF initialization.
+
+BASE_DIR = os.path.dirname(__file__)
+SKIN_MODEL_PATH = os.path.join(BASE_DIR, 'model', 'my_skin_model.h5')
+ACNE_MODEL_PATH = os.path.join(BASE_DIR, 'model', 'my_acne_model.h5')
+
+# 'shared' runs one backbone pass feeding both classifier heads,
+# 'separate' keeps the original two full model calls per image.
+INFERENCE_MODE = os.environ.get('SKIN_AI_INFERENCE_MODE', 'shared')
+
+# 'keras' runs the .h5 models; 'int8' / 'float16' run the TFLite variants
+# written by `python -m ai.quantize` (my_skin_model.int8.tflite, ...).
+MODEL_BACKEND = os.environ.get('SKIN_AI_MODEL_BACKEND', 'keras')
+# Interpreter threads per TFLite model, unset lets TFLite decide
+TFLITE_THREADS = int(os.environ.get('SKIN_AI_TFLITE_THREADS', '0')) or None
+
+# Name of the last MobileNetV2 layer when the backbone is flattened into the model
+BACKBONE_OUTPUT_LAYER = 'out_relu'
+# Largest difference allowed between the dual-head model and the separate models
+DUAL_HEAD_TOLERANCE = 1e-4
+
+
+def _split_backbone(model):
+    """
+    Split a MobileNetV2 classifier at the backbone output into (trunk, head):
+    the trunk is everything from the model input to the backbone features (any
+    rescaling or preprocessing layers in front of the backbone included), the
+    head everything from those features to the output, both in graph order.
+    Raises ValueError if the output depends on anything but the backbone features.
+    """
+    from keras.models import Model
+
+    for layer in model.layers:
+        # Backbone nested as a single sub-model (Sequential([base, pool, dense...]))
+        # or flattened into a functional model
+        if isinstance(layer, Model) or layer.name == BACKBONE_OUTPUT_LAYER:
+            features = layer.output
+            return Model(model.inputs, features), Model(features, model.outputs)
+    raise ValueError(f"No MobileNetV2 backbone found in {model.name}")
+
+
+def _same_weights(model_a, model_b):
+    weights_a = model_a.get_weights()
+    weights_b = model_b.get_weights()
+    if len(weights_a) != len(weights_b):
+        return False
+    return all(a.shape == b.shape and np.array_equal(a, b) for a, b in zip(weights_a, weights_b))
+
+
+def build_dual_head_model(skin_model, acne_model):
+    """
+    Combine the skin and acne classifiers into one model with two outputs.
+    When both were trained on the same frozen backbone, the backbone runs once
+    and feeds both heads. Otherwise the two full models are fused into one
+    graph so a single predict() call still returns both outputs.
+    """
+    from keras import Input
+    from keras.models import Model
+
+    inputs = Input(shape=skin_model.input_shape[1:])
+
+    skin_trunk, skin_head = _split_backbone(skin_model)
+    acne_trunk, acne_head = _split_backbone(acne_model)
+
+    if _same_weights(skin_trunk, acne_trunk):
+        features = skin_trunk(inputs)
+        skin_out = skin_head(features)
+        acne_out = acne_head(features)
+        logger.info("Shared backbone: one forward pass for skin + acne heads")
+    else:
+        # Fine-tuned backbones differ, sharing one would change the acne outputs
+        skin_out = skin_model(inputs)
+        acne_out = acne_model(inputs)
+        logger.info("Backbone weights differ between models, using fused two-backbone model")
+
+    dual = Model(inputs, [skin_out, acne_out], name='skin_acne_dual_head')
+    _check_dual_head(dual, skin_model, acne_model)
+    return dual
+
+
+def _check_dual_head(dual, skin_model, acne_model, tolerance=DUAL_HEAD_TOLERANCE):
+    """
+    Raise ValueError unless the merged model reproduces both original models
+    on a sample batch (weightless layers such as Rescaling are not covered by
+    the weight comparison, so only the outputs can tell).
+    """
+    sample = np.random.default_rng(0).uniform(
+        -1, 1, (4,) + tuple(skin_model.input_shape[1:])).astype(np.float32)
+    skin_dual, acne_dual = dual.predict(sample, verbose=0)
+    for name, merged, model in (('skin', skin_dual, skin_model), ('acne', acne_dual, acne_model)):
+        diff = float(np.max(np.abs(merged - model.predict(sample, verbose=0))))
+        if not diff <= tolerance:
+            raise ValueError(f"Dual-head {name} outputs differ from the {name} model by {diff:.2g}")
+
+
+# Micro-batching: concurrent requests are grouped into one predict() call.
+# SKIN_AI_MAX_BATCH_SIZE=1 disables it.
+MAX_BATCH_SIZE = int(os.environ.get('SKIN_AI_MAX_BATCH_SIZE', '8'))
+MAX_BATCH_WAIT_MS = float(os.environ.get('SKIN_AI_MAX_BATCH_WAIT_MS', '10'))
+
+# Face detection runs on a copy downscaled so its longest side is at most this
+# many pixels; boxes are mapped back to full resolution. 0 disables downscaling.
+DETECTION_MAX_SIDE = int(os.environ.get('SKIN_AI_DETECTION_MAX_SIDE', '640'))
+# Smallest face searched for, as a fraction of the shorter image side
+MIN_FACE_FRACTION = 0.08
+# Haar cascade window size, nothing smaller can be detected anyway
+CASCADE_WINDOW = 24
+
+# Oversized uploads are decoded at 1/2, 1/4 or 1/8 scale (JPEG: by the decoder
+# itself) as long as the longest side stays at least DECODE_MIN_SIDE; 0 disables it.
+DECODE_MIN_SIDE = int(os.environ.get('SKIN_AI_DECODE_MIN_SIDE', '1024'))
+# Uploads above these limits are refused before decoding (decompression bombs)
+MAX_IMAGE_BYTES = int(os.environ.get('SKIN_AI_MAX_IMAGE_BYTES', str(25 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get('SKIN_AI_MAX_IMAGE_PIXELS', '50000000'))
+# Bytes read from a file to find its size in the header (JPEG EXIF can be ~64 KB)
+HEADER_BYTES = 256 * 1024
+
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# Multi-face mode (ai_predict_faces): most faces analysed per image, and the
+# smallest face kept as a fraction of the largest face's area
+MAX_FACES = int(os.environ.get('SKIN_AI_MAX_FACES', '6'))
+MULTI_FACE_MIN_AREA = 0.25
+
+# Thumbnail quality pre-screen (ai/quality.py) before face detection; 0 disables it
+QUALITY_GATE = os.environ.get('SKIN_AI_QUALITY_GATE', '1') == '1'
+
+# Prediction cache in front of ai_predict. SKIN_AI_CACHE_SIZE=0 disables it,
+# SKIN_AI_CACHE_DB keeps entries in a SQLite file across restarts.
+CACHE_SIZE = int(os.environ.get('SKIN_AI_CACHE_SIZE', '1024'))
+CACHE_TTL_SECONDS = float(os.environ.get('SKIN_AI_CACHE_TTL', '3600'))
+CACHE_MAX_DISTANCE = int(os.environ.get('SKIN_AI_CACHE_PHASH_DISTANCE', '10'))
+CACHE_DB = os.environ.get('SKIN_AI_CACHE_DB', '')
+
+# Populated by load_models()
+skin_model = None
+acne_model = None
+dual_model = None
+batcher = None
+prediction_cache = None
+
+_load_lock = threading.Lock()
+# Filled by preload_for_fork(): path -> TFLiteClassifier built in the
+# master, or the model bytes when it had to leave that to the workers
+_preloaded = {}
+_status = {
+    "loaded": False,
+    "warmed_up": False,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "error": None,
+}
+
+
+def load_models():
+    """
+    Load both models (once) and build the dual-head model and micro-batcher.
+    Safe to call from several threads; returns True when the models are usable.
+    """
+    if _status["loaded"]:
+        return True
+
+    with _load_lock:
+        if _status["loaded"]:
+            return True
+
+        start = time.perf_counter()
+        try:
+            if MODEL_BACKEND == 'keras':
+                from keras.models import load_model
+
+                skin = load_model(SKIN_MODEL_PATH)
+                acne = load_model(ACNE_MODEL_PATH)
+            else:
+                skin, acne = (_tflite_classifier(path) for path in model_paths())
+            logger.info("Models loaded successfully (%s backend)", MODEL_BACKEND)
+        except Exception as e:
+            logger.error("Error loading models: %s", e)
+            _status["error"] = str(e)
+            return False
+
+        _install_models(skin, acne)
+        _status["load_seconds"] = time.perf_counter() - start
+        return True
+
+
+def _tflite_classifier(path):
+    preloaded = _preloaded.get(path)
+    if isinstance(preloaded, TFLiteClassifier):
+        return preloaded
+    return TFLiteClassifier(path, num_threads=TFLITE_THREADS, model_content=preloaded)
+
+
+def preload_for_fork(threads=None):
+    """
+    Do the expensive, fork-safe part of loading in a master process before it
+    forks workers, so every worker shares it copy-on-write.
+
+    TFLite backends: the model files are read, and when each worker will run
+    with one thread (`threads` == 1) the interpreters are built here too, so
+    the workers also share the loaded model and its prepared weights. A
+    multi-threaded interpreter starts a thread pool, which does not survive
+    fork(), so with more threads each worker builds its own from the shared
+    bytes.
+
+    Keras: only Keras/TensorFlow are imported. Loading the weights runs
+    TensorFlow ops, and the TensorFlow runtime is not fork-safe (its thread
+    pools do not survive fork()), so each worker loads its own copy of the
+    models in warm_up() after the fork.
+    """
+    if MODEL_BACKEND == 'keras':
+        import keras  # noqa: F401  (module import only, no session/context yet)
+        from keras.applications.mobilenet_v2 import preprocess_input  # noqa: F401
+        return
+    for path in model_paths():
+        with open(path, 'rb') as f:
+            content = f.read()
+        _preloaded[path] = content
+        if threads != 1:
+            continue
+        try:
+            _preloaded[path] = TFLiteClassifier(path, num_threads=1, model_content=content)
+        except Exception as e:
+            # Leave it to the workers, which report the error through model_status()
+            logger.warning("Could not build the %s interpreter before forking: %s", path, e)
+    built = sum(isinstance(p, TFLiteClassifier) for p in _preloaded.values())
+    logger.info("Preloaded %d %s models (%d interpreters built)", len(_preloaded), MODEL_BACKEND, built)
+
+
+def _after_fork_in_child():
+    # Threads do not survive fork(); locks they held would stay locked forever
+    global _load_lock, batcher
+    _load_lock = threading.Lock()
+    if batcher is not None:
+        batcher = MicroBatcher(run_models, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS)
+        registry.register_gauge('micro_batcher', batcher.stats)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def model_paths():
+    """(skin, acne) model files used by the configured backend"""
+    if MODEL_BACKEND == 'keras':
+        return SKIN_MODEL_PATH, ACNE_MODEL_PATH
+    return (quantized_model_path(SKIN_MODEL_PATH, MODEL_BACKEND),
+            quantized_model_path(ACNE_MODEL_PATH, MODEL_BACKEND))
+
+
+def set_models(skin, acne):
+    """
+    Use already built Keras models instead of the .h5 files, e.g. small
+    random-weight stand-ins for benchmarks. Resets the warm-up state.
+    """
+    with _load_lock:
+        _install_models(skin, acne)
+        _status["load_seconds"] = 0.0
+        _status["warmed_up"] = False
+        _status["warmup_seconds"] = None
+
+
+def _install_models(skin, acne):
+    """Build the dual-head model, batcher and cache around a model pair (lock held)"""
+    global skin_model, acne_model, dual_model, batcher, prediction_cache
+
+    dual = None
+    # TFLite models are already one optimised graph each, nothing to share
+    if INFERENCE_MODE == 'shared' and not isinstance(skin, TFLiteClassifier):
+        try:
+            dual = build_dual_head_model(skin, acne)
+        except Exception as e:
+            logger.warning("Could not build dual-head model, using separate models: %s", e)
+
+    skin_model, acne_model, dual_model = skin, acne, dual
+    batcher = None
+    if MAX_BATCH_SIZE > 1:
+        batcher = MicroBatcher(run_models, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS)
+    prediction_cache = None
+    if CACHE_SIZE > 0:
+        prediction_cache = PredictionCache(
+            model_paths(),
+            max_entries=CACHE_SIZE,
+            ttl_seconds=CACHE_TTL_SECONDS,
+            max_distance=CACHE_MAX_DISTANCE,
+            db_path=CACHE_DB or None,
+            policy=decision_policy.fingerprint(),
+        )
+
+    if batcher is not None:
+        registry.register_gauge('micro_batcher', batcher.stats)
+    if prediction_cache is not None:
+        registry.register_gauge('prediction_cache', prediction_cache.stats)
+
+    _status["error"] = None
+    _status["loaded"] = True
+
+
+def warm_up():
+    """
+    Load the models and push dummy batches through them so graph tracing and
+    first-call allocation happen before real traffic arrives.
+    """
+    if not load_models():
+        return False
+    if _status["warmed_up"]:
+        return True
+
+    start = time.perf_counter()
+    try:
+        face_cascade.detectMultiScale(np.zeros((240, 320), dtype=np.uint8))
+        for batch_size in sorted({1, max(1, MAX_BATCH_SIZE)}):
+            run_models(np.zeros((batch_size, 224, 224, 3), dtype=np.float32))
+    except Exception as e:
+        logger.error("Warm-up failed: %s", e)
+        _status["error"] = f"warm-up failed: {e}"
+        return False
+
+    _status["warmup_seconds"] = time.perf_counter() - start
+    _status["warmed_up"] = True
+    logger.info("Models warmed up in %.2fs", _status['warmup_seconds'])
+    return True
+
+
+def start_warm_up():
+    """Warm up in a background thread so the server can start answering /healthz."""
+    thread = threading.Thread(target=warm_up, name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def model_status():
+    """Snapshot of load/warm-up state and timings for the health endpoints."""
+    return dict(_status)
 
-# Load models
-try:
-    BASE_DIR = os.path.dirname(__file__)
-    skin_model = load_model(os.path.join(BASE_DIR, 'model', 'my_skin_model.h5'))
-    acne_model = load_model(os.path.join(BASE_DIR, 'model', 'my_acne_model.h5'))
-    print("Models loaded successfully")
-except Exception as e:
-    print(f"Error loading models: {e}")
-    skin_model = None
-    acne_model = None
 
 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
 
 skin_classes = ['dry', 'normal', 'oil']
 acne_classes = ['no_acne', 'mild', 'moderate', 'severe', 'very_severe']
 
+# Vectorised decide() rules used by every prediction path (see ai/decision.py)
+decision_policy = DecisionPolicy.from_env(skin_classes, acne_classes)
+
 def is_likely_skin_image(image_region):
     try:
         hsv = cv2.cvtColor(image_region, cv2.COLOR_RGB2HSV)
@@ -41,166 +381,526 @@ def detect_animal_features(image):
     except:
         return False
 
-def ai_predict(image_path):
+def run_models(batch):
+    """Run both classifiers on a preprocessed (N, 224, 224, 3) batch."""
+    if dual_model is not None:
+        with timed('model.dual_head'):
+            skin_preds, acne_preds = dual_model.predict(batch, verbose=0)
+        return skin_preds, acne_preds
+    with timed('model.skin'):
+        skin_preds = skin_model.predict(batch, verbose=0)
+    with timed('model.acne'):
+        acne_preds = acne_model.predict(batch, verbose=0)
+    return skin_preds, acne_preds
+
+def detect_faces(gray, max_side=None):
+    """
+    Run the Haar cascade on an adaptively downscaled copy of `gray` and return
+    face boxes as an (N, 4) array of (x, y, w, h) in full-resolution coordinates.
+    minSize scales with the image so a 12 MP photo does not search for 30px faces.
+    """
+    if max_side is None:
+        max_side = DETECTION_MAX_SIDE
+
+    h, w = gray.shape[:2]
+    if max_side <= 0:
+        # Original full-resolution detection
+        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
+        return np.asarray(faces, dtype=int).reshape(-1, 4)
+
+    scale = min(1.0, max_side / max(h, w))
+    min_face = max(30, int(min(h, w) * MIN_FACE_FRACTION))
+    if scale < 1.0:
+        small = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    min_small = max(CASCADE_WINDOW, int(round(min_face * scale)))
+
+    faces = face_cascade.detectMultiScale(
+        small,
+        scaleFactor=1.05,
+        minNeighbors=3,
+        minSize=(min_small, min_small)
+    )
+    faces = np.asarray(faces, dtype=np.float64).reshape(-1, 4)
+    if scale < 1.0 and len(faces):
+        faces = np.round(faces / scale)
+        # Rounding can push a box a pixel past the border
+        faces[:, 2] = np.minimum(faces[:, 2], w - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], h - faces[:, 1])
+    return faces.astype(int)
+
+
+def select_region(image):
+    """
+    Pick the region to classify: the largest detected face (padded by 20%),
+    or the centre 60% of the frame when no face is found.
+    Returns (region_rgb, face_detected, None) or (None, False, early_result)
+    when the image should not reach the models.
+    """
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    # Detect faces
+    with timed('predict.face_detection'):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = detect_faces(gray)
+    face_detected = len(faces) > 0
+
+    # Select region of interest
+    if face_detected:
+        areas = [w * h for (x, y, w, h) in faces]
+        return crop_face(image_rgb, faces[np.argmax(areas)]), True, None
+
+    return _centre_region(image, image_rgb)
+
+
+def crop_face(image_rgb, box):
+    """Face box padded by 20% of its shorter side, clipped to the image"""
+    x, y, w, h = box
+    pad = int(0.2 * min(w, h))
+    x1 = max(0, x - pad)
+    y1 = max(0, y - pad)
+    x2 = min(image_rgb.shape[1], x + w + pad)
+    y2 = min(image_rgb.shape[0], y + h + pad)
+    return image_rgb[y1:y2, x1:x2]
+
+
+def _centre_region(image, image_rgb):
+    """No-face fallback of select_region: the centre 60%, if it looks like skin"""
+    h, w, _ = image.shape
+    if h < 100 or w < 100:
+        return None, False, {"error": "Image too small for analysis", "rejection_reason": "too_small"}
+
+    ch, cw = int(h * 0.6), int(w * 0.6)
+    sh, sw = (h - ch) // 2, (w - cw) // 2
+    region = image_rgb[sh:sh+ch, sw:sw+cw]
+
+    with timed('predict.skin_check'):
+        likely_skin = is_likely_skin_image(region)
+    if not likely_skin:
+        with timed('predict.animal_check'):
+            is_animal = detect_animal_features(region)
+        if is_animal:
+            return None, False, {"error": "Animal or non-human face detected. Please upload a human facial image.",
+                                 "rejection_reason": "not_human"}
+
+        return None, False, {
+            "skin_type": "unknown",
+            "skin_confidence": 0.0,
+            "acne_type": "unknown",
+            "acne_confidence": 0.0,
+            "face_detected": False,
+            "message": "No clear face detected. Please ensure your face is visible, well-lit, and looking at the camera.",
+            "rejection_reason": "no_face",
+        }
+
+    return region, False, None
+
+
+INPUT_SIZE = (224, 224)
+
+# Per-thread resize and model-input buffers reused by preprocess_region()
+_buffers = threading.local()
+_input_lut = None
+
+
+def _preprocess_reference(region):
+    """Original preprocessing, kept for dtypes the lookup table does not cover."""
+    from keras.applications.mobilenet_v2 import preprocess_input
+
+    region_resized = cv2.resize(region, INPUT_SIZE)
+    region_normalized = region_resized.astype(np.float32) / 255.0
+    return preprocess_input(region_normalized * 255.0)
+
+
+def _scaling_lut():
+    """
+    MobileNetV2 input value for each of the 256 uint8 pixel values, computed
+    with the same float32 operations as _preprocess_reference so a lookup
+    gives bit-identical results.
+    """
+    global _input_lut
+    if _input_lut is None:
+        from keras.applications.mobilenet_v2 import preprocess_input
+
+        values = np.arange(256, dtype=np.uint8).astype(np.float32) / 255.0
+        _input_lut = np.ascontiguousarray(preprocess_input(values * 255.0), dtype=np.float32)
+    return _input_lut
+
+
+def preprocess_region(region, out=None):
+    """
+    Resize an RGB region to a single (224, 224, 3) MobileNetV2 input.
+
+    The resize writes into a per-thread uint8 buffer and the scaling to
+    [-1, 1] is one table lookup into `out` (a float32 (224, 224, 3) array,
+    e.g. one slot of a batch). Without `out` the calling thread's own buffer
+    is returned, which is overwritten by that thread's next call.
+    """
+    if region.dtype != np.uint8 or region.ndim != 3 or region.shape[2] != 3:
+        result = _preprocess_reference(region)
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
+    resized = getattr(_buffers, 'resized', None)
+    if resized is None:
+        resized = _buffers.resized = np.empty(INPUT_SIZE[::-1] + (3,), dtype=np.uint8)
+    if out is None:
+        out = getattr(_buffers, 'model_input', None)
+        if out is None:
+            out = _buffers.model_input = np.empty(INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+
+    cv2.resize(region, INPUT_SIZE, dst=resized)
+    # mode='clip' skips the bounds check (and its temporary); indices are 0..255
+    np.take(_scaling_lut(), resized, out=out, mode='clip')
+    return out
+
+
+def infer(region_preprocessed):
+    """
+    Get (skin_preds, acne_preds) for one preprocessed region. Goes through the
+    micro-batcher when enabled so concurrent requests share one predict() call.
+    """
+    if batcher is not None:
+        return batcher.submit(region_preprocessed)
+    skin_batch, acne_batch = run_models(np.expand_dims(region_preprocessed, axis=0))
+    return skin_batch[0], acne_batch[0]
+
+
+def _log_raw_outputs(skin_preds, acne_preds):
+    # Raw model outputs are only dumped for a sample of requests
+    if sample_raw_outputs(logger):
+        logger.debug("Raw model outputs", extra={
+            "skin_raw": dict(zip(skin_classes, map(float, skin_preds))),
+            "acne_raw": dict(zip(acne_classes, map(float, acne_preds))),
+        })
+
+
+def decide(skin_preds, acne_preds, face_detected):
+    """
+    Turn raw confidences for one image into the final labels.
+    EMERGENCY FIX: Very conservative thresholds to avoid false positives
+
+    Scalar reference for decision_policy, which the pipeline uses; kept so
+    benchmarks/verify_decision_policy.py can check the two stay identical.
+    """
+    _log_raw_outputs(skin_preds, acne_preds)
+
+    # Get initial predictions
+    skin_conf = float(np.max(skin_preds))
+    acne_conf = float(np.max(acne_preds))
+    skin_type = skin_classes[np.argmax(skin_preds)]
+    acne_type = acne_classes[np.argmax(acne_preds)]
+
+    logger.debug("Initial prediction skin=%s (%.2f) acne=%s (%.2f)", skin_type, skin_conf, acne_type, acne_conf)
+
+    #  CRITICAL FIX: Very conservative thresholds
+
+    # Skin type threshold
+    if skin_conf < 0.45:
+        skin_type = "uncertain"
+        logger.debug("Skin confidence %.2f too low, marked as uncertain", skin_conf)
+
+    #  ACNE FIX: Default to no_acne unless VERY confident
+    no_acne_idx = acne_classes.index('no_acne')
+    no_acne_confidence = acne_preds[no_acne_idx]
+
+    # Strategy: Only predict acne if:
+    # 1. Confidence is VERY high (>70%) AND
+    # 2. no_acne confidence is low (<30%)
+
+    if acne_type != 'no_acne':
+        # Model thinks there's acne
+        if acne_conf < 0.70:
+            # Not confident enough
+            logger.debug("Acne confidence %.2f < 0.70, defaulting to no_acne", acne_conf)
+            acne_type = 'no_acne'
+            acne_conf = max(no_acne_confidence, 0.5)
+        elif no_acne_confidence > 0.30:
+            # Model is confused - no_acne also has decent score
+            logger.debug("Conflicting predictions (no_acne: %.2f), defaulting to no_acne", no_acne_confidence)
+            acne_type = 'no_acne'
+            acne_conf = no_acne_confidence
+        else:
+            logger.debug("High confidence acne detection: %s (%.2f)", acne_type, acne_conf)
+    else:
+        # Model predicts no_acne
+        if no_acne_confidence < 0.40:
+            # Model is not confident about no_acne either
+            # Check if any acne class has very high confidence (>75%)
+            acne_only_preds = acne_preds[1:]  # Exclude no_acne
+            max_acne_conf = np.max(acne_only_preds)
+            if max_acne_conf > 0.75:
+                # There's a very confident acne prediction
+                acne_type = acne_classes[np.argmax(acne_only_preds) + 1]
+                acne_conf = max_acne_conf
+                logger.debug("Overriding to %s (%.2f) due to very high confidence", acne_type, acne_conf)
+            else:
+                logger.debug("Low no_acne confidence but no strong acne signal, keeping no_acne")
+                acne_conf = 0.5
+        else:
+            logger.debug("Clear skin detected: no_acne (%.2f)", no_acne_confidence)
+            acne_conf = no_acne_confidence
+
+    #  If no face detected, be EXTREMELY conservative
+    if not face_detected:
+        if acne_conf < 0.80:
+            logger.debug("No face detected + confidence %.2f < 0.80, forcing no_acne", acne_conf)
+            acne_type = 'no_acne'
+            acne_conf = 0.5
+
+    logger.debug("Final prediction skin=%s (%.2f) acne=%s (%.2f) face_detected=%s",
+                 skin_type, skin_conf, acne_type, acne_conf, face_detected)
+
+    return {
+        "skin_type": skin_type,
+        "skin_confidence": skin_conf,
+        "acne_type": acne_type,
+        "acne_confidence": float(acne_conf),
+        "face_detected": bool(face_detected)
+    }
+
+
+def decode_flags(size):
+    """
+    imread flag for an image of `size` (width, height): the strongest
+    reduction that keeps the longest side at least DECODE_MIN_SIDE.
+    Raises ImageTooLarge above MAX_IMAGE_PIXELS.
+    """
+    if size is None:
+        return cv2.IMREAD_COLOR
+    width, height = size
+    if MAX_IMAGE_PIXELS > 0 and width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is too large ({width}x{height} pixels). Please upload a smaller photo.")
+    if DECODE_MIN_SIDE > 0:
+        for factor, flag in _REDUCED_FLAGS:
+            if max(width, height) // factor >= DECODE_MIN_SIDE:
+                return flag
+    return cv2.IMREAD_COLOR
+
+
+def _check_bytes(size):
+    if MAX_IMAGE_BYTES > 0 and size > MAX_IMAGE_BYTES:
+        raise ImageTooLarge(f"Image file is too large ({size / 1e6:.1f} MB). Please upload a smaller photo.")
+
+
+def _check_decoded(image):
+    # Formats whose header is not parsed are checked here, after decoding
+    if image is not None and MAX_IMAGE_PIXELS > 0 and image.shape[0] * image.shape[1] > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge("Image is too large. Please upload a smaller photo.")
+    return image
+
+
+def decode_image(source):
+    """
+    Decode an image to a BGR array without touching the disk when possible.
+    Accepts a file path, encoded bytes (bytes/bytearray/memoryview), a 1-D
+    uint8 numpy buffer of encoded bytes, or an already decoded HxWx3 array.
+    Large JPEG/PNG files are decoded at reduced scale (see decode_flags).
+    The pixel limit is checked from the header before decoding; for formats
+    image_io cannot parse it is checked after a full decode (OpenCV's own
+    OPENCV_IO_MAX_IMAGE_PIXELS guards that decode). Returns None if the data
+    cannot be decoded; raises ImageTooLarge when the upload exceeds
+    MAX_IMAGE_BYTES or MAX_IMAGE_PIXELS.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        try:
+            _check_bytes(os.path.getsize(path))
+            with open(path, 'rb') as f:
+                header = f.read(HEADER_BYTES)
+                size = image_size(header)
+                if size is None:
+                    # JPEG frame header behind more metadata than HEADER_BYTES, TIFF directory at
+                    # the end of the file: the whole file is within MAX_IMAGE_BYTES
+                    size = image_size(header + f.read())
+        except OSError:
+            return None     # missing or unreadable file, like cv2.imread
+        return _check_decoded(cv2.imread(path, decode_flags(size)))
+    if isinstance(source, np.ndarray):
+        if source.ndim == 3:
+            return source
+        buffer = source
+    else:
+        buffer = np.frombuffer(source, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    _check_bytes(buffer.size)
+    return _check_decoded(cv2.imdecode(buffer, decode_flags(image_size(buffer))))
+
+
+def select_face_regions(image, max_faces=None):
+    """
+    Every detected face, padded like select_region, ordered left to right
+    (before/after shots). Faces under MULTI_FACE_MIN_AREA of the largest one
+    are dropped as likely background detections. Returns (image_rgb, [(box, region), ...]).
+    """
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    with timed('predict.face_detection'):
+        faces = detect_faces(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    if len(faces) == 0:
+        return image_rgb, []
+
+    areas = faces[:, 2] * faces[:, 3]
+    keep = faces[areas >= MULTI_FACE_MIN_AREA * areas.max()]
+    keep = keep[np.argsort(-(keep[:, 2] * keep[:, 3]), kind='stable')][:max_faces or MAX_FACES]
+    keep = keep[np.argsort(keep[:, 0], kind='stable')]
+    return image_rgb, [(tuple(int(v) for v in box), crop_face(image_rgb, box)) for box in keep]
+
+
+def ai_predict_faces(image, max_faces=None):
+    """
+    Multi-face mode: analyse every face in the image with one batched model
+    call. Returns {"faces": [...], "face_count": n}, each entry shaped like an
+    ai_predict result plus its "box" (x, y, w, h). Without a face the image
+    gets the same no-face handling as ai_predict, and an error or no-face
+    result is returned as is.
+    """
+    with timed('predict.total_multi'):
+        return _ai_predict_faces(image, max_faces)
+
+
+def _ai_predict_faces(image, max_faces):
+    try:
+        if not load_models():
+            return {"error": "Models not loaded properly"}
+
+        try:
+            with timed('predict.decode'):
+                image = decode_image(image)
+        except ImageTooLarge as e:
+            registry.increment('decode.too_large')
+            return {"error": str(e), "rejection_reason": "too_large"}
+        if image is None:
+            return {"error": "Could not read image file", "rejection_reason": "unreadable"}
+
+        rejection = _quality_rejection(image)
+        if rejection is not None:
+            return rejection
+
+        image_rgb, faces = select_face_regions(image, max_faces)
+        if not faces:
+            region, _, early_result = _centre_region(image, image_rgb)
+            if early_result is not None:
+                return early_result
+            faces = [(None, region)]
+        face_detected = faces[0][0] is not None
+
+        # One slot per face in a single batch, filled in place by preprocess_region
+        with timed('predict.preprocess'):
+            batch = np.empty((len(faces),) + INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+            for i, (_, region) in enumerate(faces):
+                preprocess_region(region, out=batch[i])
+        with timed('predict.inference'):
+            skin_batch, acne_batch = run_models(batch)
+
+        with timed('predict.decide'):
+            results = decision_policy.results(skin_batch, acne_batch, face_detected)
+        for result, (box, _) in zip(results, faces):
+            result["box"] = list(box) if box is not None else None
+        return {"faces": results, "face_count": len(results) if face_detected else 0}
+
+    except Exception as e:
+        logger.exception("Multi-face prediction error")
+        return {"error": f"Unexpected error during prediction: {str(e)}"}
+
+
+def _quality_rejection(image):
+    """Rejection result from the quality gate, or None when the image passes"""
+    if not QUALITY_GATE:
+        return None
+    with timed('predict.quality_gate'):
+        metrics, reason = quality.screen(image)
+    if reason is None:
+        registry.increment('quality.passed')
+        return None
+    registry.increment('quality.rejected')
+    registry.increment(f'quality.rejected.{reason}')
+    logger.info("Rejected by quality gate: %s", reason, extra={"quality": metrics})
+    return {"error": quality.REJECTIONS[reason], "rejection_reason": reason, "quality": metrics}
+
+
+def _cache_op(fn, *args, **kwargs):
+    """Run a prediction cache step; if it fails the request just goes without the cache"""
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        registry.increment('cache.errors')
+        logger.exception("Prediction cache error")
+        return None
+
+
+def ai_predict(image):
     """
     Predict skin type and acne level from facial image.
+    `image` may be a file path, the raw uploaded bytes or a numpy buffer
+    (see decode_image), so uploads can be analysed straight from memory.
     EMERGENCY FIX: Very conservative thresholds to avoid false positives
     """
+    with timed('predict.total'):
+        return _ai_predict(image)
+
+
+def _ai_predict(image):
     try:
-        if skin_model is None or acne_model is None:
+        if not load_models():
             return {"error": "Models not loaded properly"}
 
+        # Exact repeat of an earlier upload
+        cache = prediction_cache
+        exact_key = None
+        if cache is not None:
+            exact_key = _cache_op(content_key, image)
+            cached = _cache_op(cache.get_exact, exact_key) if exact_key is not None else None
+            if cached is not None:
+                return cached
+
         # Read image
-        image = cv2.imread(image_path)
+        try:
+            with timed('predict.decode'):
+                image = decode_image(image)
+        except ImageTooLarge as e:
+            registry.increment('decode.too_large')
+            return {"error": str(e), "rejection_reason": "too_large"}
         if image is None:
-            return {"error": "Could not read image file"}
+            return {"error": "Could not read image file", "rejection_reason": "unreadable"}
 
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        rejection = _quality_rejection(image)
+        if rejection is not None:
+            return rejection
 
-        # Detect faces
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.05,
-            minNeighbors=3,
-            minSize=(30, 30)
-        )
-        face_detected = len(faces) > 0
-
-        # Select region of interest
-        if face_detected:
-            areas = [w * h for (x, y, w, h) in faces]
-            x, y, w, h = faces[np.argmax(areas)]
-            pad = int(0.2 * min(w, h))
-            x1 = max(0, x - pad)
-            y1 = max(0, y - pad)
-            x2 = min(image.shape[1], x + w + pad)
-            y2 = min(image.shape[0], y + h + pad)
-            region = image_rgb[y1:y2, x1:x2]
-        else:
-            h, w, _ = image.shape
-            if h < 100 or w < 100:
-                return {"error": "Image too small for analysis"}
-            
-            ch, cw = int(h * 0.6), int(w * 0.6)
-            sh, sw = (h - ch) // 2, (w - cw) // 2
-            region = image_rgb[sh:sh+ch, sw:sw+cw]
-            
-            if not is_likely_skin_image(region):
-                if detect_animal_features(region):
-                    return {"error": "Animal or non-human face detected. Please upload a human facial image."}
-                
-                return {
-                    "skin_type": "unknown",
-                    "skin_confidence": 0.0,
-                    "acne_type": "unknown",
-                    "acne_confidence": 0.0,
-                    "face_detected": False,
-                    "message": "No clear face detected. Please ensure your face is visible, well-lit, and looking at the camera."
-                }
-
-        # Preprocess region
-        region_resized = cv2.resize(region, (224, 224))
-        region_normalized = region_resized.astype(np.float32) / 255.0
-        region_preprocessed = preprocess_input(region_normalized * 255.0)
-        region_expanded = np.expand_dims(region_preprocessed, axis=0)
-
-        # Make predictions
-        skin_preds = skin_model.predict(region_expanded, verbose=0)[0]
-        acne_preds = acne_model.predict(region_expanded, verbose=0)[0]
-
-        #  EMERGENCY FIX: Print raw predictions for debugging
-        print(f"\n Raw Model Predictions:")
-        print(f"   Skin confidences: {dict(zip(skin_classes, [f'{p:.2%}' for p in skin_preds]))}")
-        print(f"   Acne confidences: {dict(zip(acne_classes, [f'{p:.2%}' for p in acne_preds]))}")
-
-        # Get initial predictions
-        skin_conf = float(np.max(skin_preds))
-        acne_conf = float(np.max(acne_preds))
-        skin_type = skin_classes[np.argmax(skin_preds)]
-        acne_type = acne_classes[np.argmax(acne_preds)]
-
-        print(f"\n Initial Predictions (before filtering):")
-        print(f"   Skin: {skin_type} ({skin_conf:.2%})")
-        print(f"   Acne: {acne_type} ({acne_conf:.2%})")
-
-        #  CRITICAL FIX: Very conservative thresholds
-        
-        # Skin type threshold
-        if skin_conf < 0.45:
-            skin_type = "uncertain"
-            print(f"    Skin confidence too low, marked as uncertain")
-
-        #  ACNE FIX: Default to no_acne unless VERY confident
-        no_acne_idx = acne_classes.index('no_acne')
-        no_acne_confidence = acne_preds[no_acne_idx]
-        
-        print(f"\n Acne Analysis:")
-        print(f"   Predicted class: {acne_type}")
-        print(f"   Predicted confidence: {acne_conf:.2%}")
-        print(f"   'no_acne' confidence: {no_acne_confidence:.2%}")
-        
-        # Strategy: Only predict acne if:
-        # 1. Confidence is VERY high (>70%) AND
-        # 2. no_acne confidence is low (<30%)
-        
-        if acne_type != 'no_acne':
-            # Model thinks there's acne
-            if acne_conf < 0.70:
-                # Not confident enough
-                print(f"    Acne confidence {acne_conf:.2%} < 70%, defaulting to no_acne")
-                acne_type = 'no_acne'
-                acne_conf = max(no_acne_confidence, 0.5)
-            elif no_acne_confidence > 0.30:
-                # Model is confused - no_acne also has decent score
-                print(f"    Conflicting predictions (no_acne: {no_acne_confidence:.2%}), defaulting to no_acne")
-                acne_type = 'no_acne'
-                acne_conf = no_acne_confidence
-            else:
-                print(f"    High confidence acne detection: {acne_type} ({acne_conf:.2%})")
-        else:
-            # Model predicts no_acne
-            if no_acne_confidence < 0.40:
-                # Model is not confident about no_acne either
-                # Check if any acne class has very high confidence (>75%)
-                acne_only_preds = acne_preds[1:]  # Exclude no_acne
-                max_acne_conf = np.max(acne_only_preds)
-                if max_acne_conf > 0.75:
-                    # There's a very confident acne prediction
-                    acne_type = acne_classes[np.argmax(acne_only_preds) + 1]
-                    acne_conf = max_acne_conf
-                    print(f"    Overriding to {acne_type} ({acne_conf:.2%}) due to very high confidence")
-                else:
-                    print(f"    Low no_acne confidence but no strong acne signal, keeping no_acne")
-                    acne_conf = 0.5
-            else:
-                print(f"    Clear skin detected: no_acne ({no_acne_confidence:.2%})")
-                acne_conf = no_acne_confidence
-
-        #  If no face detected, be EXTREMELY conservative
-        if not face_detected:
-            if acne_conf < 0.80:
-                print(f"    No face detected + confidence {acne_conf:.2%} < 80%, forcing no_acne")
-                acne_type = 'no_acne'
-                acne_conf = 0.5
+        region, face_detected, early_result = select_region(image)
+        if early_result is not None:
+            if cache is not None and "error" not in early_result:
+                _cache_op(cache.put, early_result, exact_key=exact_key)
+            return early_result
 
-        print(f"\n FINAL Predictions:")
-        print(f"   Skin: {skin_type} ({skin_conf:.2%})")
-        print(f"   Acne: {acne_type} ({acne_conf:.2%})")
-        print(f"   Face detected: {face_detected}")
-
-        return {
-            "skin_type": skin_type,
-            "skin_confidence": skin_conf,
-            "acne_type": acne_type,
-            "acne_confidence": acne_conf,
-            "face_detected": face_detected
-        }
+        # Near-duplicate of an earlier face crop (burst shot, re-encode)
+        phash = None
+        if cache is not None:
+            phash = _cache_op(perceptual_hash, region)
+            cached = _cache_op(cache.get_similar, phash, face_detected) if phash is not None else None
+            if cached is not None:
+                _cache_op(cache.put, cached, exact_key=exact_key)
+                return cached
+
+        with timed('predict.preprocess'):
+            model_input = preprocess_region(region)
+        # Includes any wait for the micro-batch running ahead of this one
+        with timed('predict.inference'):
+            skin_preds, acne_preds = infer(model_input)
+        _log_raw_outputs(skin_preds, acne_preds)
+        with timed('predict.decide'):
+            result = decision_policy.results(skin_preds[np.newaxis], acne_preds[np.newaxis], face_detected)[0]
+        if cache is not None:
+            _cache_op(cache.put, result, exact_key=exact_key, phash=phash, face_detected=face_detected)
+        return result
 
     except Exception as e:
-        print(f" Prediction error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Prediction error")
         return {"error": f"Unexpected error during prediction: {str(e)}"}
 
 
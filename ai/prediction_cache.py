@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .db import configure
+
+# dHash grid: HASH_SIZE x HASH_SIZE bits compared between adjacent columns
+HASH_SIZE = 16
+
+
+def content_key(source):
+    """SHA-256 of the raw image data (path, bytes or numpy buffer)"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    if isinstance(source, np.ndarray):
+        digest = hashlib.sha256(str(source.shape).encode())
+        digest.update(np.ascontiguousarray(source).tobytes())
+        return digest.hexdigest()
+    return hashlib.sha256(source).hexdigest()
+
+
+def perceptual_hash(region):
+    """
+    Difference hash of an RGB face crop as an int. Near-identical shots
+    (re-encodes, burst frames) differ in only a few bits.
+    """
+    gray = cv2.cvtColor(region, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def model_fingerprint(paths):
+    """Changes whenever a model file is replaced or modified"""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache of ai_predict results.
+
+    Exact repeats are keyed by the SHA-256 of the uploaded bytes, near-duplicates
+    by a perceptual hash of the face crop (Hamming distance <= max_distance).
+    With db_path set, entries are written through to SQLite and reloaded on
+    start so the cache survives restarts. All entries are dropped when the
+    model files change; `policy` (the decision policy's fingerprint) is part
+    of the same fingerprint, so persisted results made with other thresholds
+    are dropped on load too.
+    """
+
+    def __init__(self, model_paths, max_entries=1024, ttl_seconds=3600, max_distance=10, db_path=None,
+                 policy=''):
+        self.model_paths = tuple(model_paths)
+        self.policy = policy
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_distance = max_distance
+        self._exact = OrderedDict()        # sha256 -> (result, expires_at)
+        self._perceptual = OrderedDict()   # (phash, face_detected) -> (result, expires_at)
+        self._lock = threading.Lock()
+        self._fingerprint = self._current_fingerprint()
+        self.counters = {
+            "exact_hits": 0, "exact_misses": 0,
+            "perceptual_hits": 0, "perceptual_misses": 0,
+            "evictions": 0, "invalidations": 0,
+        }
+
+        self._db = None
+        if db_path:
+            # WAL with synchronous=NORMAL: a put commits without waiting for an fsync
+            self._db = configure(sqlite3.connect(db_path, check_same_thread=False))
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_cache (
+                    kind TEXT NOT NULL,
+                    cache_key TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (kind, cache_key)
+                )
+            ''')
+            self._db.commit()
+            self._load_from_db()
+
+    # ---------- lookups ----------
+
+    def get_exact(self, key):
+        with self._lock:
+            self._check_models()
+            result = self._get(self._exact, key)
+            self.counters["exact_hits" if result is not None else "exact_misses"] += 1
+            return result
+
+    def get_similar(self, phash, face_detected):
+        """Closest cached entry within max_distance bits, or None"""
+        with self._lock:
+            self._check_models()
+            best_key, best_distance = None, self.max_distance + 1
+            for key in self._perceptual:
+                cached_hash, cached_face = key
+                if cached_face != face_detected:
+                    continue
+                distance = bin(cached_hash ^ phash).count('1')
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            result = self._get(self._perceptual, best_key) if best_key is not None else None
+            self.counters["perceptual_hits" if result is not None else "perceptual_misses"] += 1
+            return result
+
+    def put(self, result, exact_key=None, phash=None, face_detected=False):
+        with self._lock:
+            self._check_models()
+            expires_at = time.time() + self.ttl
+            if exact_key is not None:
+                self._set(self._exact, 'exact', exact_key, result, expires_at)
+            if phash is not None:
+                self._set(self._perceptual, 'perceptual', (phash, face_detected), result, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._perceptual.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM prediction_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            # Every request does one exact lookup, so that is the request count
+            requests = self.counters["exact_hits"] + self.counters["exact_misses"]
+            hits = self.counters["exact_hits"] + self.counters["perceptual_hits"]
+            return dict(self.counters,
+                        entries=len(self._exact) + len(self._perceptual),
+                        hit_rate=hits / requests if requests else 0.0)
+
+    # ---------- internals (call with self._lock held) ----------
+
+    def _get(self, store, key):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        result, expires_at = entry
+        if expires_at < time.time():
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return dict(result)
+
+    def _set(self, store, kind, key, result, expires_at):
+        store[key] = (dict(result), expires_at)
+        store.move_to_end(key)
+        evicted = []
+        while len(store) > self.max_entries:
+            evicted.append(store.popitem(last=False)[0])
+        self.counters["evictions"] += len(evicted)
+
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO prediction_cache (kind, cache_key, result, fingerprint, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, self._db_key(key), json.dumps(result, default=float), self._fingerprint, expires_at)
+            )
+            self._db.executemany(
+                "DELETE FROM prediction_cache WHERE kind = ? AND cache_key = ?",
+                [(kind, self._db_key(k)) for k in evicted]
+            )
+            self._db.commit()
+
+    def _current_fingerprint(self):
+        return f"{model_fingerprint(self.model_paths)}:{self.policy}"
+
+    def _check_models(self):
+        fingerprint = self._current_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+        self._fingerprint = fingerprint
+        self._exact.clear()
+        self._perceptual.clear()
+        self.counters["invalidations"] += 1
+        if self._db is not None:
+            self._db.execute("DELETE FROM prediction_cache WHERE fingerprint != ?", (fingerprint,))
+            self._db.commit()
+
+    @staticmethod
+    def _db_key(key):
+        if isinstance(key, tuple):
+            phash, face_detected = key
+            return f"{phash:x}:{int(face_detected)}"
+        return key
+
+    def _load_from_db(self):
+        now = time.time()
+        self._db.execute(
+            "DELETE FROM prediction_cache WHERE fingerprint != ? OR expires_at < ?",
+            (self._fingerprint, now)
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT kind, cache_key, result, expires_at FROM prediction_cache ORDER BY expires_at"
+        ).fetchall()
+        for kind, key, result, expires_at in rows:
+            if kind == 'exact':
+                store = self._exact
+            else:
+                phash, face_flag = key.split(':')
+                key, store = (int(phash, 16), face_flag == '1'), self._perceptual
+            store[key] = (json.loads(result), expires_at)
+        for store in (self._exact, self._perceptual):
+            while len(store) > self.max_entries:
+                store.popitem(last=False)
@@ -0,0 +1,86 @@
+"""
+Cheap image-quality pre-screen, run before face detection.
+
+Everything is measured on one small thumbnail: size, exposure (from a single
+grey-level histogram), sharpness (Laplacian variance) and the fraction of
+skin-coloured pixels. Checks run cheapest first and the thresholds are
+deliberately loose: the gate only turns away uploads that could never give
+a usable analysis (blank, nearly black or white, tiny, no skin colour at all)
+and leaves borderline ones to the full pipeline.
+"""
+import cv2
+import numpy as np
+
+# Longest side of the thumbnail all measurements are taken on
+THUMBNAIL_SIDE = 128
+# Smaller images cannot give a 224x224 face crop worth classifying
+MIN_SIDE = 64
+# Grey levels counted as crushed shadows / blown highlights
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+# Reject when more than this fraction of the frame is crushed or blown
+MAX_CLIPPED_FRACTION = 0.95
+# Laplacian variance of the thumbnail below which the frame is blank or hopelessly blurred
+MIN_SHARPNESS = 4.0
+# Colour photos (mean saturation at least this) need some skin-coloured pixels;
+# greyscale photos skip the check since their skin has no hue
+MIN_MEAN_SATURATION = 30
+MIN_SKIN_FRACTION = 0.01
+
+# Same HSV range as predict.is_likely_skin_image
+_SKIN_LOWER = np.array([0, 10, 60], dtype=np.uint8)
+_SKIN_UPPER = np.array([40, 255, 255], dtype=np.uint8)
+
+REJECTIONS = {
+    "too_small": "Image is too small for analysis. Please upload a larger photo.",
+    "too_dark": "Image is too dark. Please take the photo in better light.",
+    "overexposed": "Image is overexposed. Please avoid direct flash or strong backlight.",
+    "blurry": "Image is blank or too blurry. Please hold the camera steady and focus on the face.",
+    "no_skin": "No skin visible in the image. Please upload a photo of the customer's face.",
+}
+
+
+def measure(image):
+    """Quality metrics of a BGR image, computed on a thumbnail"""
+    h, w = image.shape[:2]
+    scale = min(1.0, THUMBNAIL_SIDE / max(h, w))
+    thumb = image if scale == 1.0 else cv2.resize(
+        image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA
+    )
+
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    pixels = gray.size
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+
+    return {
+        "width": int(w),
+        "height": int(h),
+        "brightness": float(np.dot(histogram, np.arange(256)) / pixels),
+        "dark_fraction": float(histogram[:DARK_LEVEL + 1].sum() / pixels),
+        "bright_fraction": float(histogram[BRIGHT_LEVEL:].sum() / pixels),
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_32F).var()),
+        "mean_saturation": float(hsv[..., 1].mean()),
+        "skin_fraction": float(np.count_nonzero(cv2.inRange(hsv, _SKIN_LOWER, _SKIN_UPPER)) / pixels),
+    }
+
+
+def screen(image):
+    """
+    Returns (metrics, reason): reason is None when the image may go on to
+    face detection, otherwise a key of REJECTIONS.
+    """
+    h, w = image.shape[:2]
+    if min(h, w) < MIN_SIDE:
+        return {"width": int(w), "height": int(h)}, "too_small"
+
+    metrics = measure(image)
+    if metrics["dark_fraction"] > MAX_CLIPPED_FRACTION:
+        return metrics, "too_dark"
+    if metrics["bright_fraction"] > MAX_CLIPPED_FRACTION:
+        return metrics, "overexposed"
+    if metrics["sharpness"] < MIN_SHARPNESS:
+        return metrics, "blurry"
+    if metrics["mean_saturation"] >= MIN_MEAN_SATURATION and metrics["skin_fraction"] < MIN_SKIN_FRACTION:
+        return metrics, "no_skin"
+    return metrics, None
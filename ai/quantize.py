@@ -0,0 +1,149 @@
+"""
+Quantized (TFLite) variants of the skin and acne models for CPU inference.
+
+The converter writes my_skin_model.<mode>.tflite / my_acne_model.<mode>.tflite
+next to the .h5 files. Inputs and outputs stay float32, so the models are a
+drop-in replacement: set SKIN_AI_MODEL_BACKEND=int8 (or float16) and
+ai/predict.py loads them through TFLiteClassifier instead of Keras.
+
+int8 needs calibration images: real customer-like photos that go through the
+same face crop and preprocessing as production traffic.
+
+Usage (from the repo root):
+    python -m ai.quantize --mode int8 --calibration path/to/faces
+    python -m ai.quantize --mode float16
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+
+import numpy as np
+
+MODES = ('int8', 'float16')
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def quantized_model_path(model_path, mode):
+    """ai/model/my_skin_model.h5 -> ai/model/my_skin_model.int8.tflite"""
+    return f"{os.path.splitext(model_path)[0]}.{mode}.tflite"
+
+
+def _interpreter_class():
+    # The small tflite-runtime wheel is enough to run; full TensorFlow also works
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteClassifier:
+    """
+    Keras-like predict() over a TFLite model. One interpreter per model;
+    calls are serialised because an interpreter is not thread-safe, which
+    costs nothing behind the micro-batcher (a single thread runs the models).
+    """
+
+    def __init__(self, path, num_threads=None, model_content=None):
+        self.path = path
+        # model_content: the .tflite bytes already in memory (e.g. read once
+        # before forking workers, so all of them share one copy)
+        if model_content is not None:
+            self._interpreter = _interpreter_class()(model_content=model_content, num_threads=num_threads)
+        else:
+            self._interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+        self.input_shape = (None,) + tuple(int(d) for d in self._input['shape'][1:])
+        self.name = os.path.basename(path)
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self._interpreter.set_tensor(self._input['index'], batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output['index']).copy()
+
+
+def calibration_inputs(folder, limit=200):
+    """Preprocessed (224, 224, 3) inputs from face photos, cropped like production"""
+    from . import predict
+
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+    inputs = []
+    for path in paths:
+        image = predict.decode_image(path)
+        if image is None:
+            continue
+        region, _, early_result = predict.select_region(image)
+        if early_result is not None:
+            continue
+        inputs.append(predict.preprocess_region(region).copy())
+        if len(inputs) >= limit:
+            break
+    return inputs
+
+
+def convert(model_path, mode, calibration=None):
+    """Convert one .h5 model and return the .tflite bytes"""
+    import tensorflow as tf
+    from keras.models import load_model
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(load_model(model_path))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        def representative_dataset():
+            for x in calibration:
+                yield [x[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # float32 in/out so preprocessing and decide() stay unchanged
+        converter.inference_input_type = tf.float32
+        converter.inference_output_type = tf.float32
+    return converter.convert()
+
+
+def main(argv=None):
+    from . import predict
+
+    parser = argparse.ArgumentParser(description="Write int8 or float16 TFLite variants of the models.")
+    parser.add_argument('--mode', choices=MODES, default='int8')
+    parser.add_argument('--calibration', help='folder of face photos (required for int8)')
+    parser.add_argument('--limit', type=int, default=200, help='max calibration images')
+    args = parser.parse_args(argv)
+
+    calibration = None
+    if args.mode == 'int8':
+        if not args.calibration:
+            parser.error("--calibration is required for int8")
+        calibration = calibration_inputs(args.calibration, args.limit)
+        if not calibration:
+            print(f"No usable face images in {args.calibration}")
+            return 1
+        print(f"Calibrating on {len(calibration)} face crops")
+
+    for model_path in (predict.SKIN_MODEL_PATH, predict.ACNE_MODEL_PATH):
+        out_path = quantized_model_path(model_path, args.mode)
+        data = convert(model_path, args.mode, calibration)
+        with open(out_path, 'wb') as f:
+            f.write(data)
+        print(f"{os.path.basename(model_path)} ({os.path.getsize(model_path) / 1e6:.1f} MB) -> "
+              f"{os.path.basename(out_path)} ({len(data) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Quiz questions and options, loaded once per process and reused.
+
+Triggers on Quiz_Question and Quiz_Options bump the 'quiz' row of
+catalog_version (migration 3), so every request checks one integer and the
+catalog is only reloaded, with a single join, after it has actually changed.
+The cached value is already in the shape quiz.html gets as quiz_data.
+"""
+QUIZ_CATALOG_QUERY = '''
+    SELECT q.question_id, q.category, q.question_text, o.option_id, o.option_text
+    FROM Quiz_Question q
+    LEFT JOIN Quiz_Options o ON o.question_id = q.question_id
+    ORDER BY q.question_id, o.option_id
+'''
+
+
+def catalog_version(conn, name):
+    row = conn.execute("SELECT version FROM catalog_version WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def shape_quiz(rows):
+    """[{'question': {...}, 'options': [{...}, ...]}, ...] from the joined rows"""
+    quiz_data = []
+    current = None
+    for question_id, category, question_text, option_id, option_text in rows:
+        if current is None or current['question']['question_id'] != question_id:
+            current = {
+                'question': {'question_id': question_id, 'category': category, 'question_text': question_text},
+                'options': [],
+            }
+            quiz_data.append(current)
+        if option_id is not None:
+            current['options'].append(
+                {'option_id': option_id, 'question_id': question_id, 'option_text': option_text}
+            )
+    return quiz_data
+
+
+class QuizCatalog:
+    def __init__(self):
+        self._cached = (None, None)     # (version, quiz_data), replaced as one object
+
+    def get(self, conn):
+        # Version first: a change landing between the two reads makes the next call reload
+        version = catalog_version(conn, 'quiz')
+        cached_version, data = self._cached
+        if data is not None and cached_version == version:
+            return data
+        data = shape_quiz(conn.execute(QUIZ_CATALOG_QUERY).fetchall())
+        self._cached = (version, data)
+        return data
+
+
+quiz_catalog = QuizCatalog()
+
+
+def save_responses(conn, customer_id, analysis_id, user_id, answers):
+    """
+    Insert one Quiz_Response per (question_id, option_id) in a single
+    executemany and commit. Returns the question ids saved.
+    """
+    conn.executemany(
+        '''INSERT INTO Quiz_Response (customer_id, question_id, option_id, analysis_id, user_id)
+           VALUES (?, ?, ?, ?, ?)''',
+        [(customer_id, question_id, option_id, analysis_id, user_id) for question_id, option_id in answers]
+    )
+    conn.commit()
+    return [question_id for question_id, _ in answers]
@@ -6,8 +6,9 @@ import sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(current_dir)
 
-# Now import predict
-from predict import ai_predict
+# Now import predict (as part of the ai package, it uses relative imports)
+sys.path.insert(0, os.path.dirname(current_dir))
+from ai.predict import ai_predict
 
 print("="*60)
 print("TESTING AI PREDICTION WITH IMAGE")
@@ -0,0 +1,243 @@
+"""
+Skin analysis of a short face video.
+
+Frames are sampled rather than all decoded: the number of samples grows with
+the square root of the clip length (capped), long gaps are skipped by seeking,
+and a blurred sample is replaced by the next frame. The face is found once with
+the Haar cascade and then followed by template matching in a window around
+its last position, re-detecting only when the match is lost. Face crops are
+preprocessed into one array as they are found, run through the models in
+batches, and the per-frame probabilities are averaged into one decision
+policy result with a stability score (how many frames agree with the final labels).
+"""
+import logging
+import math
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from . import predict, quality
+from .metrics import registry, timed
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.webm', '.avi', '.mkv')
+MAX_VIDEO_BYTES = int(os.environ.get('SKIN_AI_MAX_VIDEO_BYTES', str(50 * 1024 * 1024)))
+# Samples per clip: SAMPLES_PER_SQRT_SECOND * sqrt(duration), within these bounds
+MIN_SAMPLES = 4
+MAX_SAMPLES = int(os.environ.get('SKIN_AI_VIDEO_MAX_SAMPLES', '24'))
+SAMPLES_PER_SQRT_SECOND = 4
+# Gaps longer than this are skipped with a seek instead of grabbing every frame
+SEEK_MIN_GAP = 30
+# Extra frames tried when a sample is too blurry
+BLUR_RETRIES = 2
+# Tracking: search window around the last box (fraction of its size) and the
+# normalised correlation below which the face is re-detected
+TRACK_SEARCH_MARGIN = 0.5
+TRACK_MIN_SCORE = 0.6
+MODEL_BATCH_SIZE = 16
+
+
+def is_video_upload(filename, mimetype=None):
+    return bool(mimetype and mimetype.startswith('video/')) or filename.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def sample_positions(frame_count, fps):
+    """Frame indexes to analyse, evenly spread; sub-linear in the clip length"""
+    if frame_count <= 0:
+        return []
+    duration = frame_count / (fps or 25.0)
+    samples = int(SAMPLES_PER_SQRT_SECOND * math.sqrt(duration))
+    samples = max(MIN_SAMPLES, min(MAX_SAMPLES, samples, frame_count))
+    step = frame_count / samples
+    return [int(step * (i + 0.5)) for i in range(samples)]
+
+
+class FaceTracker:
+    """Haar detection once, then template matching on a downscaled grey frame"""
+
+    def __init__(self):
+        self.box = None         # (x, y, w, h) in tracking-scale coordinates
+        self.template = None
+        self.detections = 0
+        self.tracked = 0
+
+    def update(self, gray):
+        """Face box in `gray` coordinates, or None"""
+        if self.box is not None:
+            box = self._match(gray)
+            if box is not None:
+                self.tracked += 1
+                return self._keep(gray, box)
+
+        self.detections += 1
+        faces = predict.detect_faces(gray)
+        if len(faces) == 0:
+            self.box = self.template = None
+            return None
+        box = tuple(int(v) for v in faces[np.argmax(faces[:, 2] * faces[:, 3])])
+        return self._keep(gray, box)
+
+    def _keep(self, gray, box):
+        x, y, w, h = box
+        self.box = box
+        self.template = gray[y:y + h, x:x + w].copy()
+        return box
+
+    def _match(self, gray):
+        x, y, w, h = self.box
+        mx, my = int(w * TRACK_SEARCH_MARGIN), int(h * TRACK_SEARCH_MARGIN)
+        x1, y1 = max(0, x - mx), max(0, y - my)
+        x2, y2 = min(gray.shape[1], x + w + mx), min(gray.shape[0], y + h + my)
+        window = gray[y1:y2, x1:x2]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < TRACK_MIN_SCORE:
+            return None
+        return x1 + bx, y1 + by, w, h
+
+
+def _read_sampled_frames(capture, positions):
+    """Yield one BGR frame per sample position (a sharper neighbour if it is blurred)"""
+    current = 0
+    for target in positions:
+        if target < current:
+            continue
+        if target - current >= SEEK_MIN_GAP:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+        else:
+            for _ in range(target - current):
+                capture.grab()
+        current = target
+
+        frame = None
+        for _ in range(1 + BLUR_RETRIES):
+            ok, candidate = capture.read()
+            current += 1
+            if not ok:
+                break
+            frame = candidate
+            _, reason = quality.screen(candidate)
+            if reason != 'blurry':
+                break
+        if frame is None:
+            return
+        yield frame
+
+
+def _face_inputs(capture, positions):
+    """
+    Preprocessed model inputs of the face in each sampled frame, written
+    straight into one array so no full frame is kept, plus how many samples were read.
+    """
+    tracker = FaceTracker()
+    inputs = np.empty((len(positions),) + predict.INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+    found, sampled = 0, 0
+    for frame in _read_sampled_frames(capture, positions):
+        sampled += 1
+        h, w = frame.shape[:2]
+        scale = min(1.0, predict.DETECTION_MAX_SIDE / max(h, w)) if predict.DETECTION_MAX_SIDE > 0 else 1.0
+        small = frame if scale == 1.0 else cv2.resize(
+            frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA
+        )
+        box = tracker.update(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        if box is None:
+            continue
+        full_box = tuple(int(round(v / scale)) for v in box)
+        crop = cv2.cvtColor(predict.crop_face(frame, full_box), cv2.COLOR_BGR2RGB)
+        predict.preprocess_region(crop, out=inputs[found])
+        found += 1
+    registry.increment('video.face_detections', tracker.detections)
+    registry.increment('video.face_tracked', tracker.tracked)
+    return inputs[:found], sampled
+
+
+def aggregate(skin_batch, acne_batch):
+    """One decision from the mean per-frame probabilities, plus stability scores"""
+    result = predict.decision_policy.results(
+        skin_batch.mean(axis=0, keepdims=True), acne_batch.mean(axis=0, keepdims=True), True
+    )[0]
+    skin_votes = skin_batch.argmax(axis=1)
+    acne_votes = acne_batch.argmax(axis=1)
+    skin_top = int(np.argmax(skin_batch.mean(axis=0)))
+    acne_top = int(np.argmax(acne_batch.mean(axis=0)))
+    skin_stability = float(np.mean(skin_votes == skin_top))
+    acne_stability = float(np.mean(acne_votes == acne_top))
+    result["stability"] = {
+        "skin": skin_stability,
+        "acne": acne_stability,
+        "overall": min(skin_stability, acne_stability),
+    }
+    return result
+
+
+def analyze_video(source):
+    """
+    Analyse a face video given as a file path or the uploaded bytes.
+    Returns an ai_predict-style result plus frames_sampled, frames_with_face
+    and stability, or an "error" / no-face "message" result.
+    """
+    with timed('video.total'):
+        if isinstance(source, (str, os.PathLike)):
+            return _analyze_path(os.fspath(source))
+        if MAX_VIDEO_BYTES > 0 and len(source) > MAX_VIDEO_BYTES:
+            return {"error": f"Video is too large ({len(source) / 1e6:.0f} MB). Please upload a shorter clip.",
+                    "rejection_reason": "too_large"}
+        # VideoCapture only reads from a path
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as f:
+            f.write(source)
+            f.flush()
+            return _analyze_path(f.name)
+
+
+def _analyze_path(path):
+    try:
+        if not predict.load_models():
+            return {"error": "Models not loaded properly"}
+
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            return {"error": "Could not read video file", "rejection_reason": "unreadable"}
+        try:
+            positions = sample_positions(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+                                         capture.get(cv2.CAP_PROP_FPS))
+            with timed('video.sample_and_track'):
+                inputs, sampled = _face_inputs(capture, positions)
+        finally:
+            capture.release()
+
+        if sampled == 0:
+            return {"error": "Could not read video file", "rejection_reason": "unreadable"}
+        if len(inputs) == 0:
+            return {
+                "skin_type": "unknown",
+                "skin_confidence": 0.0,
+                "acne_type": "unknown",
+                "acne_confidence": 0.0,
+                "face_detected": False,
+                "message": "No clear face detected in the video. Please keep the face in frame and well-lit.",
+                "rejection_reason": "no_face",
+            }
+
+        with timed('video.inference'):
+            skin_parts, acne_parts = [], []
+            for start in range(0, len(inputs), MODEL_BATCH_SIZE):
+                skin, acne = predict.run_models(inputs[start:start + MODEL_BATCH_SIZE])
+                skin_parts.append(np.asarray(skin))
+                acne_parts.append(np.asarray(acne))
+
+        result = aggregate(np.concatenate(skin_parts), np.concatenate(acne_parts))
+        result["frames_sampled"] = sampled
+        result["frames_with_face"] = len(inputs)
+        logger.info("Video analysed", extra={
+            "frames_sampled": sampled, "frames_with_face": len(inputs), "stability": result["stability"],
+        })
+        return result
+
+    except Exception as e:
+        logger.exception("Video prediction error")
+        return {"error": f"Unexpected error during video analysis: {str(e)}"}
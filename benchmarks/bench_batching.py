@@ -0,0 +1,83 @@
+"""
+Throughput of the micro-batching engine vs. one predict() call per request.
+
+Simulates N concurrent request threads, each sending preprocessed 224x224
+regions, and reports images/second and latency for both paths.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_batching --clients 8 --requests 20
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from ai import predict
+from ai.batching import MicroBatcher
+
+
+def _unbatched(region):
+    skin_batch, acne_batch = predict.run_models(np.expand_dims(region, axis=0))
+    return skin_batch[0], acne_batch[0]
+
+
+def run_clients(infer_fn, clients, requests_per_client):
+    rng = np.random.default_rng(0)
+    regions = rng.uniform(-1.0, 1.0, size=(clients, 224, 224, 3)).astype(np.float32)
+    latencies = []
+    lock = threading.Lock()
+
+    def client(idx):
+        for _ in range(requests_per_client):
+            t0 = time.perf_counter()
+            infer_fn(regions[idx])
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "images_per_sec": len(latencies) / wall,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=20, help='requests per client')
+    parser.add_argument('--max-batch-size', type=int, default=predict.MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=predict.MAX_BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    if not predict.warm_up():
+        raise SystemExit("Models not loaded, nothing to benchmark")
+
+    # Warm up both paths so graph tracing is not counted
+    _unbatched(np.zeros((224, 224, 3), dtype=np.float32))
+
+    batcher = MicroBatcher(predict.run_models, args.max_batch_size, args.max_wait_ms)
+    batcher.submit(np.zeros((224, 224, 3), dtype=np.float32))
+
+    baseline = run_clients(_unbatched, args.clients, args.requests)
+    batched = run_clients(batcher.submit, args.clients, args.requests)
+
+    print(f"{'path':<12}{'img/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, res in (("per-request", baseline), ("batched", batched)):
+        print(f"{name:<12}{res['images_per_sec']:>10.1f}{res['p50_ms']:>10.1f}{res['p95_ms']:>10.1f}")
+    print(f"speedup: {batched['images_per_sec'] / baseline['images_per_sec']:.2f}x")
+    print(f"batcher: {batcher.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Mixed read/write throughput of the old per-call connections vs ai.db.
+
+Threads run analyzer-style writes (Customer, Skin_Analysis, Suggestion and
+predictions rows in one transaction) mixed with admin-style reads (the
+dashboard counts and the predictions list) for a fixed time against a
+scratch copy of the schema, first the way the routes used to do it (a new
+sqlite3.connect per operation, rollback journal, default pragmas), then with
+the shared pool (WAL, synchronous=NORMAL, busy timeout, larger cache).
+Reports operations per second, p50/p95 latency per kind and "database is
+locked" failures.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_db --threads 8 --seconds 5 --write-ratio 0.3
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+SCRATCH = tempfile.mkdtemp(prefix='bench_db_')
+os.environ['SKIN_AI_DB'] = os.path.join(SCRATCH, 'pooled.db')
+
+from ai import db  # noqa: E402  (reads SKIN_AI_DB at import)
+from ai.analysis_store import save_analysis  # noqa: E402
+from ai.database_setup import init_db  # noqa: E402
+
+
+RESULT = {"skin_type": "oily", "skin_confidence": 0.91, "acne_type": "no_acne",
+          "acne_confidence": 0.84, "face_detected": True}
+
+
+def write(conn, user_id, n):
+    save_analysis(conn, user_id, 'Bench', f"customer {n % 500}", f"img{n}.jpg", RESULT)
+    conn.commit()
+
+
+def read(conn):
+    conn.execute('SELECT COUNT(*) FROM User WHERE role="staff"').fetchone()
+    conn.execute('SELECT COUNT(*) FROM predictions').fetchone()
+    conn.execute('SELECT COUNT(*) FROM Customer').fetchone()
+    conn.execute('SELECT COUNT(*) FROM Skin_Analysis').fetchone()
+    conn.execute('''SELECT p.*, u.username FROM predictions p LEFT JOIN User u ON p.user_id = u.user_id
+                    ORDER BY p.timestamp DESC LIMIT 50''').fetchall()
+
+
+def per_call(path):
+    def get():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return get
+
+
+def run(get_connection, threads, seconds, write_ratio, user_id):
+    latencies = {"read": [], "write": []}
+    errors = {"locked": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    counter = iter(range(10 ** 9))
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = {"read": [], "write": []}
+        locked = 0
+        while time.perf_counter() < deadline:
+            kind = "write" if rng.random() < write_ratio else "read"
+            t0 = time.perf_counter()
+            conn = get_connection()
+            try:
+                if kind == "write":
+                    write(conn, user_id, next(counter))
+                else:
+                    read(conn)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+                continue
+            finally:
+                conn.close()
+            local[kind].append(time.perf_counter() - t0)
+        with lock:
+            for k in latencies:
+                latencies[k] += local[k]
+            errors["locked"] += locked
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors["locked"]
+
+
+def report(name, latencies, locked, seconds):
+    total = sum(len(v) for v in latencies.values())
+    parts = []
+    for kind, values in latencies.items():
+        if values:
+            values = sorted(values)
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            parts.append(f"{kind} {len(values)} (p50 {statistics.median(values) * 1000:.2f} ms, "
+                         f"p95 {p95 * 1000:.2f} ms)")
+    print(f"{name:<10}{total / seconds:9.0f} ops/s   " + ", ".join(parts) + f", locked errors {locked}")
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    args = parser.parse_args()
+
+    try:
+        init_db()
+        conn = db.connect()
+        user_id = conn.execute("INSERT INTO User (username, password_hash, parlour_name, role) "
+                               "VALUES ('bench', 'x', 'Bench', 'staff')").lastrowid
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+        # Same schema and data in the old configuration
+        before_path = os.path.join(SCRATCH, 'per_call.db')
+        shutil.copy(db.DB_PATH, before_path)
+        conn = sqlite3.connect(before_path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+        print(f"{args.threads} threads, {args.seconds:g} s each, {args.write_ratio:.0%} writes")
+        before = report("per-call", *run(per_call(before_path), args.threads, args.seconds,
+                                         args.write_ratio, user_id), args.seconds)
+        after = report("pooled", *run(db.get_db_connection, args.threads, args.seconds,
+                                      args.write_ratio, user_id), args.seconds)
+        print(f"throughput x{after / before:.2f}, connections opened by the pool: {db.pool.stats()['opened']}")
+    finally:
+        db.pool.close_all()
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Face detection latency and agreement: downscaled vs. full-resolution Haar cascade.
+
+Each source photo is resized to 1 MP, 4 MP and 12 MP. For every size the
+original full-resolution detection and the resolution-aware detect_faces()
+are timed, and the largest boxes are compared by IoU. Point --images at a
+folder of real face photos; without it a synthetic image is used, which is
+fine for latency but says nothing about agreement.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_detection --images path/to/faces --repeat 3
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from ai.predict import detect_faces
+
+MEGAPIXELS = (1, 4, 12)
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def synthetic_face(width=1600, height=1200):
+    """Skin-toned oval with darker eyes/mouth on a grey background"""
+    img = np.full((height, width, 3), 128, dtype=np.uint8)
+    cx, cy = width // 2, height // 2
+    fw, fh = width // 5, height // 3
+    cv2.ellipse(img, (cx, cy), (fw, fh), 0, 0, 360, (140, 170, 220), -1)
+    for dx in (-fw // 2, fw // 2):
+        cv2.ellipse(img, (cx + dx, cy - fh // 4), (fw // 6, fh // 12), 0, 0, 360, (40, 40, 60), -1)
+    cv2.ellipse(img, (cx, cy + fh // 2), (fw // 3, fh // 12), 0, 0, 360, (60, 60, 140), -1)
+    return img
+
+
+def resize_to_megapixels(image, megapixels):
+    h, w = image.shape[:2]
+    scale = (megapixels * 1_000_000 / (h * w)) ** 0.5
+    return cv2.resize(image, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_LINEAR)
+
+
+def largest(faces):
+    if len(faces) == 0:
+        return None
+    return faces[np.argmax(faces[:, 2] * faces[:, 3])]
+
+
+def iou(a, b):
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union else 0.0
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best * 1000
+
+
+def load_sources(folder):
+    if not folder:
+        return [('synthetic', synthetic_face())]
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+    sources = [(os.path.basename(p), cv2.imread(p)) for p in paths]
+    return [(name, img) for name, img in sources if img is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', help='folder of face photos (jpg/png)')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per image, best is kept')
+    args = parser.parse_args()
+
+    sources = load_sources(args.images)
+    if not sources:
+        raise SystemExit(f"No readable images in {args.images}")
+
+    print(f"{'size':>6}{'full ms':>10}{'scaled ms':>11}{'speedup':>9}{'agree':>8}{'mean IoU':>10}")
+    for mp in MEGAPIXELS:
+        full_ms, scaled_ms, agree, ious = [], [], 0, []
+        for _, source in sources:
+            gray = cv2.cvtColor(resize_to_megapixels(source, mp), cv2.COLOR_BGR2GRAY)
+            ref, t_ref = timed(lambda: detect_faces(gray, max_side=0), args.repeat)
+            new, t_new = timed(lambda: detect_faces(gray), args.repeat)
+            full_ms.append(t_ref)
+            scaled_ms.append(t_new)
+
+            ref_box, new_box = largest(ref), largest(new)
+            if ref_box is None and new_box is None:
+                agree += 1
+            elif ref_box is not None and new_box is not None:
+                overlap = iou(ref_box, new_box)
+                ious.append(overlap)
+                agree += overlap >= 0.5
+
+        full, scaled = np.mean(full_ms), np.mean(scaled_ms)
+        mean_iou = f"{np.mean(ious):.2f}" if ious else "n/a"
+        print(f"{mp:>4}MP{full:>10.1f}{scaled:>11.1f}{full / scaled:>8.1f}x"
+              f"{agree / len(sources):>8.0%}{mean_iou:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+End-to-end ai_predict benchmark with a stable JSON report and regression check.
+
+Synthetic face and non-face images at several resolutions are run through
+ai_predict. Reported per scenario:
+
+  cold start        fresh interpreter: imports, model load, first prediction
+  warm latency      p50/p95 of one image at a time, per image
+  stages            p50 of every timed pipeline stage (decode, face detection, ...)
+  throughput        images/second with concurrent clients (micro-batching on)
+  peak RSS          maximum resident set size of the benchmark process
+
+The prediction cache is disabled so every call does the full work. With
+--models tiny the real .h5 files are replaced by small random-weight models
+of the same input/output shape, which makes the suite runnable anywhere and
+isolates the non-model part of the pipeline; --models real measures the
+production models.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_predict --models tiny --output bench.json
+    python -m benchmarks.bench_predict --models tiny --baseline bench.json --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+SCHEMA_VERSION = 1
+RESOLUTIONS = ((640, 480), (1920, 1080), (4000, 3000))
+SEED = 0
+
+
+def _import_predict():
+    # Cache hits would hide the work being measured
+    os.environ['SKIN_AI_CACHE_SIZE'] = '0'
+    from ai import predict
+    return predict
+
+
+def build_tiny_models():
+    """Random-weight skin/acne classifiers sharing one small conv backbone"""
+    import keras
+    from keras import layers
+
+    keras.utils.set_random_seed(SEED)
+    backbone = keras.Sequential([
+        keras.Input(shape=(224, 224, 3)),
+        layers.Conv2D(8, 3, strides=4, activation='relu'),
+        layers.Conv2D(16, 3, strides=2, activation='relu'),
+    ], name='tiny_backbone')
+    skin = keras.Sequential([
+        backbone, layers.GlobalAveragePooling2D(), layers.Dense(3, activation='softmax'),
+    ], name='tiny_skin')
+    acne = keras.Sequential([
+        backbone, layers.GlobalAveragePooling2D(), layers.Dense(5, activation='softmax'),
+    ], name='tiny_acne')
+    return skin, acne
+
+
+def load(predict, models):
+    if models == 'tiny':
+        predict.set_models(*build_tiny_models())
+        return True
+    return predict.load_models()
+
+
+def synthetic_images():
+    """name -> JPEG bytes; faces plus noise images of the same sizes"""
+    # Imports ai.predict, so only after _import_predict() has set up the environment
+    from benchmarks.bench_detection import synthetic_face
+
+    rng = np.random.default_rng(SEED)
+    images = {}
+    for width, height in RESOLUTIONS:
+        face = synthetic_face(width, height)
+        noise = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        for kind, img in (('face', face), ('nonface', noise)):
+            ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            assert ok
+            images[f"{kind}_{width}x{height}"] = buf.tobytes()
+    return images
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def cold_start_child(models):
+    """Runs in a fresh interpreter, prints one JSON line of cold start timings"""
+    t0 = time.perf_counter()
+    predict = _import_predict()
+    t1 = time.perf_counter()
+    if not load(predict, models):
+        raise SystemExit("Models not loaded")
+    t2 = time.perf_counter()
+    image = synthetic_images()['face_640x480']
+    t3 = time.perf_counter()
+    predict.ai_predict(image)
+    t4 = time.perf_counter()
+    print(json.dumps({
+        "import_s": t1 - t0,
+        "load_s": t2 - t1,
+        "first_predict_ms": (t4 - t3) * 1000,
+    }))
+
+
+def measure_cold_start(models, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_predict', '--cold-start-child', '--models', models],
+            capture_output=True, text=True, check=True,
+        )
+        total = time.perf_counter() - t0
+        child = json.loads(out.stdout.strip().splitlines()[-1])
+        child["process_total_s"] = total
+        samples.append(child)
+    # Median run per field
+    return {f"cold_start.{k}": float(np.median([s[k] for s in samples])) for k in samples[0]}
+
+
+def measure_warm(predict, images, repeat):
+    from ai.metrics import registry
+
+    results = {}
+    for name, data in images.items():
+        predict.ai_predict(data)
+        registry.reset()
+        latencies = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            predict.ai_predict(data)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[f"warm.{name}.p50_ms"] = float(np.percentile(latencies, 50))
+        results[f"warm.{name}.p95_ms"] = float(np.percentile(latencies, 95))
+        for stage, summary in registry.snapshot()["stages"].items():
+            results[f"stage.{name}.{stage}.p50_ms"] = summary["p50_ms"]
+    return results
+
+
+def measure_throughput(predict, data, clients, requests_per_client):
+    def client():
+        for _ in range(requests_per_client):
+            predict.ai_predict(data)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return {"throughput.face_1920x1080.images_per_sec": clients * requests_per_client / wall}
+
+
+def compare(current, baseline, tolerance):
+    """Names of metrics that got worse than the baseline by more than tolerance"""
+    regressions = []
+    for key, base in sorted(baseline.items()):
+        new = current.get(key)
+        if new is None or not base:
+            continue
+        if key.endswith('_per_sec'):
+            worse = new < base * (1 - tolerance)
+        elif key.endswith(('_ms', '_s', '_mb')):
+            worse = new > base * (1 + tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append(f"{key}: {base:.2f} -> {new:.2f} ({(new - base) / base:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--models', choices=('tiny', 'real'), default='tiny')
+    parser.add_argument('--repeat', type=int, default=20, help='warm runs per image')
+    parser.add_argument('--cold-runs', type=int, default=3, help='fresh interpreters for cold start, 0 skips it')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=10, help='requests per client for throughput')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--baseline', help='earlier JSON report; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown')
+    parser.add_argument('--cold-start-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start_child:
+        cold_start_child(args.models)
+        return 0
+
+    results = measure_cold_start(args.models, args.cold_runs) if args.cold_runs > 0 else {}
+
+    predict = _import_predict()
+    if not load(predict, args.models):
+        raise SystemExit("Models not loaded, nothing to benchmark")
+    predict.warm_up()
+
+    images = synthetic_images()
+    results.update(measure_warm(predict, images, args.repeat))
+    results.update(measure_throughput(predict, images['face_1920x1080'], args.clients, args.requests))
+    results["memory.peak_rss_mb"] = peak_rss_mb()
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+        "config": {
+            "models": args.models,
+            "repeat": args.repeat,
+            "cold_runs": args.cold_runs,
+            "clients": args.clients,
+            "requests": args.requests,
+            "inference_mode": predict.INFERENCE_MODE,
+            "max_batch_size": predict.MAX_BATCH_SIZE,
+            "detection_max_side": predict.DETECTION_MAX_SIDE,
+        },
+        "results": {k: round(v, 3) for k, v in sorted(results.items())},
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("models") != args.models:
+            print(f"warning: baseline was recorded with --models {baseline.get('config', {}).get('models')}",
+                  file=sys.stderr)
+        regressions = compare(report["results"], baseline.get("results", {}), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Preprocessing latency and allocations: original pipeline vs. preallocated buffers.
+
+Random uint8 RGB regions of several sizes go through the original
+resize / astype / divide / multiply / preprocess_input chain and through
+preprocess_region(), which resizes into a reused buffer and scales with a
+lookup table. Outputs are checked to be bit-identical; latency is the best
+of --repeat runs and allocations are the tracemalloc peak of one call.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_preprocess --repeat 200
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from ai.predict import _preprocess_reference, preprocess_region
+
+REGION_SIZES = ((160, 160), (480, 480), (1200, 1200))
+
+
+def best_ms(fn, region, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(region)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def peak_kib(fn, region):
+    fn(region)  # buffers and lookup table are set up outside the measurement
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn(region)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='timing runs per size, best is kept')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'region':>11}{'orig ms':>10}{'new ms':>9}{'speedup':>9}{'orig KiB':>10}{'new KiB':>9}{'identical':>11}")
+    for h, w in REGION_SIZES:
+        region = rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+
+        expected = _preprocess_reference(region)
+        actual = preprocess_region(region)
+        identical = (expected.dtype == actual.dtype
+                     and np.array_equal(expected.view(np.uint32), actual.view(np.uint32)))
+
+        t_ref = best_ms(_preprocess_reference, region, args.repeat)
+        t_new = best_ms(preprocess_region, region, args.repeat)
+        m_ref = peak_kib(_preprocess_reference, region)
+        m_new = peak_kib(preprocess_region, region)
+        print(f"{w:>5}x{h:<5}{t_ref:>10.3f}{t_new:>9.3f}{t_ref / t_new:>8.1f}x"
+              f"{m_ref:>10.0f}{m_new:>9.0f}{str(identical):>11}")
+        if not identical:
+            raise SystemExit(f"Outputs differ for {w}x{h}: max abs diff "
+                             f"{np.max(np.abs(expected - actual))}")
+
+
+if __name__ == '__main__':
+    main()
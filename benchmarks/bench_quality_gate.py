@@ -0,0 +1,89 @@
+"""
+Rejection rate and time saved by the thumbnail quality gate.
+
+Runs a set of images through quality.screen() and through select_region()
+(colour conversion, face detection and the no-face skin/animal checks, the
+work the gate skips for the images it rejects). Reports, per image kind,
+which share is rejected and why, the gate's own cost and the time saved.
+Synthetic bad uploads (black, blown-out, blank, blurred, no skin) are always
+included; point --images at real uploads to check the gate leaves good
+photos alone.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_quality_gate --images path/to/uploads
+"""
+import argparse
+import glob
+import os
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from ai import quality
+from ai.predict import select_region
+from benchmarks.bench_detection import synthetic_face
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def synthetic_uploads(width=1920, height=1080):
+    rng = np.random.default_rng(0)
+    face = synthetic_face(width, height)
+    blue = np.zeros((height, width, 3), dtype=np.uint8)
+    blue[..., 0] = rng.integers(120, 256, size=(height, width), dtype=np.uint8)
+    return {
+        "face": face,
+        "black": np.full((height, width, 3), 5, dtype=np.uint8),
+        "blown_out": np.full((height, width, 3), 250, dtype=np.uint8),
+        "blank_wall": np.full((height, width, 3), (180, 190, 200), dtype=np.uint8),
+        "blurred": cv2.GaussianBlur(face, (0, 0), 40),
+        "no_skin": blue,
+    }
+
+
+def best_ms(fn, image, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(image)
+        best = min(best, time.perf_counter() - t0)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', help='folder of real uploads (jpg/png)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    images = [(kind, img) for kind, img in synthetic_uploads().items()]
+    if args.images:
+        paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(args.images, pattern)))
+        images += [('upload', img) for img in map(cv2.imread, paths) if img is not None]
+
+    reasons = Counter()
+    per_kind = {}
+    gate_total = saved_total = 0.0
+    for kind, image in images:
+        (_, reason), gate_ms = best_ms(quality.screen, image, args.repeat)
+        _, pipeline_ms = best_ms(select_region, image, args.repeat)
+        gate_total += gate_ms
+        if reason is not None:
+            saved_total += pipeline_ms
+        reasons[reason or 'passed'] += 1
+        seen, rejected = per_kind.get(kind, (0, 0))
+        per_kind[kind] = (seen + 1, rejected + (reason is not None))
+        if kind != 'upload':
+            print(f"{kind:<12}{str(reason or 'passed'):<14}gate {gate_ms:6.2f} ms   select_region {pipeline_ms:7.2f} ms")
+
+    n = len(images)
+    print("\nrejected by kind: " + ", ".join(f"{k} {r}/{s}" for k, (s, r) in per_kind.items()))
+    print("outcomes: " + ", ".join(f"{k} {v}" for k, v in sorted(reasons.items())))
+    print(f"gate cost {gate_total / n:.2f} ms/image, saved {saved_total / n:.2f} ms/image "
+          f"(net {(saved_total - gate_total) / n:+.2f} ms/image, model inference not included)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Accuracy and latency of the quantized TFLite models against the Keras models.
+
+Every photo in --images is cropped and preprocessed like production traffic
+and classified by both backends. Reported per head (skin / acne): top-1
+agreement with the reference, mean change in top-1 confidence, largest
+probability difference, plus agreement of the final decide() labels and the
+per-image latency of each backend (batch of 1, mean of --repeat runs).
+
+Run `python -m ai.quantize` first. Agreement only means something on real
+face photos; ideally not the ones used for int8 calibration.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_quantized --mode int8 --images path/to/faces
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ai import predict
+from ai.quantize import MODES, TFLiteClassifier, calibration_inputs, quantized_model_path
+
+
+def mean_latency_ms(model, inputs, repeat):
+    model.predict(inputs[:1], verbose=0)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(len(inputs)):
+            model.predict(inputs[i:i + 1], verbose=0)
+    return (time.perf_counter() - t0) * 1000 / (repeat * len(inputs))
+
+
+def compare_head(name, classes, ref, quant):
+    ref_top, quant_top = ref.argmax(axis=1), quant.argmax(axis=1)
+    rows = np.arange(len(ref))
+    conf_delta = quant[rows, ref_top] - ref[rows, ref_top]
+    print(f"{name:<6}{np.mean(ref_top == quant_top):>10.1%}{np.mean(np.abs(conf_delta)):>14.4f}"
+          f"{np.mean(conf_delta):>+13.4f}{np.max(np.abs(quant - ref)):>13.4f}")
+    for idx, label in enumerate(classes):
+        mask = ref_top == idx
+        if mask.any():
+            print(f"    {label:<12} n={mask.sum():<5} agreement {np.mean(quant_top[mask] == idx):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=MODES, default='int8')
+    parser.add_argument('--images', required=True, help='folder of face photos (jpg/png)')
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3, help='latency passes over the images')
+    parser.add_argument('--threads', type=int, default=None, help='TFLite interpreter threads')
+    args = parser.parse_args()
+
+    from keras.models import load_model
+
+    inputs = calibration_inputs(args.images, args.limit)
+    if not inputs:
+        raise SystemExit(f"No usable face images in {args.images}")
+    inputs = np.stack(inputs)
+
+    print(f"{len(inputs)} face crops, backend {args.mode}\n")
+    print(f"{'head':<6}{'top-1 agree':>10}{'|d conf| mean':>14}{'d conf mean':>13}{'max |d p|':>13}")
+
+    ms = {}
+    decisions_agree = 0
+    heads = {}
+    for head, path, classes in (("skin", predict.SKIN_MODEL_PATH, predict.skin_classes),
+                                ("acne", predict.ACNE_MODEL_PATH, predict.acne_classes)):
+        reference = load_model(path)
+        quantized = TFLiteClassifier(quantized_model_path(path, args.mode), num_threads=args.threads)
+        ref = reference.predict(inputs, verbose=0)
+        quant = np.concatenate([quantized.predict(inputs[i:i + 1]) for i in range(len(inputs))])
+        compare_head(head, classes, ref, quant)
+        heads[head] = (ref, quant)
+        ms[head] = (mean_latency_ms(reference, inputs, args.repeat),
+                    mean_latency_ms(quantized, inputs, args.repeat))
+
+    (skin_ref, skin_q), (acne_ref, acne_q) = heads["skin"], heads["acne"]
+    for i in range(len(inputs)):
+        a = predict.decide(skin_ref[i], acne_ref[i], True)
+        b = predict.decide(skin_q[i], acne_q[i], True)
+        decisions_agree += (a["skin_type"], a["acne_type"]) == (b["skin_type"], b["acne_type"])
+    print(f"\ndecide() labels identical: {decisions_agree / len(inputs):.1%}")
+
+    print(f"\n{'head':<6}{'keras ms':>10}{args.mode + ' ms':>12}{'speedup':>9}")
+    for head, (keras_ms, quant_ms) in ms.items():
+        print(f"{head:<6}{keras_ms:>10.2f}{quant_ms:>12.2f}{keras_ms / quant_ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Memory per worker of serve.py with and without preloading (Linux only).
+
+Starts serve.py with each worker count, waits until every worker has loaded
+and warmed its models, then reads RSS and PSS of the master and workers from
+/proc/<pid>/smaps_rollup. RSS counts shared pages in every process; PSS splits
+them between the processes sharing them, so the PSS total is the real memory
+the whole server uses. --no-preload is the per-worker loading every process
+did before serve.py (it is what N separate `python main.py` would use, minus
+N copies of the interpreter itself).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_serve_memory --workers 1 2 4
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+READY_MARKER = 'ready'
+
+
+def smaps(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1].lower()] = int(parts[1]) / 1024
+    return values
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def measure(workers, preload, port, timeout):
+    cmd = [sys.executable, 'serve.py', '--workers', str(workers), '--port', str(port)]
+    if not preload:
+        cmd.append('--no-preload')
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    ready = threading.Semaphore(0)
+
+    def read_log():
+        for line in proc.stderr:
+            if 'Worker' in line and READY_MARKER in line:
+                ready.release()
+
+    threading.Thread(target=read_log, daemon=True).start()
+    try:
+        deadline = time.monotonic() + timeout
+        for _ in range(workers):
+            if not ready.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise SystemExit(f"Workers not ready after {timeout}s")
+        master = smaps(proc.pid)
+        worker_stats = [smaps(pid) for pid in children(proc.pid)]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    return {
+        "master_rss": master['rss'],
+        "worker_rss": sum(w['rss'] for w in worker_stats) / len(worker_stats),
+        "worker_pss": sum(w['pss'] for w in worker_stats) / len(worker_stats),
+        "total_pss": master['pss'] + sum(w['pss'] for w in worker_stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for the workers')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        raise SystemExit("Needs Linux /proc/<pid>/smaps_rollup")
+
+    print(f"{'workers':>7}{'mode':>12}{'worker RSS MB':>15}{'worker PSS MB':>15}{'total PSS MB':>14}")
+    for n in args.workers:
+        for preload in (False, True):
+            r = measure(n, preload, args.port, args.timeout)
+            mode = 'preload' if preload else 'no-preload'
+            print(f"{n:>7}{mode:>12}{r['worker_rss']:>15.0f}{r['worker_pss']:>15.0f}{r['total_pss']:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
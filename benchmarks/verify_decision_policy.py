@@ -0,0 +1,83 @@
+"""
+Check the vectorised DecisionPolicy against the scalar decide(), and time both.
+
+Random probability rows (Dirichlet, some peaked, some flat) are mixed with
+rows whose values sit exactly on a threshold (in float32 and float64), ties
+between classes and face / no-face flags. Every field of every row must be
+identical; the first mismatches are printed and the exit status is 1.
+
+Usage (from the repo root):
+    python -m benchmarks.verify_decision_policy --rows 100000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from ai import predict
+
+THRESHOLDS = (0.30, 0.40, 0.45, 0.5, 0.70, 0.75, 0.80)
+
+
+def random_batch(rng, rows, classes, dtype):
+    concentration = rng.choice([0.2, 1.0, 5.0], size=rows)[:, None]
+    probs = rng.gamma(np.broadcast_to(concentration, (rows, classes)))
+    probs /= probs.sum(axis=1, keepdims=True)
+    probs = probs.astype(dtype)
+
+    # A quarter of the rows get a value exactly on a threshold (and its neighbours)
+    edge = rng.random(rows) < 0.25
+    cols = rng.integers(0, classes, size=rows)
+    values = np.array(THRESHOLDS, dtype=dtype)[rng.integers(0, len(THRESHOLDS), size=rows)]
+    nudge = rng.integers(-1, 2, size=rows)
+    values = np.where(nudge < 0, np.nextafter(values, dtype(0)),
+                      np.where(nudge > 0, np.nextafter(values, dtype(1)), values))
+    probs[edge, cols[edge]] = values[edge]
+
+    # Some ties for the argmax
+    tie = rng.random(rows) < 0.02
+    probs[tie, (cols[tie] + 1) % classes] = probs[tie, cols[tie]]
+    return probs
+
+
+def verify(rows, dtype, seed):
+    rng = np.random.default_rng(seed)
+    skin = random_batch(rng, rows, len(predict.skin_classes), dtype)
+    acne = random_batch(rng, rows, len(predict.acne_classes), dtype)
+    faces = rng.random(rows) < 0.5
+
+    t0 = time.perf_counter()
+    expected = [predict.decide(skin[i], acne[i], bool(faces[i])) for i in range(rows)]
+    scalar_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = predict.decision_policy.decide_batch(skin, acne, faces)
+    vector_s = time.perf_counter() - t0
+    actual = predict.decision_policy.results(skin, acne, faces)
+
+    mismatches = [(i, e, a) for i, (e, a) in enumerate(zip(expected, actual)) if e != a]
+    print(f"{np.dtype(dtype).name:>8}: {rows} rows, {len(mismatches)} mismatches, "
+          f"decide() {scalar_s * 1e6 / rows:.2f} us/row, "
+          f"decide_batch() {vector_s * 1e6 / rows:.3f} us/row ({scalar_s / vector_s:.0f}x)")
+    for i, e, a in mismatches[:5]:
+        print(f"   row {i}: skin={skin[i].tolist()} acne={acne[i].tolist()} face={faces[i]}")
+        print(f"      decide():       {e}")
+        print(f"      decide_batch(): {a}")
+    assert len(batch["skin_type"]) == rows
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ok = all([verify(args.rows, np.float32, args.seed), verify(args.rows, np.float64, args.seed + 1)])
+    print("identical" if ok else "MISMATCH")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,10 +2,22 @@ from flask import Flask
 from ai.ai_routes import ai_bp
 from admin.routes import admin_bp
 from ai.database_setup import init_db, create_admin_user, create_sample_staff, insert_sample_quiz_questions
+from ai.predict import start_warm_up, warm_up, MAX_IMAGE_BYTES
+from ai.video import MAX_VIDEO_BYTES
+from ai.log import configure_logging, init_app as init_request_logging
+from ai.db import init_app as init_db_connections
 import os
 
+configure_logging()
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_change_this_in_production'
+init_request_logging(app)
+init_db_connections(app)
+
+# Refuse oversized request bodies before they are read (1 MB headroom for the form fields)
+if MAX_IMAGE_BYTES > 0 and MAX_VIDEO_BYTES > 0:
+    app.config['MAX_CONTENT_LENGTH'] = max(MAX_IMAGE_BYTES, MAX_VIDEO_BYTES) + 1024 * 1024
 
 # Configure upload folder
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'ai', 'uploads')
@@ -28,6 +40,17 @@ create_admin_user()
 create_sample_staff()
 insert_sample_quiz_questions()
 
+# Load and warm up the models. 'background' lets the server start right away
+# (/readyz returns 503 until done), 'sync' blocks startup, 'off' loads on first request.
+WARMUP_MODE = os.environ.get('SKIN_AI_WARMUP', 'background')
+# The debug reloader's watcher process never serves requests, skip it there
+is_reloader_parent = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+if not is_reloader_parent:
+    if WARMUP_MODE == 'sync':
+        warm_up()
+    elif WARMUP_MODE == 'background':
+        start_warm_up()
+
 print("="*60)
 print("Application ready!")
 print("="*60 + "\n")
@@ -0,0 +1,125 @@
+"""
+Production entry point: preload once in a master process, fork N workers.
+
+The master imports the app, sets up the database, imports Keras/TensorFlow
+and (for the TFLite backends) reads the model files, building the
+interpreters as well when each worker runs single-threaded. It then opens the
+listening socket and forks the workers, which share all of that
+copy-on-write. Each worker sizes the TensorFlow / TFLite thread pools for its
+share of the CPUs, loads whatever the master did not, warms the models and
+serves requests from the shared socket. Dead workers are replaced;
+SIGTERM / Ctrl+C stops all of them.
+
+No thread pool is ever started in the master: they do not survive fork(), so
+the Keras weights and multi-threaded interpreters are loaded in the workers.
+
+Usage (from the repo root):
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# Warm-up happens in the workers after the fork, not when main is imported
+os.environ['SKIN_AI_WARMUP'] = 'off'
+
+from main import app  # noqa: E402
+from ai import predict  # noqa: E402
+
+logger = logging.getLogger('serve')
+
+
+def init_worker(threads):
+    """Runs in each worker right after the fork"""
+    if predict.MODEL_BACKEND == 'keras':
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    else:
+        predict.TFLITE_THREADS = threads
+    if not predict.warm_up():
+        logger.error("Worker %d could not load the models: %s", os.getpid(), predict.model_status()['error'])
+
+
+def run_worker(sock, threads):
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    init_worker(threads)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    logger.info("Worker %d ready", os.getpid())
+    server.serve_forever()
+
+
+def spawn(sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, threads)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preload the models once and fork worker processes.")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--no-preload', action='store_true',
+                        help='skip preloading (each worker imports/reads everything itself), for comparison')
+    args = parser.parse_args(argv)
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    if not args.no_preload:
+        start = time.perf_counter()
+        predict.preload_for_fork(threads)
+        logger.info("Preloaded in %.2fs", time.perf_counter() - start)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    logger.info("Master %d listening on http://%s:%d with %d workers (%d threads each)",
+                os.getpid(), args.host, args.port, args.workers, threads)
+
+    workers = {spawn(sock, threads) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning("Worker %d exited (status %d), starting a new one", pid, status)
+            time.sleep(1)
+            workers.add(spawn(sock, threads))
+    sock.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
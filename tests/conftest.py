@@ -0,0 +1,80 @@
+"""
+Shared fixtures. SKIN_AI_DB is pointed at a scratch file before anything
+imports ai.db, so no test touches the checked-in dermasoul.db.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH = tempfile.mkdtemp(prefix='skin_ai_tests_')
+os.environ['SKIN_AI_DB'] = os.path.join(SCRATCH, 'app.db')
+os.environ.setdefault('SKIN_AI_WARMUP', 'off')
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A freshly initialised database"""
+    from ai.database_setup import init_db
+
+    path = str(tmp_path / 'test.db')
+    init_db(path)
+    return path
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A copy of the checked-in dermasoul.db, migrated the way the app would at start-up"""
+    from ai.database_setup import init_db
+
+    path = str(tmp_path / 'dermasoul.db')
+    shutil.copy(os.path.join(ROOT, 'dermasoul.db'), path)
+    init_db(path)
+    return path
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The blueprints on a scratch database, without main.py's start-up work"""
+    from flask import Flask
+
+    from admin.routes import admin_bp
+    from ai.ai_routes import ai_bp
+    from ai.database_setup import init_db
+    from ai.db import init_app
+
+    init_db()
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['TESTING'] = True
+    init_app(app)
+    app.register_blueprint(ai_bp)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    return app
+
+
+@pytest.fixture
+def staff_client(app):
+    """Test client logged in as a staff user"""
+    from ai.db import connect
+
+    conn = connect()
+    conn.execute("INSERT OR IGNORE INTO User (username, password_hash, parlour_name, role) "
+                 "VALUES ('tester', 'x', 'Test Salon', 'staff')")
+    user_id = conn.execute("SELECT user_id FROM User WHERE username = 'tester'").fetchone()[0]
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['salon_name'] = 'Test Salon'
+    return client
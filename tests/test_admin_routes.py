@@ -0,0 +1,25 @@
+import pytest
+
+from admin import routes
+
+
+@pytest.fixture
+def metrics_token(monkeypatch):
+    monkeypatch.setattr(routes, 'METRICS_TOKEN', 's3cret')
+    return 's3cret'
+
+
+def test_metrics_json_accepts_the_bearer_token(app, metrics_token):
+    response = app.test_client().get('/admin/metrics.json',
+                                     headers={'Authorization': f'Bearer {metrics_token}'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('auth', ['Bearer wrong', 'Bearer s3crét'])
+def test_metrics_json_refuses_a_wrong_token(app, metrics_token, auth):
+    response = app.test_client().get('/admin/metrics.json', headers={'Authorization': auth})
+    assert response.status_code == 401
+
+
+def test_metrics_json_without_credentials_needs_an_admin(app, metrics_token):
+    assert app.test_client().get('/admin/metrics.json').status_code == 403
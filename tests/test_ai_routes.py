@@ -0,0 +1,103 @@
+import io
+
+import pytest
+
+from ai import ai_routes, quality
+from ai.db import connect
+
+NO_FACE = {"skin_type": "unknown", "skin_confidence": 0.0, "acne_type": "unknown",
+           "acne_confidence": 0.0, "face_detected": False,
+           "message": "No clear face detected.", "rejection_reason": "no_face"}
+NOT_HUMAN = {"error": "Animal or non-human face detected. Please upload a human facial image.",
+             "rejection_reason": "not_human"}
+
+
+def post_upload(client, monkeypatch, result):
+    monkeypatch.setattr(ai_routes, 'ai_predict', lambda image: result)
+    return client.post('/analyzer', data={
+        'customerName': 'Jane',
+        'image': (io.BytesIO(b'not really a jpeg'), 'jane.jpg'),
+    }, content_type='multipart/form-data')
+
+
+def predictions_count():
+    conn = connect()
+    count = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    conn.close()
+    return count
+
+
+@pytest.mark.parametrize('reason', sorted(quality.REJECTIONS))
+def test_quality_rejections_show_their_message(staff_client, monkeypatch, reason):
+    before = predictions_count()
+    response = post_upload(staff_client, monkeypatch,
+                           {"error": quality.REJECTIONS[reason], "rejection_reason": reason})
+
+    assert response.status_code == 200
+    assert quality.REJECTIONS[reason].replace("'", "&#39;").encode() in response.data
+    with staff_client.session_transaction() as session:
+        assert not session.get('show_face_error')
+        assert not session.get('show_animal_error')
+    assert predictions_count() == before
+
+
+@pytest.mark.parametrize('result, flag', [(NO_FACE, 'show_face_error'), (NOT_HUMAN, 'show_animal_error')])
+def test_face_rejections_set_their_flag(staff_client, monkeypatch, result, flag):
+    before = predictions_count()
+    response = post_upload(staff_client, monkeypatch, result)
+
+    assert response.status_code == 302
+    with staff_client.session_transaction() as session:
+        assert session.get(flag)
+    assert predictions_count() == before
+
+
+@pytest.mark.parametrize('result', [
+    {"error": "Image is too large (20000x20000 pixels). Please upload a smaller photo.",
+     "rejection_reason": "too_large"},
+    {"error": "Could not read image file", "rejection_reason": "unreadable"},
+    {"error": "Models not loaded properly"},
+])
+def test_other_errors_are_flashed(staff_client, monkeypatch, result):
+    response = post_upload(staff_client, monkeypatch, result)
+
+    assert response.status_code == 200
+    assert result["error"].encode() in response.data
+    with staff_client.session_transaction() as session:
+        assert not session.get('show_face_error')
+
+
+FACE = {"skin_type": "oily", "skin_confidence": 0.91, "acne_type": "no_acne",
+        "acne_confidence": 0.84, "face_detected": True}
+
+
+def post_group_photo(client, monkeypatch, face_names, face_count=2):
+    monkeypatch.setattr(ai_routes, 'ai_predict_faces',
+                        lambda image: {"faces": [dict(FACE)] * face_count, "face_count": face_count})
+    return client.post('/analyzer', data={
+        'customerName': 'Smith, Jane',
+        'multiFace': '1',
+        'faceNames': face_names,
+        'image': (io.BytesIO(b'not really a jpeg'), 'group.jpg'),
+    }, content_type='multipart/form-data')
+
+
+@pytest.mark.parametrize('face_names, expected', [
+    ('Smith, Jane\r\nDoe, Bea\r\n', ['Smith, Jane', 'Doe, Bea']),
+    ('', ['Smith, Jane', 'Smith, Jane']),
+])
+def test_multi_face_names_one_per_line(staff_client, monkeypatch, face_names, expected):
+    response = post_group_photo(staff_client, monkeypatch, face_names)
+
+    assert response.status_code == 302
+    with staff_client.session_transaction() as session:
+        assert [face['customer_name'] for face in session['multi_face']] == expected
+
+
+def test_multi_face_name_count_mismatch_is_refused(staff_client, monkeypatch):
+    before = predictions_count()
+    response = post_group_photo(staff_client, monkeypatch, 'Anna\nBea\nCleo')
+
+    assert response.status_code == 200
+    assert b'The photo has 2 faces' in response.data
+    assert predictions_count() == before
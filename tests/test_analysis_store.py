@@ -0,0 +1,55 @@
+import pytest
+
+from ai import analysis_store
+from ai.analysis_store import SuggestionCatalog, load_suggestions, save_analysis
+from ai.db import connect
+
+RESULT = {"skin_type": "dry", "skin_confidence": 0.9, "acne_type": "mild",
+          "acne_confidence": 0.8, "face_detected": True}
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    conn.execute("INSERT INTO User (user_id, username, password_hash, parlour_name) VALUES (1, 'u', 'x', 'Salon')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = SuggestionCatalog()
+    monkeypatch.setattr(analysis_store, 'suggestion_catalog', catalog)
+    return catalog
+
+
+def catalog_reads(conn, action):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    action()
+    conn.set_trace_callback(None)
+    return [s for s in statements if 'Suggestion_Catalog' in s]
+
+
+def test_cache_fills_inside_the_save_transaction(conn, catalog):
+    save_analysis(conn, 1, 'Salon', 'Jane', 'a.jpg', RESULT)
+    conn.commit()
+    assert catalog._by_text
+
+    reads = catalog_reads(conn, lambda: save_analysis(conn, 1, 'Salon', 'Jane', 'b.jpg', RESULT))
+    conn.commit()
+    assert reads == []
+
+
+def test_rolled_back_texts_are_not_cached(conn, catalog, monkeypatch):
+    monkeypatch.setattr(analysis_store, 'generate_suggestions', lambda skin, acne: ["A brand new tip"])
+    _, analysis_id = save_analysis(conn, 1, 'Salon', 'Jane', 'a.jpg', RESULT)
+    assert load_suggestions(conn, analysis_id) == ["A brand new tip"]
+    conn.rollback()
+    assert "A brand new tip" not in catalog._by_text
+
+    _, analysis_id = save_analysis(conn, 1, 'Salon', 'Jane', 'a.jpg', RESULT)
+    conn.commit()
+    assert load_suggestions(conn, analysis_id) == ["A brand new tip"]
+    assert "A brand new tip" in catalog._by_text
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import numpy as np
+
+from ai.batching import MicroBatcher
+
+
+def test_lone_request_is_not_held_for_max_wait():
+    batcher = MicroBatcher(lambda x: (x * 2,), max_batch_size=8, max_wait_ms=2000)
+    start = time.perf_counter()
+    (out,) = batcher.submit(np.ones(3))
+    assert time.perf_counter() - start < 0.5
+    assert out.tolist() == [2, 2, 2]
+
+
+def test_requests_queued_behind_a_running_batch_share_the_next_one():
+    release = threading.Event()
+    sizes = []
+
+    def predict(x):
+        sizes.append(len(x))
+        if len(sizes) == 1:
+            release.wait(5)
+        return (x + 1,)
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=1000)
+    first = batcher.submit_async(np.zeros(2))
+    while not sizes:
+        time.sleep(0.001)
+    rest = [batcher.submit_async(np.full(2, i)) for i in range(5)]
+    release.set()
+
+    assert first.result(5)[0].tolist() == [1, 1]
+    assert [f.result(5)[0].tolist() for f in rest] == [[i + 1, i + 1] for i in range(5)]
+    assert sizes == [1, 5]
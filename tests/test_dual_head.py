@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+keras = pytest.importorskip('keras')
+
+from ai.predict import build_dual_head_model  # noqa: E402
+
+
+def classifier(scale, classes, backbone):
+    inputs = keras.Input(shape=(8, 8, 3))
+    x = keras.layers.Rescaling(scale)(inputs)
+    x = backbone(x)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    return keras.Model(inputs, keras.layers.Dense(classes, activation='softmax')(x))
+
+
+def backbone():
+    # Stands in for MobileNetV2: same output layer name as the flattened backbone
+    return keras.layers.Conv2D(4, 3, activation='relu', name='out_relu')
+
+
+def test_shared_trunk_matches_the_separate_models():
+    skin = classifier(1.0, 3, backbone())
+    acne = classifier(1.0, 5, backbone())
+    acne.layers[2].set_weights(skin.layers[2].get_weights())
+    dual = build_dual_head_model(skin, acne)
+
+    batch = np.random.default_rng(1).uniform(-1, 1, (2, 8, 8, 3)).astype(np.float32)
+    skin_out, acne_out = dual.predict(batch, verbose=0)
+    np.testing.assert_allclose(skin_out, skin.predict(batch, verbose=0), atol=1e-5)
+    np.testing.assert_allclose(acne_out, acne.predict(batch, verbose=0), atol=1e-5)
+
+
+def test_differing_preprocessing_refuses_to_merge():
+    skin = classifier(1.0, 3, backbone())
+    acne = classifier(0.5, 5, backbone())      # same weights, different Rescaling
+    acne.layers[2].set_weights(skin.layers[2].get_weights())
+    with pytest.raises(ValueError):
+        build_dual_head_model(skin, acne)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from ai.executor import ExecutorBusy, InferenceExecutor
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def occupy(executor, release, n, **kwargs):
+    threads = [threading.Thread(target=executor.run, args=(release.wait,), kwargs=kwargs) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_fill_drain_and_submit_again():
+    executor = InferenceExecutor(max_workers=2, max_queue=1, max_wait_s=5)
+    release = threading.Event()
+    threads = occupy(executor, release, 2)
+    wait_for(lambda: executor.running == 2)
+    threads += occupy(executor, release, 1)
+    wait_for(lambda: executor.queued == 1)
+
+    with pytest.raises(ExecutorBusy):
+        executor.run(lambda: None)
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    stats = executor.stats()
+    assert (stats["queued"], stats["running"], stats["completed"]) == (0, 0, 3)
+    assert executor.run(lambda: 'ok') == 'ok'
+
+
+def test_timed_out_wait_leaves_no_queued_count():
+    executor = InferenceExecutor(max_workers=1, max_queue=4, max_wait_s=0.05)
+    release = threading.Event()
+    threads = occupy(executor, release, 1)
+    wait_for(lambda: executor.running == 1)
+
+    with pytest.raises(ExecutorBusy):
+        executor.run(lambda: None)
+    assert executor.queued == 0
+
+    release.set()
+    threads[0].join()
+    assert executor.run(lambda: 'ok') == 'ok'
+
+
+def test_free_slot_is_used_even_with_no_queue():
+    executor = InferenceExecutor(max_workers=1, max_queue=0)
+    assert executor.run(lambda: 'ok') == 'ok'
+
+
+def test_background_jobs_do_not_fill_the_queue():
+    executor = InferenceExecutor(max_workers=1, max_queue=1, max_wait_s=5)
+    release = threading.Event()
+    threads = occupy(executor, release, 1)
+    wait_for(lambda: executor.running == 1)
+    threads += occupy(executor, release, 3, block=True)
+    wait_for(lambda: executor.jobs_waiting == 3)
+    assert executor.queued == 0
+
+    # The web request still gets the one queue place
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(executor.run(lambda: 'web')))
+    waiter.start()
+    wait_for(lambda: executor.queued == 1)
+    release.set()
+    waiter.join()
+    for thread in threads:
+        thread.join()
+    assert result == ['web']
+    assert (executor.queued, executor.jobs_waiting, executor.running) == (0, 0, 0)
@@ -0,0 +1,77 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from ai import predict
+from ai.image_io import ImageTooLarge, image_size
+from ai.predict import decode_image
+
+IMAGE = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+
+
+def encode(ext, *params):
+    ok, data = cv2.imencode(ext, IMAGE, list(params))
+    assert ok
+    return data.tobytes()
+
+
+def bmp_header(width, height):
+    return (b'BM' + struct.pack('<IHHI', 0, 0, 0, 54)
+            + struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, 0, 0, 0, 0, 0))
+
+
+def webp_vp8x_header(width, height):
+    payload = b'\x00' * 4 + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+    return b'RIFF' + struct.pack('<I', 4 + 8 + len(payload)) + b'WEBP' + b'VP8X' + struct.pack('<I', len(payload)) + payload
+
+
+@pytest.mark.parametrize('ext, params', [
+    ('.jpg', ()), ('.png', ()), ('.bmp', ()), ('.gif', ()), ('.tiff', ()),
+    ('.webp', (cv2.IMWRITE_WEBP_QUALITY, 80)),      # lossy, VP8
+    ('.webp', (cv2.IMWRITE_WEBP_QUALITY, 101)),     # lossless, VP8L
+])
+def test_size_read_from_header(ext, params):
+    data = encode(ext, *params)
+    assert image_size(data) == (64, 48)
+    assert decode_image(data).shape == IMAGE.shape
+
+
+def test_top_down_bmp():
+    assert image_size(bmp_header(640, -480)) == (640, 480)
+
+
+def gif_header(width, height):
+    return b'GIF89a' + struct.pack('<HH', width, height) + b'\xf7\x00\x00'
+
+
+@pytest.mark.parametrize('header', [bmp_header(30000, 30000), webp_vp8x_header(16000, 16000),
+                                    gif_header(65000, 65000)])
+def test_huge_header_refused_before_decoding(header):
+    assert image_size(header) is not None
+    with pytest.raises(ImageTooLarge):
+        decode_image(header + b'\x00' * 64)
+
+
+def test_unparsed_format_is_checked_after_decoding(monkeypatch):
+    data = encode('.ppm')
+    assert image_size(data) is None
+    assert decode_image(data).shape == IMAGE.shape
+    monkeypatch.setattr(predict, 'MAX_IMAGE_PIXELS', 100)
+    with pytest.raises(ImageTooLarge):
+        decode_image(data)
+
+
+def test_jpeg_frame_header_past_header_bytes(tmp_path, monkeypatch):
+    data = encode('.jpg')
+    # APP15 segments of filler push the SOF marker past HEADER_BYTES
+    filler = b''.join(b'\xff\xef' + struct.pack('>H', 65000) + b'\x00' * 64998
+                      for _ in range(predict.HEADER_BYTES // 65000 + 1))
+    path = tmp_path / 'big_exif.jpg'
+    path.write_bytes(data[:2] + filler + data[2:])
+
+    assert decode_image(str(path)).shape == IMAGE.shape
+    monkeypatch.setattr(predict, 'MAX_IMAGE_PIXELS', 100)
+    with pytest.raises(ImageTooLarge):
+        decode_image(str(path))
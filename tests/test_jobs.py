@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ai import jobs
+from ai.db import connect
+from ai.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def jobs_db(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    JobQueue(path, workers=0)
+    return path
+
+
+def add_running(path, job_id, owner, owner_pid, claimed_ago=0):
+    conn = connect(path)
+    conn.execute(
+        '''INSERT INTO analysis_jobs (job_id, user_id, customer_name, status, owner, owner_pid, claimed_at)
+           VALUES (?, 1, 'Jane', ?, ?, ?, datetime('now', ?))''',
+        (job_id, RUNNING, owner, owner_pid, f'-{claimed_ago} seconds')
+    )
+    conn.commit()
+    conn.close()
+
+
+def status(path, job_id):
+    conn = connect(path)
+    value = conn.execute("SELECT status FROM analysis_jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+    conn.close()
+    return value
+
+
+def exited_pid():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+def test_live_owners_jobs_are_left_running(jobs_db):
+    add_running(jobs_db, 'live', 'other-process', os.getppid())
+    JobQueue(jobs_db, workers=0)
+    assert status(jobs_db, 'live') == RUNNING
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="no signal-0 liveness probe on Windows")
+def test_exited_owners_jobs_are_requeued(jobs_db):
+    add_running(jobs_db, 'orphan', 'other-process', exited_pid())
+    JobQueue(jobs_db, workers=0)
+    assert status(jobs_db, 'orphan') == QUEUED
+
+
+def test_expired_lease_and_unowned_jobs_are_requeued(jobs_db):
+    add_running(jobs_db, 'stale', 'other-process', os.getppid(), claimed_ago=jobs.JOB_LEASE_SECONDS + 60)
+    add_running(jobs_db, 'legacy', None, None)
+    JobQueue(jobs_db, workers=0)
+    assert status(jobs_db, 'stale') == QUEUED
+    assert status(jobs_db, 'legacy') == QUEUED
+
+
+def test_worker_survives_database_errors(jobs_db):
+    queue = JobQueue(jobs_db, workers=1)
+    calls = []
+
+    def flaky_run(conn, job):
+        calls.append(job['job_id'])
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("disk I/O error")
+        queue._finish(conn, job['job_id'], DONE)
+
+    queue._run = flaky_run
+    first = queue.submit(1, 'Salon', 'Jane', 'a.jpg', b'')
+    second = queue.submit(1, 'Salon', 'John', 'b.jpg', b'')
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and status(jobs_db, second) != DONE:
+        time.sleep(0.05)
+    assert status(jobs_db, first) == FAILED
+    assert status(jobs_db, second) == DONE
+    assert queue._threads[0].is_alive()
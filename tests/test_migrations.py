@@ -0,0 +1,52 @@
+from ai.analysis_store import save_analysis
+from ai.counters import read_counters
+from ai.db import connect
+from ai.migrations import MIGRATIONS, check_plans, current_version
+
+RESULT = {"skin_type": "oily", "skin_confidence": 0.91, "acne_type": "no_acne",
+          "acne_confidence": 0.84, "face_detected": True}
+
+
+def test_fresh_database_is_fully_migrated(db_path):
+    conn = connect(db_path)
+    assert current_version(conn) == MIGRATIONS[-1][0]
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    conn.close()
+
+
+def test_hot_queries_do_not_scan_tables(db_path):
+    conn = connect(db_path)
+    assert check_plans(conn) == []
+    conn.close()
+
+
+def test_hot_queries_do_not_scan_tables_after_upgrade(legacy_db):
+    conn = connect(legacy_db)
+    assert check_plans(conn) == []
+    conn.close()
+
+
+def test_legacy_user_keys_point_at_user(legacy_db):
+    conn = connect(legacy_db)
+    for table in ('predictions', 'feedback'):
+        assert {row[2] for row in conn.execute(f"PRAGMA foreign_key_list({table})")} == {'User'}
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    # Rebuilding the table kept the rows and the triggers counting them
+    stored = read_counters(conn)['predictions']
+    assert stored == conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    conn.close()
+
+
+def test_save_analysis_for_user_missing_from_legacy_users(legacy_db):
+    conn = connect(legacy_db)
+    user_id = conn.execute("SELECT MAX(user_id) FROM User").fetchone()[0]
+    assert conn.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is None
+    before = read_counters(conn)['predictions']
+
+    _, analysis_id = save_analysis(conn, user_id, 'Salon', 'Jane', 'jane.jpg', RESULT)
+    conn.commit()
+
+    assert conn.execute("SELECT user_id FROM predictions ORDER BY id DESC LIMIT 1").fetchone()[0] == user_id
+    assert conn.execute("SELECT 1 FROM Skin_Analysis WHERE analysis_id = ?", (analysis_id,)).fetchone()
+    assert read_counters(conn)['predictions'] == before + 1
+    conn.close()
@@ -0,0 +1,73 @@
+import sqlite3
+
+import cv2
+import numpy as np
+import pytest
+
+from ai import predict
+from ai.decision import DecisionPolicy
+from ai.prediction_cache import PredictionCache
+
+SKIN = ['dry', 'normal', 'oil']
+ACNE = ['no_acne', 'mild', 'moderate', 'severe', 'very_severe']
+RESULT = {"skin_type": "dry", "skin_confidence": 0.9, "acne_type": "mild",
+          "acne_confidence": 0.8, "face_detected": True}
+
+
+def test_policy_fingerprint_follows_thresholds():
+    base = DecisionPolicy(SKIN, ACNE).fingerprint()
+    assert DecisionPolicy(SKIN, ACNE).fingerprint() == base
+    assert DecisionPolicy(SKIN, ACNE, skin_min_confidence=0.5).fingerprint() != base
+
+
+def test_persisted_entries_are_dropped_for_another_policy(tmp_path):
+    model = tmp_path / 'model.tflite'
+    model.write_bytes(b'weights')
+    db = str(tmp_path / 'cache.db')
+    policy = DecisionPolicy(SKIN, ACNE).fingerprint()
+
+    PredictionCache([model], db_path=db, policy=policy).put(RESULT, exact_key='abc')
+    assert PredictionCache([model], db_path=db, policy=policy).get_exact('abc') == RESULT
+
+    stricter = DecisionPolicy(SKIN, ACNE, acne_min_confidence=0.9).fingerprint()
+    assert PredictionCache([model], db_path=db, policy=stricter).get_exact('abc') is None
+
+
+class BrokenCache:
+    """Stands in for a PredictionCache whose SQLite file has gone bad"""
+
+    def get_exact(self, key):
+        return None
+
+    def get_similar(self, phash, face_detected):
+        return None
+
+    def put(self, *args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    monkeypatch.setattr(predict, 'load_models', lambda: True)
+    monkeypatch.setattr(predict, 'QUALITY_GATE', False)
+    monkeypatch.setattr(predict, 'select_region', lambda image: (image[:, :, ::-1], True, None))
+    monkeypatch.setattr(predict, 'preprocess_region', lambda region: region)
+    monkeypatch.setattr(predict, 'infer', lambda x: (np.array([0.9, 0.05, 0.05], np.float32),
+                                                      np.array([0.9, 0.05, 0.02, 0.02, 0.01], np.float32)))
+    monkeypatch.setattr(predict, 'prediction_cache', BrokenCache())
+
+
+def test_cache_write_errors_do_not_fail_the_prediction(stub_models):
+    ok, data = cv2.imencode('.png', np.full((120, 120, 3), 128, np.uint8))
+    result = predict.ai_predict(data.tobytes())
+    assert result["skin_type"] == 'dry' and "error" not in result
+
+
+def test_missing_path_is_an_unreadable_image(stub_models, tmp_path):
+    result = predict.ai_predict(str(tmp_path / 'missing.jpg'))
+    assert result["rejection_reason"] == 'unreadable'
+
+
+def test_persistent_cache_uses_wal(tmp_path):
+    cache = PredictionCache([], db_path=str(tmp_path / 'cache.db'))
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
@@ -0,0 +1,38 @@
+import pytest
+
+from ai import predict
+
+
+class FakeClassifier:
+    def __init__(self, path, num_threads=None, model_content=None):
+        self.path = path
+        self.num_threads = num_threads
+        self.model_content = model_content
+
+
+@pytest.fixture
+def tflite_models(tmp_path, monkeypatch):
+    skin, acne = tmp_path / 'skin.int8.tflite', tmp_path / 'acne.int8.tflite'
+    skin.write_bytes(b'skin-model')
+    acne.write_bytes(b'acne-model')
+    monkeypatch.setattr(predict, 'MODEL_BACKEND', 'int8')
+    monkeypatch.setattr(predict, 'model_paths', lambda: (str(skin), str(acne)))
+    monkeypatch.setattr(predict, 'TFLiteClassifier', FakeClassifier)
+    monkeypatch.setattr(predict, '_preloaded', {})
+    return str(skin), str(acne)
+
+
+def test_single_threaded_workers_share_interpreters_built_before_fork(tflite_models):
+    predict.preload_for_fork(threads=1)
+    built = [predict._preloaded[path] for path in tflite_models]
+    assert all(isinstance(c, FakeClassifier) and c.num_threads == 1 for c in built)
+    assert [predict._tflite_classifier(path) for path in tflite_models] == built
+
+
+def test_multi_threaded_workers_build_interpreters_from_shared_bytes(tflite_models, monkeypatch):
+    predict.preload_for_fork(threads=4)
+    assert predict._preloaded[tflite_models[0]] == b'skin-model'
+    monkeypatch.setattr(predict, 'TFLITE_THREADS', 4)
+    classifier = predict._tflite_classifier(tflite_models[0])
+    assert classifier.num_threads == 4
+    assert classifier.model_content == b'skin-model'